@@ -0,0 +1,125 @@
+"""
+@author: Federico Vaga <federico.vaga@gmail.com>
+@copyright: CERN 2014
+@license: GPLv2
+
+Helpers shared by the benchmarks: configuration of a channel set, trigger
+start and stop, reports.
+"""
+from test import config, devcache, manifest
+import json
+import os
+
+CSET_NAMES = ("input8", "input16", "input32", "output8")
+
+
+def get_device():
+    return devcache.get_device(config.device)
+
+
+def buffers():
+    """
+    It returns the buffers to benchmark
+    """
+    loaded = manifest.get().buffers
+    if config.bench_buffers:
+        return [b for b in config.bench_buffers if b in loaded]
+    return loaded
+
+
+def triggers():
+    loaded = manifest.get().triggers
+    return [t for t in config.bench_triggers if t in loaded]
+
+
+def setup_cset(cset, trigger, buffer, post_samples):
+    """
+    It prepares a channel set for an acquisition and it returns the channel
+    to read. The trigger is disabled and the buffers are empty.
+    """
+    cset.trigger.disable()
+    if cset.get_current_buffer() != buffer:
+        cset.set_current_buffer(buffer)
+    if cset.get_current_trigger() != trigger:
+        cset.set_current_trigger(trigger)
+    cset.trigger.disable()
+    cset.trigger.attribute["post-samples"].set_value(post_samples)
+    cset.trigger.attribute["pre-samples"].set_value(0)
+    for chan in cset.chan:
+        chan.buffer.flush()
+    return [chan for chan in cset.chan if not chan.is_interleaved()][0]
+
+
+def start_trigger(cset, period_ns = None, ms_period = None):
+    """
+    It starts a periodic acquisition: 'period_ns' for the hrt trigger,
+    'ms_period' for the timer trigger
+    """
+    trigger = cset.trigger
+    if cset.get_current_trigger() == "hrt":
+        period = period_ns or config.bench_hrt_period_ns
+        trigger.attribute["period-ns"].set_value(period)
+        trigger.enable()
+        trigger.attribute["exp-scalar-l"].set_value(0)
+        trigger.attribute["exp-scalar-h"].set_value(1)  # fire now
+    else:
+        period = ms_period or config.bench_timer_ms_period
+        trigger.attribute["ms-period"].set_value(period)
+        trigger.enable()
+
+
+def stop_trigger(cset):
+    trigger = cset.trigger
+    trigger.disable()
+    if "period-ns" in trigger.attribute:
+        trigger.attribute["period-ns"].set_value(0)
+    for chan in cset.chan:
+        chan.buffer.flush()
+
+
+def percentile(values, pct):
+    """
+    It returns the given percentile (0-100) of a list of values, by nearest
+    rank
+    """
+    values = sorted(values)
+    if not values:
+        return None
+    rank = int(round(pct / 100.0 * (len(values) - 1)))
+    return values[rank]
+
+
+def print_header(columns):
+    """
+    It prints the header of a table; 'columns' is a list of (key, header,
+    format)
+    """
+    print("  ".join([header.rjust(_width(header))
+                     for key, header, fmt in columns]))
+
+
+def print_row(row, columns):
+    print("  ".join([fmt.format(row[key]).rjust(_width(header))
+                     for key, header, fmt in columns]))
+
+
+def _width(header):
+    return max(len(header), 10)
+
+
+def save(name, data):
+    """
+    It saves the results of a benchmark in the 'bench_json' file, under the
+    benchmark name
+    """
+    if not config.bench_json:
+        return
+    path = os.path.expanduser(config.bench_json)
+    try:
+        with open(path, "r") as f:
+            saved = json.load(f)
+    except (IOError, OSError, ValueError):
+        saved = {}
+    saved[name] = data
+    with open(path, "w") as f:
+        json.dump(saved, f, indent = 2, sort_keys = True)
@@ -0,0 +1,79 @@
+"""
+@author: Federico Vaga <federico.vaga@gmail.com>
+@copyright: CERN 2014
+@license: GPLv2
+
+Throughput of the data paths: read() of the data char device against the
+map of a vmalloc buffer (see test.blockio), with large blocks. When the data
+char device cannot be mapped the mmap row reports the read() fallback in
+the 'path' column.
+"""
+from bench import common
+from test import config, manifest, blockio
+import time
+import os
+
+COLUMNS = [("cset", "cset", "{0}"), ("post_samples", "post-samples", "{0}"),
+           ("method", "method", "{0}"), ("path", "path", "{0}"),
+           ("blocks_s", "blocks/s", "{0:.1f}"), ("mb_s", "MB/s", "{0:.3f}"),
+           ("cpu_mb", "CPU s/MB", "{0:.3f}")]
+
+
+def measure(cset, chan, method, duration):
+    """
+    It acquires for 'duration' seconds, getting the samples with the given
+    method ("read" or "mmap"), and it returns the measures
+    """
+    interface = chan.interface
+    interface.open_ctrl_data(os.O_RDONLY)
+    if method == "mmap":
+        path = blockio.data_path(chan)
+    else:
+        path = blockio.ReadDataPath(interface)
+    blocks = 0
+    nbytes = 0
+    try:
+        common.start_trigger(cset)
+        cpu_start = sum(os.times()[:2])
+        start = time.time()
+        while time.time() - start < duration:
+            if not interface.is_device_ready(100)[0]:
+                continue
+            ctrl, data = path.read_block()
+            blocks += 1
+            nbytes += len(data)
+        elapsed = time.time() - start
+        cpu = sum(os.times()[:2]) - cpu_start
+    finally:
+        common.stop_trigger(cset)
+        path.close()
+        interface.close_ctrl_data()
+
+    mbytes = nbytes / 1000000.0
+    return {"method": method, "path": path.method, "blocks": blocks,
+            "bytes": nbytes, "elapsed": elapsed,
+            "blocks_s": blocks / elapsed, "mb_s": mbytes / elapsed,
+            "cpu_mb": cpu / mbytes if mbytes else 0.0}
+
+
+def run():
+    if not manifest.has_buffer("vmalloc") or not manifest.has_trigger("hrt"):
+        print("Buffer 'vmalloc' and trigger 'hrt' are required")
+        return []
+    device = common.get_device()
+    rows = []
+    common.print_header(COLUMNS)
+    for index in config.bench_csets:
+        cset = device.cset[index]
+        for post_samples in config.bench_mmap_post_samples:
+            chan = common.setup_cset(cset, "hrt", "vmalloc", post_samples)
+            chan.buffer.attribute["max-buffer-kb"].set_value(
+                                                    config.bench_mmap_buffer_kb)
+            for method in ("read", "mmap"):
+                row = measure(cset, chan, method, config.bench_duration)
+                row.update({"cset": common.CSET_NAMES[index],
+                            "post_samples": post_samples})
+                common.print_row(row, COLUMNS)
+                rows.append(row)
+    common.save("mmap", rows)
+    return rows
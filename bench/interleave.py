@@ -0,0 +1,99 @@
+"""
+@author: Federico Vaga <federico.vaga@gmail.com>
+@copyright: CERN 2014
+@license: GPLv2
+
+Interleaved channel against channel by channel acquisition. For each channel
+set with an interleaved channel and number of post-samples, the 'hrt'
+trigger acquires for 'bench_duration' seconds with all the normal channels
+enabled ('channels'), then with the interleaved one ('interleave'). It
+reports the fires/s, the samples/s of all the channels, the MB/s, an
+estimate of the system calls for each fire and the CPU time for each
+sample. The estimate counts one poll for each wait and one read for each
+control and each data: PyZio can split a read in more system calls.
+
+The CPU time is the one of the whole process: on the simulated backend it
+includes the emulation of the device.
+"""
+from bench import common, multichannel
+from test import config, manifest, multiplex
+import time
+import os
+
+COLUMNS = [("cset", "cset", "{0}"), ("post_samples", "post-samples", "{0}"),
+           ("mode", "mode", "{0}"), ("fires_s", "fires/s", "{0:.1f}"),
+           ("samples_s", "samples/s", "{0:.0f}"), ("mb_s", "MB/s", "{0:.3f}"),
+           ("syscalls_fire_est", "est. syscalls/fire", "{0:.2f}"),
+           ("cpu_ns_sample", "CPU ns/sample", "{0:.1f}")]
+
+
+def measure(cset, chans, duration):
+    """
+    It acquires for 'duration' seconds, it reads the given channels and it
+    returns the measures
+    """
+    mux = multiplex.Multiplexer()
+    for chan in chans:
+        chan.interface.open_ctrl_data(os.O_RDONLY)
+        mux.register(chan)
+    fires = set()
+    polls = 0
+    blocks = 0
+    nbytes = 0
+    nsamples = 0
+    try:
+        common.start_trigger(cset)
+        cpu_start = sum(os.times()[:2])
+        start = time.time()
+        while time.time() - start < duration:
+            polls += 1
+            for chan, ctrl, data in mux.read_ready(0.1):
+                fires.add((ctrl.tstamp.seconds, ctrl.tstamp.ticks))
+                blocks += 1
+                nbytes += len(data)
+                nsamples += ctrl.nsamples
+        elapsed = time.time() - start
+        cpu = sum(os.times()[:2]) - cpu_start
+    finally:
+        common.stop_trigger(cset)
+        mux.close()
+        for chan in chans:
+            chan.interface.close_ctrl_data()
+
+    syscalls = polls + 2 * blocks  # read of control and of data
+    return {"fires": len(fires), "blocks": blocks, "bytes": nbytes,
+            "samples": nsamples, "elapsed": elapsed, "syscalls_est": syscalls,
+            "fires_s": len(fires) / elapsed, "samples_s": nsamples / elapsed,
+            "mb_s": nbytes / 1000000.0 / elapsed,
+            "syscalls_fire_est": syscalls / float(len(fires)) if fires else 0.0,
+            "cpu_ns_sample": cpu * 1e9 / nsamples if nsamples else 0.0}
+
+
+def run():
+    if not manifest.has_trigger("hrt"):
+        print("Trigger 'hrt' is required")
+        return []
+    device = common.get_device()
+    rows = []
+    common.print_header(COLUMNS)
+    for index in config.bench_csets:
+        cset = device.cset[index]
+        if not cset.is_interleaved():
+            continue
+        nchans = len([c for c in cset.chan if not c.is_interleaved()])
+        for post_samples in config.bench_post_samples:
+            for mode in ("channels", "interleave"):
+                if mode == "interleave":
+                    cset.interleave.enable()
+                    chans = [cset.interleave]
+                else:
+                    chans = multichannel.enable_channels(cset, nchans)
+                common.setup_cset(cset, "hrt", config.buf, post_samples)
+                row = measure(cset, chans, config.bench_duration)
+                row.update({"cset": common.CSET_NAMES[index],
+                            "post_samples": post_samples, "mode": mode})
+                common.print_row(row, COLUMNS)
+                rows.append(row)
+        multichannel.enable_channels(cset, nchans)
+    common.save("interleave", rows)
+    return rows
@@ -0,0 +1,127 @@
+"""
+@author: Federico Vaga <federico.vaga@gmail.com>
+@copyright: CERN 2014
+@license: GPLv2
+
+Fire to readable latency of the hrt trigger. For each fire it records three
+moments on CLOCK_REALTIME:
+
+- write: when 'exp-scalar-h' is written to fire immediately;
+- tstamp: the time stamp of the acquired block (ctrl.tstamp);
+- ready: when poll() reports the control char device readable.
+
+It reports the percentiles of write->tstamp (trigger), tstamp->ready
+(delivery) and write->ready (total), and it saves their histograms. On the
+simulated backend use the real clock (sim_clock_rate=1), otherwise the time
+stamps are virtual.
+"""
+from bench import common
+from test import config
+import select
+import time
+import os
+
+# The intervals to measure: (key, start, end)
+INTERVALS = [("trigger", "write", "tstamp"),
+             ("delivery", "tstamp", "ready"),
+             ("total", "write", "ready")]
+
+COLUMNS = [("interval", "interval", "{0}"), ("count", "count", "{0}"),
+           ("p50", "p50 us", "{0:.1f}"), ("p90", "p90 us", "{0:.1f}"),
+           ("p99", "p99 us", "{0:.1f}"), ("max", "max us", "{0:.1f}")]
+
+
+def fire(cset, interface, poller, timeout):
+    """
+    It fires the trigger once and it returns the moments (ns) of the fire,
+    None if the block did not come in time
+    """
+    trigger = cset.trigger
+    trigger.attribute["exp-scalar-l"].set_value(0)
+    write = int(time.time() * 1000000000)
+    trigger.attribute["exp-scalar-h"].set_value(1)
+    if not poller.poll(int(timeout * 1000)):
+        return None
+    ready = int(time.time() * 1000000000)
+    ctrl = interface.read_ctrl()
+    interface.read_data()
+    tstamp = ctrl.tstamp.seconds * 1000000000 + ctrl.tstamp.ticks
+    return {"write": write, "tstamp": tstamp, "ready": ready}
+
+
+def histogram(samples, bin_us):
+    """
+    It returns the histogram of a list of latencies (us) as a dictionary
+    bin start (us) -> count
+    """
+    hist = {}
+    for value in samples:
+        start = int(value // bin_us) * bin_us
+        hist[start] = hist.get(start, 0) + 1
+    return hist
+
+
+def save_histograms(latencies, bin_us, path):
+    """
+    It saves the histograms in CSV format: one row for each bin, one column
+    for each interval
+    """
+    hists = dict([(key, histogram(latencies[key], bin_us))
+                  for key, start, end in INTERVALS])
+    bins = sorted(set([b for h in hists.values() for b in h]))
+    with open(os.path.expanduser(path), "w") as f:
+        f.write("bin_us," + ",".join([k for k, s, e in INTERVALS]) + "\n")
+        for b in bins:
+            f.write("{0},".format(b) +
+                    ",".join([str(hists[k].get(b, 0)) for k, s, e in INTERVALS])
+                    + "\n")
+
+
+def run():
+    device = common.get_device()
+    cset = device.cset[config.bench_csets[0]]
+    chan = common.setup_cset(cset, "hrt", config.buf,
+                             config.bench_post_samples[0])
+    interface = chan.interface
+    interface.open_ctrl_data(os.O_RDONLY)
+    poller = select.poll()
+    poller.register(interface.fileno_ctrl(), select.POLLIN)
+
+    latencies = dict([(key, []) for key, start, end in INTERVALS])
+    missed = 0
+    try:
+        cset.trigger.enable()
+        for _i in range(config.bench_fires):
+            moments = fire(cset, interface, poller, config.select_wait)
+            if moments is None:
+                missed += 1
+                continue
+            for key, start, end in INTERVALS:
+                latencies[key].append((moments[end] - moments[start]) / 1000.0)
+    finally:
+        common.stop_trigger(cset)
+        interface.close_ctrl_data()
+
+    rows = []
+    common.print_header(COLUMNS)
+    for key, start, end in INTERVALS:
+        values = latencies[key]
+        if not values:
+            continue
+        row = {"interval": key, "count": len(values),
+               "p50": common.percentile(values, 50),
+               "p90": common.percentile(values, 90),
+               "p99": common.percentile(values, 99),
+               "max": max(values)}
+        common.print_row(row, COLUMNS)
+        rows.append(row)
+    print("Missed fires: {0}".format(missed))
+
+    if config.bench_histogram:
+        save_histograms(latencies, config.bench_hist_bin_us,
+                        config.bench_histogram)
+    common.save("latency", {"summary": rows, "missed": missed,
+                            "histogram": dict([(key, histogram(latencies[key],
+                                                config.bench_hist_bin_us))
+                                               for key in latencies])})
+    return rows
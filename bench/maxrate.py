@@ -0,0 +1,204 @@
+"""
+@author: Federico Vaga <federico.vaga@gmail.com>
+@copyright: CERN 2014
+@license: GPLv2
+
+Maximum sustainable trigger rate. A rate is sustainable when, for
+'bench_duration' seconds, the reader gets every block: no lost-block alarm
+(bit 0 of the channel 'alarms') and no gap in the sequence numbers. For each
+channel set, buffer, number of post-samples, trigger and reader it sweeps the
+trigger period from slow to fast; then it runs a binary search between the
+last sustainable period and the first one that is not. The result is the
+knee: the shortest sustainable period. When even the fastest period of the
+sweep is sustainable the limit is not reached: the knee column says so and
+the rate is only a lower bound.
+"""
+from bench import common
+from test import config, blockio
+import select
+import time
+import os
+
+# Coarse sweep of the trigger periods, from the slowest
+HRT_SWEEP_NS = [10000000, 1000000, 100000, 10000]
+TIMER_SWEEP_MS = [100, 10, 1]
+
+# Blocks drained at once by the 'ring' reader
+RING_BLOCKS = 64
+
+COLUMNS = [("cset", "cset", "{0}"), ("buffer", "buffer", "{0}"),
+           ("post_samples", "post-samples", "{0}"),
+           ("trigger", "trigger", "{0}"), ("reader", "reader", "{0}"),
+           ("knee", "knee", "{0}"), ("rate", "rate Hz", "{0:.1f}"),
+           ("mb_s", "MB/s", "{0:.3f}")]
+
+
+def read_select(chan, seconds):
+    """
+    It reads blocks for the given time, waiting with select(). It returns
+    the controls of the blocks.
+    """
+    interface = chan.interface
+    ctrls = []
+    end = time.time() + seconds
+    while time.time() < end:
+        if not interface.is_device_ready(10)[0]:
+            continue
+        ctrls.append(interface.read_ctrl())
+        interface.read_data()
+    return ctrls
+
+
+def read_poll(chan, seconds):
+    """
+    It reads blocks for the given time, waiting with poll() on the control
+    char device
+    """
+    interface = chan.interface
+    poller = select.poll()
+    poller.register(interface.fileno_ctrl(), select.POLLIN)
+    ctrls = []
+    end = time.time() + seconds
+    while time.time() < end:
+        if not poller.poll(10):
+            continue
+        ctrls.append(interface.read_ctrl())
+        interface.read_data()
+    return ctrls
+
+
+def read_ring(chan, seconds):
+    """
+    It reads blocks for the given time in batches, into memory allocated
+    once (see test.blockio)
+    """
+    ring = blockio.BlockRing(RING_BLOCKS, blockio.block_size(chan.cset))
+    reader = blockio.BlockReader(chan.interface, ring)
+    ctrls = []
+    end = time.time() + seconds
+    while time.time() < end:
+        ctrls += [_Ctrl(b.seq_num, b.nsamples, b.ssize)
+                  for b in reader.read(timeout = 0.01)]
+    return ctrls
+
+
+class _Ctrl(object):
+    """
+    The fields of a control used by sustainable()
+    """
+    __slots__ = ("seq_num", "nsamples", "ssize")
+
+    def __init__(self, seq_num, nsamples, ssize):
+        self.seq_num = seq_num
+        self.nsamples = nsamples
+        self.ssize = ssize
+
+
+# The reader strategies; each one takes the channel and the time to read,
+# it returns the controls of the blocks read
+READERS = {"select": read_select,
+           "poll": read_poll,
+           "ring": read_ring}
+
+
+def sustainable(cset, chan, trigger, reader, period):
+    """
+    It runs an acquisition with the given period (ns for hrt, ms for timer)
+    and it returns (sustainable, blocks read, bytes read)
+    """
+    interface = chan.interface
+    for c in cset.chan:
+        c.buffer.flush()
+    chan.attribute["alarms"].set_value(0xFF)
+    interface.open_ctrl_data(os.O_RDONLY)
+    try:
+        if trigger == "hrt":
+            common.start_trigger(cset, period_ns = period)
+        else:
+            common.start_trigger(cset, ms_period = period)
+        ctrls = READERS[reader](chan, config.bench_duration)
+        # Blocks lost after the reader stopped do not count
+        alarms = int(chan.attribute["alarms"].get_value().split()[0])
+    finally:
+        common.stop_trigger(cset)
+        interface.close_ctrl_data()
+
+    seqs = [c.seq_num for c in ctrls]
+    gaps = [b - a for a, b in zip(seqs, seqs[1:]) if b - a != 1]
+    nbytes = sum([c.nsamples * c.ssize for c in ctrls])
+    ok = len(ctrls) > 0 and not gaps and not alarms & 0x1
+    return ok, len(ctrls), nbytes
+
+
+def find_knee(cset, chan, trigger, reader):
+    """
+    It returns the shortest sustainable period, the bytes/s at that period
+    and whether the limit was reached. When even the fastest period of the
+    sweep is sustainable the limit is not reached: the period returned is
+    only a bound. It returns (None, 0, True) if even the slowest period is
+    not sustainable
+    """
+    sweep = HRT_SWEEP_NS if trigger == "hrt" else TIMER_SWEEP_MS
+    good = None
+    bad = None
+    good_bps = 0
+    for period in sweep:
+        ok, blocks, nbytes = sustainable(cset, chan, trigger, reader, period)
+        if not ok:
+            bad = period
+            break
+        good, good_bps = period, nbytes / config.bench_duration
+    if good is None:
+        return None, 0, True
+    if bad is None:
+        return good, good_bps, False
+
+    # Binary search between the last sustainable period and the first one
+    # that is not
+    while good - bad > max(good * config.bench_maxrate_precision, 1):
+        period = (good + bad) // 2
+        ok, blocks, nbytes = sustainable(cset, chan, trigger, reader, period)
+        if ok:
+            good, good_bps = period, nbytes / config.bench_duration
+        else:
+            bad = period
+    return good, good_bps, True
+
+
+def run():
+    device = common.get_device()
+    rows = []
+    common.print_header(COLUMNS)
+    for index in config.bench_csets:
+        cset = device.cset[index]
+        for buffer in common.buffers():
+            for post_samples in config.bench_post_samples:
+                for trigger in common.triggers():
+                    chan = common.setup_cset(cset, trigger, buffer,
+                                             post_samples)
+                    for reader in config.bench_readers:
+                        knee, bps, reached = find_knee(cset, chan, trigger,
+                                                       reader)
+                        unit = "ns" if trigger == "hrt" else "ms"
+                        if knee is None:
+                            label = "-"
+                        elif reached:
+                            label = "{0}{1}".format(knee, unit)
+                        else:
+                            label = "not reached (<{0}{1})".format(knee, unit)
+                        if knee is None:
+                            rate = 0.0
+                        elif trigger == "hrt":
+                            rate = 1000000000.0 / knee
+                        else:
+                            rate = 1000.0 / knee
+                        row = {"cset": common.CSET_NAMES[index],
+                               "buffer": buffer,
+                               "post_samples": post_samples,
+                               "trigger": trigger, "reader": reader,
+                               "knee": label, "reached": reached,
+                               "rate": rate, "mb_s": bps / 1000000.0}
+                        common.print_row(row, COLUMNS)
+                        rows.append(row)
+    common.save("maxrate", rows)
+    return rows
@@ -0,0 +1,104 @@
+"""
+@author: Federico Vaga <federico.vaga@gmail.com>
+@copyright: CERN 2014
+@license: GPLv2
+
+Throughput of a multi-channel acquisition. For each channel set and number
+of post-samples, the 'hrt' trigger acquires on 1, 2, ... N channels of the
+channel set and all the enabled channels are read together, with a single
+multiplexer (see test.multiplex), for 'bench_duration' seconds. It reports
+the fires read on every channel ('complete'), those missing some channel
+(the last fires of the window can be cut), and the aggregate blocks/s and
+MB/s.
+"""
+from bench import common
+from test import config, manifest, multiplex
+import time
+import os
+
+COLUMNS = [("cset", "cset", "{0}"), ("post_samples", "post-samples", "{0}"),
+           ("channels", "channels", "{0}"),
+           ("fires_s", "fires/s", "{0:.1f}"), ("incomplete", "incomplete", "{0}"),
+           ("blocks_s", "blocks/s", "{0:.1f}"), ("mb_s", "MB/s", "{0:.3f}"),
+           ("cpu_mb", "CPU s/MB", "{0:.3f}")]
+
+
+def enable_channels(cset, nchan):
+    """
+    It enables the first 'nchan' channels of a channel set and it disables
+    the others; it returns the enabled channels
+    """
+    chans = [chan for chan in cset.chan if not chan.is_interleaved()]
+    for chan in cset.chan:
+        if chan.is_interleaved():
+            chan.disable()
+    for i, chan in enumerate(chans):
+        if i < nchan:
+            chan.enable()
+        else:
+            chan.disable()
+    return chans[:nchan]
+
+
+def measure(cset, chans, duration):
+    """
+    It acquires for 'duration' seconds on the enabled channels and it
+    returns the measures
+    """
+    mux = multiplex.Multiplexer()
+    for chan in chans:
+        chan.interface.open_ctrl_data(os.O_RDONLY)
+        mux.register(chan)
+    fires = {}  # time stamp -> number of channels
+    blocks = 0
+    nbytes = 0
+    try:
+        common.start_trigger(cset)
+        cpu_start = sum(os.times()[:2])
+        start = time.time()
+        while time.time() - start < duration:
+            for chan, ctrl, data in mux.read_ready(0.1):
+                tstamp = (ctrl.tstamp.seconds, ctrl.tstamp.ticks)
+                fires[tstamp] = fires.get(tstamp, 0) + 1
+                blocks += 1
+                nbytes += len(data)
+        elapsed = time.time() - start
+        cpu = sum(os.times()[:2]) - cpu_start
+    finally:
+        common.stop_trigger(cset)
+        mux.close()
+        for chan in chans:
+            chan.interface.close_ctrl_data()
+
+    complete = len([n for n in fires.values() if n == len(chans)])
+    mbytes = nbytes / 1000000.0
+    return {"channels": len(chans), "fires": len(fires),
+            "complete": complete, "incomplete": len(fires) - complete,
+            "blocks": blocks, "bytes": nbytes, "elapsed": elapsed,
+            "fires_s": complete / elapsed, "blocks_s": blocks / elapsed,
+            "mb_s": mbytes / elapsed,
+            "cpu_mb": cpu / mbytes if mbytes else 0.0}
+
+
+def run():
+    if not manifest.has_trigger("hrt"):
+        print("Trigger 'hrt' is required")
+        return []
+    device = common.get_device()
+    rows = []
+    common.print_header(COLUMNS)
+    for index in config.bench_csets:
+        cset = device.cset[index]
+        nchans = len([c for c in cset.chan if not c.is_interleaved()])
+        for post_samples in config.bench_post_samples:
+            for nchan in range(1, nchans + 1):
+                chans = enable_channels(cset, nchan)
+                common.setup_cset(cset, "hrt", config.buf, post_samples)
+                row = measure(cset, chans, config.bench_duration)
+                row.update({"cset": common.CSET_NAMES[index],
+                            "post_samples": post_samples})
+                common.print_row(row, COLUMNS)
+                rows.append(row)
+        enable_channels(cset, nchans)
+    common.save("multichannel", rows)
+    return rows
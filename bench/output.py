@@ -0,0 +1,82 @@
+"""
+@author: Federico Vaga <federico.vaga@gmail.com>
+@copyright: CERN 2014
+@license: GPLv2
+
+Write throughput. For each output channel set and number of samples per
+block, the 'hrt' trigger outputs one block every 'bench_hrt_period_ns' while
+a BlockWriter (see test.blockio) keeps the buffer full, writing batches of
+'bench_write_batch' blocks, for 'bench_duration' seconds. It reports the
+blocks/s written and output, the MB/s, the batches after which the lost
+trigger alarm (underrun) was found raised, and the CPU time spent per MB.
+"""
+from bench import common
+from test import config, manifest, blockio, utils
+import time
+import os
+
+COLUMNS = [("cset", "cset", "{0}"), ("nsamples", "samples", "{0}"),
+           ("batch", "batch", "{0}"),
+           ("written_s", "written/s", "{0:.1f}"),
+           ("output_s", "output/s", "{0:.1f}"), ("mb_s", "MB/s", "{0:.3f}"),
+           ("underruns", "underruns", "{0}"),
+           ("cpu_mb", "CPU s/MB", "{0:.3f}")]
+
+
+def measure(cset, nsamples, batch, duration):
+    """
+    It writes for 'duration' seconds and it returns the measures
+    """
+    chan = cset.chan[0]
+    interface = chan.interface
+    common.setup_cset(cset, "hrt", config.buf, nsamples)
+    chan.attribute["alarms"].set_value(0xFF)
+    seq_num = chan.get_current_ctrl().seq_num
+    interface.open_ctrl_data(os.O_WRONLY)
+    writer = blockio.BlockWriter(interface, blockio.output_ctrl(chan))
+    blocks = [bytes(nsamples * writer.ssize)] * batch
+    underruns = 0
+    try:
+        writer.write(blocks, 1)
+        common.start_trigger(cset)
+        cpu_start = sum(os.times()[:2])
+        start = time.time()
+        while time.time() - start < duration:
+            writer.write(blocks, 0.1)
+            if utils.zio_alarms(chan) & utils.ZIO_ALARM_LOST_TRIGGER:
+                underruns += 1
+                chan.attribute["alarms"].set_value(utils.ZIO_ALARM_LOST_TRIGGER)
+        elapsed = time.time() - start
+        cpu = sum(os.times()[:2]) - cpu_start
+        cset.trigger.disable()
+        output = chan.get_current_ctrl().seq_num - seq_num
+    finally:
+        common.stop_trigger(cset)
+        interface.close_ctrl_data()
+
+    mbytes = writer.bytes / 1000000.0
+    return {"nsamples": nsamples, "batch": batch, "blocks": writer.blocks,
+            "bytes": writer.bytes, "output": output, "elapsed": elapsed,
+            "written_s": writer.blocks / elapsed, "output_s": output / elapsed,
+            "mb_s": mbytes / elapsed, "underruns": underruns,
+            "cpu_mb": cpu / mbytes if mbytes else 0.0}
+
+
+def run():
+    if not manifest.has_trigger("hrt"):
+        print("Trigger 'hrt' is required")
+        return []
+    device = common.get_device()
+    rows = []
+    common.print_header(COLUMNS)
+    for index, cset in enumerate(device.cset):
+        if not cset.chan[0].interface.is_ctrl_writable():
+            continue
+        for nsamples in config.bench_post_samples:
+            row = measure(cset, nsamples, config.bench_write_batch,
+                          config.bench_duration)
+            row["cset"] = common.CSET_NAMES[index]
+            common.print_row(row, COLUMNS)
+            rows.append(row)
+    common.save("write", rows)
+    return rows
@@ -0,0 +1,79 @@
+"""
+@author: Federico Vaga <federico.vaga@gmail.com>
+@copyright: CERN 2014
+@license: GPLv2
+
+Block throughput. For each channel set, trigger, buffer and number of
+post-samples, the trigger runs as fast as configured and the blocks are read
+through the channel interface (read_ctrl/read_data) for 'bench_duration'
+seconds. It reports blocks/s, MB/s and the CPU time spent per MB.
+
+The CPU time is the one of the whole process: on the simulated backend it
+includes the emulation of the device.
+"""
+from bench import common
+from test import config
+import time
+import os
+
+COLUMNS = [("cset", "cset", "{0}"), ("trigger", "trigger", "{0}"),
+           ("buffer", "buffer", "{0}"), ("post_samples", "post-samples", "{0}"),
+           ("blocks_s", "blocks/s", "{0:.1f}"), ("mb_s", "MB/s", "{0:.3f}"),
+           ("cpu_mb", "CPU s/MB", "{0:.3f}"), ("lost", "lost", "{0}")]
+
+
+def measure(device, index, trigger, buffer, post_samples, duration):
+    """
+    It acquires for 'duration' seconds and it returns the measures
+    """
+    cset = device.cset[index]
+    chan = common.setup_cset(cset, trigger, buffer, post_samples)
+    interface = chan.interface
+    interface.open_ctrl_data(os.O_RDONLY)
+    blocks = 0
+    nbytes = 0
+    lost = 0
+    last_seq = None
+    try:
+        common.start_trigger(cset)
+        cpu_start = sum(os.times()[:2])
+        start = time.time()
+        while time.time() - start < duration:
+            if not interface.is_device_ready(100)[0]:
+                continue
+            ctrl = interface.read_ctrl()
+            interface.read_data()
+            if last_seq is not None and ctrl.seq_num > last_seq + 1:
+                lost += ctrl.seq_num - last_seq - 1
+            last_seq = ctrl.seq_num
+            blocks += 1
+            nbytes += ctrl.nsamples * ctrl.ssize
+        elapsed = time.time() - start
+        cpu = sum(os.times()[:2]) - cpu_start
+    finally:
+        common.stop_trigger(cset)
+        interface.close_ctrl_data()
+
+    mbytes = nbytes / 1000000.0
+    return {"cset": common.CSET_NAMES[index],
+            "trigger": trigger, "buffer": buffer,
+            "post_samples": post_samples, "blocks": blocks, "bytes": nbytes,
+            "elapsed": elapsed, "blocks_s": blocks / elapsed,
+            "mb_s": mbytes / elapsed,
+            "cpu_mb": cpu / mbytes if mbytes else 0.0, "lost": lost}
+
+
+def run():
+    device = common.get_device()
+    rows = []
+    common.print_header(COLUMNS)
+    for index in config.bench_csets:
+        for trigger in common.triggers():
+            for buffer in common.buffers():
+                for post_samples in config.bench_post_samples:
+                    row = measure(device, index, trigger, buffer,
+                                  post_samples, config.bench_duration)
+                    common.print_row(row, COLUMNS)
+                    rows.append(row)
+    common.save("throughput", rows)
+    return rows
@@ -6,6 +6,7 @@
 
 from PyZio.ZioConfig import devices_path, zio_bus_path, triggers, buffers
 from PyZio import ZioUtil
+from test import config
 import unittest
 import os
 
@@ -28,7 +29,7 @@ class Basic(unittest.TestCase):
         """
         Test if zio-zero device is loaded
         """
-        path = os.path.join(devices_path, "zzero-0000")
+        path = os.path.join(devices_path, config.device)
         exist = os.path.exists(path) and os.path.isdir(path)
         self.assertTrue(exist, "Missing 'zio-zero' device, it is used in most of these tests")
 
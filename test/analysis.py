@@ -0,0 +1,106 @@
+"""
+@author: Federico Vaga <federico.vaga@gmail.com>
+@copyright: CERN 2014
+@license: GPLv2
+
+Timing analysis of periodic acquisitions. The time stamps of all the blocks
+are collected as integer nanoseconds, then the errors of the periods are
+analysed in bulk: the tests assert on the whole error profile instead of
+stopping at the first outlier. It uses NumPy when it is available.
+"""
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+def tstamp_ns(tstamp):
+    """
+    It returns a ZioTimeStamp as integer nanoseconds
+    """
+    return tstamp.seconds * 1000000000 + tstamp.ticks
+
+
+class PeriodProfile(object):
+    """
+    It describes the errors of the periods between consecutive time stamps
+    (integer ns) against the expected period (ns). An error is an outlier
+    when its absolute value is greater than the tolerance (ns).
+    """
+
+    def __init__(self, tstamps, period_ns, tolerance_ns):
+        self.period_ns = period_ns
+        self.tolerance_ns = tolerance_ns
+        self.blocks = len(tstamps)
+        if numpy is not None:
+            self._analyse_numpy(tstamps)
+        else:
+            self._analyse(tstamps)
+
+
+    def _analyse_numpy(self, tstamps):
+        errors = numpy.diff(numpy.array(tstamps, dtype = numpy.int64)) - \
+                 self.period_ns
+        jitter = numpy.sort(numpy.abs(errors))
+        self.periods = len(errors)
+        self.drift_ns = int(errors.sum())
+        self.outliers = int((jitter > self.tolerance_ns).sum())
+        self._jitter = [int(j) for j in jitter]
+
+
+    def _analyse(self, tstamps):
+        errors = [b - a - self.period_ns for a, b in zip(tstamps, tstamps[1:])]
+        self.periods = len(errors)
+        self.drift_ns = sum(errors)
+        self.outliers = len([e for e in errors if abs(e) > self.tolerance_ns])
+        self._jitter = sorted([abs(e) for e in errors])
+
+
+    def mean_error_ns(self):
+        """
+        It returns the mean error of the periods: the drift over a period
+        """
+        if not self.periods:
+            return 0.0
+        return self.drift_ns / float(self.periods)
+
+
+    def jitter_ns(self, pct):
+        """
+        It returns the given percentile (0-100) of the absolute errors, by
+        nearest rank
+        """
+        if not self.periods:
+            return 0
+        return self._jitter[int(round(pct / 100.0 * (self.periods - 1)))]
+
+
+    def outlier_ratio(self):
+        if not self.periods:
+            return 0.0
+        return self.outliers / float(self.periods)
+
+
+    def __repr__(self):
+        return ("period {0}ns, {1} periods, drift {2}ns, mean error {3:.0f}ns, "
+                "jitter p50 {4}ns p99 {5}ns max {6}ns, {7} outliers over "
+                "{8}ns").format(self.period_ns, self.periods, self.drift_ns,
+                                self.mean_error_ns(), self.jitter_ns(50),
+                                self.jitter_ns(99), self.jitter_ns(100),
+                                self.outliers, self.tolerance_ns)
+
+
+def check_period(test, tstamps, period_ns, tolerance_ns, max_outliers = 0.0):
+    """
+    It analyses the time stamps and it makes the test fail when the mean
+    error is out of tolerance or when there are too many outliers
+    ('max_outliers' is the fraction of periods allowed out of tolerance).
+    It returns the profile.
+    """
+    profile = PeriodProfile(tstamps, period_ns, tolerance_ns)
+    test.assertGreater(profile.periods, 0, "At least two blocks are needed")
+    test.assertLessEqual(abs(profile.mean_error_ns()), tolerance_ns,
+                         "Mean error out of tolerance: {0}".format(profile))
+    test.assertLessEqual(profile.outlier_ratio(), max_outliers,
+                         "Too many outliers: {0}".format(profile))
+    return profile
@@ -0,0 +1,361 @@
+"""
+@author: Federico Vaga <federico.vaga@gmail.com>
+@copyright: CERN 2014
+@license: GPLv2
+
+Bulk read of ZIO blocks. read_ctrl() and read_data() allocate new bytes and
+a new control object for each block; here the blocks land with readinto() in
+a ring of memory allocated once, and each block is a light view on its slot
+of the ring. The fields of the control are decoded only on request.
+
+The data of a vmalloc buffer can also be mapped in memory (see
+MmapDataPath): the samples of a block are a slice of the map, at the offset
+given by its control.
+
+On the output channels a BlockWriter writes the blocks in batches: the
+control of each block is a copy of the control of the channel with its own
+sequence number and number of samples.
+"""
+from test.ctrlblock import CTRL_SIZE, TSTAMP_OFFSET, MEM_OFFSET_OFFSET
+from test import ctrlblock, clock
+import struct
+import select
+import mmap
+import io
+import os
+
+# Head of struct zio_control: versions, alarms, seq_num, nsamples, ssize,
+# nbits; the time stamp (seconds, ticks); 'mem_offset' (see test.ctrlblock)
+_HEAD = struct.Struct("<BBBBIIHH")
+_TSTAMP = struct.Struct("<QQ")
+_MEM_OFFSET = struct.Struct("<I")
+
+
+class Block(object):
+    """
+    A block stored in a slot of a BlockRing. It is valid until the next
+    read in the ring.
+    """
+    __slots__ = ("ctrl", "_data", "nbytes")
+
+    def __init__(self, ctrl, data):
+        self.ctrl = ctrl  # memoryview on the control
+        self._data = data  # memoryview on the whole data slot
+        self.nbytes = 0
+
+
+    @property
+    def data(self):
+        return self._data[:self.nbytes]
+
+
+    @property
+    def alarms_zio(self):
+        return _HEAD.unpack_from(self.ctrl)[2]
+
+
+    @property
+    def seq_num(self):
+        return _HEAD.unpack_from(self.ctrl)[4]
+
+
+    @property
+    def nsamples(self):
+        return _HEAD.unpack_from(self.ctrl)[5]
+
+
+    @property
+    def ssize(self):
+        return _HEAD.unpack_from(self.ctrl)[6]
+
+
+    @property
+    def mem_offset(self):
+        return _MEM_OFFSET.unpack_from(self.ctrl, MEM_OFFSET_OFFSET)[0]
+
+
+    @property
+    def tstamp_ns(self):
+        seconds, ticks = _TSTAMP.unpack_from(self.ctrl, TSTAMP_OFFSET)
+        return seconds * 1000000000 + ticks
+
+
+    def to_ctrl(self):
+        """
+        It returns a copy of the control as a PyZio ZioCtrl
+        """
+        from PyZio.ZioCtrl import ZioCtrl
+        ctrl = ZioCtrl()
+        ctrl.unpack_to_ctrl(self.ctrl.tobytes())
+        return ctrl
+
+
+class BlockRing(object):
+    """
+    It is the memory for 'nblocks' blocks of at most 'data_size' bytes of
+    samples. It is allocated once, then it is reused by each read.
+    """
+
+    def __init__(self, nblocks, data_size):
+        self.nblocks = nblocks
+        self.data_size = data_size
+        self.ctrl = bytearray(nblocks * CTRL_SIZE)
+        self.data = bytearray(nblocks * data_size)
+        ctrl = memoryview(self.ctrl)
+        data = memoryview(self.data)
+        self.blocks = [Block(ctrl[i * CTRL_SIZE:(i + 1) * CTRL_SIZE],
+                             data[i * data_size:(i + 1) * data_size])
+                       for i in range(nblocks)]
+
+
+class BlockReader(object):
+    """
+    It reads the blocks of an open channel interface (see
+    ZioCharDevice.open_ctrl_data()) into a BlockRing
+    """
+
+    def __init__(self, interface, ring):
+        self.ring = ring
+        self._ctrl = io.FileIO(interface.fileno_ctrl(), "rb", closefd = False)
+        self._data = io.FileIO(interface.fileno_data(), "rb", closefd = False)
+        self._poller = select.poll()
+        self._poller.register(self._ctrl.fileno(), select.POLLIN)
+
+
+    def read(self, max_blocks = None, timeout = 0):
+        """
+        It drains up to 'max_blocks' ready blocks (at most the ring size). It
+        waits 'timeout' seconds for the first block, then it takes only the
+        blocks already available. It returns the list of blocks read.
+        """
+        limit = self.ring.nblocks
+        if max_blocks is not None:
+            limit = min(limit, max_blocks)
+        wait = int(timeout * 1000)
+        count = 0
+        while count < limit and self._poll(wait):
+            block = self.ring.blocks[count]
+            _fill(self._ctrl, block.ctrl)
+            nbytes = block.nsamples * block.ssize
+            if nbytes > self.ring.data_size:
+                raise ValueError("Block of {0} bytes, the ring holds {1}".format(
+                                 nbytes, self.ring.data_size))
+            _fill(self._data, block._data[:nbytes])
+            block.nbytes = nbytes
+            count += 1
+            wait = 0
+        return self.ring.blocks[:count]
+
+
+    def _poll(self, wait):
+        with clock.get_clock().waiting([self._ctrl.fileno()] if wait else []):
+            return self._poller.poll(wait)
+
+
+def _fill(f, view):
+    """
+    It reads into the whole view: the data char device can return fewer
+    bytes than requested
+    """
+    done = 0
+    while done < len(view):
+        n = f.readinto(view[done:])
+        if not n:
+            raise IOError("End of file after {0} of {1} bytes".format(done,
+                                                                     len(view)))
+        done += n
+
+
+class BlockWriter(object):
+    """
+    It writes blocks to an open output channel interface (see
+    ZioCharDevice.open_ctrl_data() with os.O_WRONLY). 'template' is a
+    binary control of the channel (see output_ctrl()).
+    """
+
+    def __init__(self, interface, template):
+        self.template = bytes(template)
+        head = _HEAD.unpack_from(self.template)
+        self.seq_num = head[4]
+        self.ssize = head[6] or 1
+        self.blocks = 0
+        self.bytes = 0
+        self._fdc = interface.fileno_ctrl()
+        self._fdd = interface.fileno_data()
+        self._poller = select.poll()
+        self._poller.register(self._fdc, select.POLLOUT)
+
+
+    def write_block(self, data):
+        """
+        It writes a block: its control and its samples
+        """
+        self.seq_num += 1
+        os.write(self._fdc, ctrlblock.patch(self.template, self.seq_num,
+                                            len(data) // self.ssize))
+        view = memoryview(data)
+        done = 0
+        while done < len(view):
+            done += os.write(self._fdd, view[done:])
+        self.blocks += 1
+        self.bytes += len(data)
+
+
+    def write(self, blocks, timeout = 0):
+        """
+        It writes a batch of blocks (a list of samples) while the channel
+        takes them. It waits 'timeout' seconds until the channel can take
+        the first block, then it writes only while the control char device
+        is writable. It returns the number of blocks written.
+        """
+        wait = int(timeout * 1000)
+        count = 0
+        for data in blocks:
+            with clock.get_clock().waiting([self._fdc] if wait else []):
+                writable = self._poller.poll(wait)
+            if not writable:
+                break
+            self.write_block(data)
+            count += 1
+            wait = 0
+        return count
+
+
+def output_ctrl(chan):
+    """
+    It returns the current control of a channel in binary form, the template
+    of the controls of a BlockWriter
+    """
+    return chan.get_current_ctrl().pack_to_binary()
+
+
+def block_size(cset):
+    """
+    It returns the bytes of samples of the blocks acquired by a channel set
+    with its current trigger configuration
+    """
+    trigger = cset.trigger
+    nsamples = int(trigger.attribute["pre-samples"].get_value()) + \
+               int(trigger.attribute["post-samples"].get_value())
+    bits = int(cset.attribute["resolution-bits"].get_value())
+    return nsamples * ((bits + 7) // 8)
+
+
+class ReadDataPath(object):
+    """
+    It reads the samples of each block from the data char device
+    """
+    method = "read"
+
+    def __init__(self, interface):
+        self.interface = interface
+
+
+    def read_block(self):
+        """
+        It reads the next block and it returns its control and its samples
+        """
+        ctrl = self.interface.read_ctrl()
+        return ctrl, self.interface.read_data(ctrl)
+
+
+    def close(self):
+        pass
+
+
+class MmapDataPath(object):
+    """
+    It maps the data char device of a channel with a vmalloc buffer of
+    'size' bytes. Only the control char device is read: the samples of a
+    block are a view on the map, valid until the next read of a control.
+    """
+    method = "mmap"
+
+    def __init__(self, interface, size):
+        self.interface = interface
+        self.map = mmap.mmap(interface.fileno_data(), size, mmap.MAP_SHARED,
+                             mmap.PROT_READ)
+        self.view = memoryview(self.map)
+
+
+    def read_block(self):
+        ctrl = self.interface.read_ctrl()
+        start = ctrl.mem_offset
+        return ctrl, self.view[start:start + ctrl.nsamples * ctrl.ssize]
+
+
+    def close(self):
+        self.view.release()
+        self.map.close()
+
+
+def data_path(chan):
+    """
+    It returns the fastest way to get the samples of the channel: the map of
+    the data char device for the vmalloc buffer, read() otherwise or when
+    the char device cannot be mapped (e.g. no descriptor on a replay, see
+    test.capture). The char devices must be open.
+    """
+    if chan.cset.get_current_buffer() == "vmalloc" and \
+       chan.interface.fileno_data() is not None:
+        size = int(chan.buffer.attribute["max-buffer-kb"].get_value()) * 1024
+        try:
+            return MmapDataPath(chan.interface, size)
+        except (mmap.error, OSError, ValueError):
+            pass
+    return ReadDataPath(chan.interface)
+
+
+# # # # # # Read hooks # # # # # # # #
+
+# Functions called for each read of a block in this process (see
+# add_read_hook())
+_read_hooks = []
+_hook_pid = None
+
+
+def add_read_hook(hook):
+    """
+    It calls hook(source, ctrl, data) for every block read in this process
+    through a channel interface (ZioCharDevice.read_ctrl() and read_data())
+    or a BlockReader. 'source' is the interface or the reader, 'ctrl' is the
+    binary control and 'data' the samples; the interface reads them apart,
+    so one of the two is None.
+    """
+    global _hook_pid
+    if not _read_hooks:
+        _install_read_hooks()
+    _hook_pid = os.getpid()
+    if hook not in _read_hooks:
+        _read_hooks.append(hook)
+
+
+def _run_read_hooks(source, ctrl, data):
+    if os.getpid() != _hook_pid:
+        return  # a child process, e.g. test.interface.ConcurrentRead
+    for hook in _read_hooks:
+        hook(source, ctrl, data)
+
+
+def _install_read_hooks():
+    from PyZio.ZioCharDevice import ZioCharDevice
+    read_ctrl = ZioCharDevice.read_ctrl
+    read_data = ZioCharDevice.read_data
+    def hooked_read_ctrl(interface, *args, **kwargs):
+        ctrl = read_ctrl(interface, *args, **kwargs)
+        _run_read_hooks(interface, ctrl.pack_to_binary(), None)
+        return ctrl
+    def hooked_read_data(interface, *args, **kwargs):
+        data = read_data(interface, *args, **kwargs)
+        _run_read_hooks(interface, None, data)
+        return data
+    ZioCharDevice.read_ctrl = hooked_read_ctrl
+    ZioCharDevice.read_data = hooked_read_data
+
+    read_blocks = BlockReader.read
+    def hooked_read_blocks(reader, *args, **kwargs):
+        blocks = read_blocks(reader, *args, **kwargs)
+        for block in blocks:
+            _run_read_hooks(reader, block.ctrl, block.data)
+        return blocks
+    BlockReader.read = hooked_read_blocks
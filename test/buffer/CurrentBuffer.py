@@ -4,21 +4,17 @@
 @license: GPLv2
 """
 
-from PyZio.ZioConfig import devices_path, buffers
-from PyZio.ZioDev import ZioDev
-from test import config, utils
+from test import config, utils, manifest, devcache
 import os, sys, unittest
 
-path = os.path.join(devices_path, "zzero-0000")
-
-@unittest.skipIf(not (os.path.exists(path) and os.path.isdir(path)),
+@unittest.skipIf(not manifest.has_device(config.device),
                  "zio zero is not loaded")
-@unittest.skipIf(not ("vmalloc" in buffers),
+@unittest.skipIf(not manifest.has_buffer("vmalloc"),
                  "Buffer 'vmalloc' is required for this test")
 class CurrentBuffer(unittest.TestCase):
 
     def setUp(self):
-        self.device = ZioDev(devices_path, "zzero-0000")
+        self.device = devcache.get_device(config.device)
         if self.device == None:
             self.skipTest("Missing device, cannot run tests")
 
@@ -97,7 +93,7 @@ class CurrentBuffer(unittest.TestCase):
             if careful:
                 self.trigger.disable()
 
-            utils.trigger_hrt_fill_buffer(self.trigger, 5)
+            utils.trigger_hrt_fill_buffer(self.trigger, 5, chan = self.chan)
 
             self.cset.set_current_buffer(buf)
             cbuf = self.cset.get_current_buffer()
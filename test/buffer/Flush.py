@@ -4,26 +4,21 @@
 @license: GPLv2
 """
 
-from PyZio.ZioConfig import devices_path, buffers, triggers
-from PyZio.ZioDev import ZioDev
-from test import config
+from test import config, utils, manifest, devcache, multiplex, blockio
 import unittest
-import time
 import os
 
-path = os.path.join(devices_path, "zzero-0000")
-
-@unittest.skipIf(not (os.path.exists(path) and os.path.isdir(path)),
+@unittest.skipIf(not manifest.has_device(config.device),
                  "zio zero is not loaded")
-@unittest.skipIf(not (config.buf in buffers),
+@unittest.skipIf(not manifest.has_buffer(config.buf),
                  "Buffer '" + config.buf + "' " + \
                  "is required for this test")
-@unittest.skipIf(not ("timer" in triggers),
+@unittest.skipIf(not manifest.has_trigger("timer"),
                  "Trigger 'timer' is required for this test")
 class Flush(unittest.TestCase):
 
     def setUp(self):
-        self.device = ZioDev(devices_path, "zzero-0000")
+        self.device = devcache.get_device(config.device)
         if self.device == None:
             self.skipTest("Missing device, cannot run tests")
 
@@ -38,7 +33,7 @@ class Flush(unittest.TestCase):
             cset.trigger.enable()
 
         # Wait a while to fill the buffer
-        time.sleep(config.acquisition_wait)
+        utils.sleep(config.acquisition_wait)
 
         # Stop acquisition
         for cset in self.device.cset:
@@ -56,6 +51,7 @@ class Flush(unittest.TestCase):
         It tests that flush makes the buffers empty. The channel's buffers
         are filled by the SetUp function.
         """
+        inputs = []
         for cset in self.device.cset:
             # Flush the buffer of each channel
             for chan in cset.chan:
@@ -65,8 +61,7 @@ class Flush(unittest.TestCase):
                 # There are different tests for input and for output buffer
                 if chan.interface.is_ctrl_readable() and \
                         chan.interface.is_data_readable():
-                    # Test flush on input buffer
-                    self._test_flush_input(chan)
+                    inputs.append(chan)
                 elif chan.interface.is_ctrl_writable() and \
                         chan.interface.is_data_writable():
                     # Test flush on output buffer
@@ -74,17 +69,56 @@ class Flush(unittest.TestCase):
                 else:
                     self.fail("Cannot read/write from current control")
 
+        # Test flush on all the input buffers at once
+        self._test_flush_input(inputs)
+
 
-    def _test_flush_input(self, chan):
+    def _test_flush_input(self, chans):
         """
-        It verifies that the buffer is empty by reading it.
+        It verifies that the buffers are empty: no char device is readable
         """
-        chan.interface.open_ctrl_data(os.O_RDONLY)
-        ready = chan.interface.is_device_ready(0)
-        chan.interface.close_ctrl_data()
+        mux = multiplex.Multiplexer()
+        try:
+            for chan in chans:
+                chan.interface.open_ctrl_data(os.O_RDONLY)
+                mux.register(chan)
+            ready = mux.poll(0)
+        finally:
+            mux.close()
+            for chan in chans:
+                chan.interface.close_ctrl_data()
 
-        self.assertFalse(ready[0], "There should be no blocks")
+        self.assertEqual([], sorted([c.cset.name + "/" + c.name for c in ready]),
+                         "There should be no blocks")
 
 
     def _test_flush_output(self, chan):
-        pass
+        """
+        It verifies that the flush drops the blocks written: after it the
+        trigger has nothing to output, it raises the lost trigger alarm
+        """
+        interface = chan.interface
+        interface.open_ctrl_data(os.O_WRONLY)
+        try:
+            writer = blockio.BlockWriter(interface, blockio.output_ctrl(chan))
+            written = writer.write([bytes(16 * writer.ssize)] * 2,
+                                   config.select_wait)
+        finally:
+            interface.close_ctrl_data()
+        self.assertEqual(2, written, "The output buffer must take 2 blocks")
+
+        chan.buffer.flush()
+        chan.attribute["alarms"].set_value(0xFF)
+        seq_num = chan.get_current_ctrl().seq_num
+        trigger = chan.cset.trigger
+        trigger.enable()
+        utils.sleep(2.5 * config.timer_ms_period / 1000.0)
+        trigger.disable()
+
+        self.assertEqual(seq_num, chan.get_current_ctrl().seq_num,
+            "{0}/{1}: a block was output after the flush".format(
+            chan.cset.name, chan.name))
+        self.assertNotEqual(0, utils.zio_alarms(chan) & \
+                               utils.ZIO_ALARM_LOST_TRIGGER,
+            "{0}/{1}: the trigger must find the buffer empty".format(
+            chan.cset.name, chan.name))
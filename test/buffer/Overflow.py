@@ -4,21 +4,17 @@
 @license: GPLv2
 """
 
-from PyZio.ZioConfig import devices_path, triggers, buffers
-from PyZio.ZioDev import ZioDev
-from test import config
-from test import utils
+from test import config, manifest, devcache
+from test import utils, blockio, losses
 import unittest
 import os
 
-path = os.path.join(devices_path, "zzero-0000")
-
-@unittest.skipIf(not (os.path.exists(path) and os.path.isdir(path)),
+@unittest.skipIf(not manifest.has_device(config.device),
                  "zio zero is not loaded")
-@unittest.skipIf(not (config.buf in buffers),
+@unittest.skipIf(not manifest.has_buffer(config.buf),
                  "Buffer '" + config.buf + "' " + \
                  "is required for this test")
-@unittest.skipIf(not ("hrt" in triggers),
+@unittest.skipIf(not manifest.has_trigger("hrt"),
                  "Trigger 'hrt' is required for this test")
 class Overflow(unittest.TestCase):
     """
@@ -29,7 +25,7 @@ class Overflow(unittest.TestCase):
 
 
     def setUp(self):
-        self.device = ZioDev(devices_path, "zzero-0000")
+        self.device = devcache.get_device(config.device)
         if self.device == None:
             self.skipTest("Missing device, cannot run tests")
 
@@ -127,15 +123,23 @@ class Overflow(unittest.TestCase):
         print("\tIt can take about {0} seconds".format((max(n_block) + 1) * s_fire))
 
         # Fill the whole buffer (no overflow)
+        latency = []
         for i in range(min(buf_max_len_list)):
-            utils.trigger_hrt_fill_buffer(self.trigger, 1)
+            latency += utils.trigger_hrt_fill_buffer(self.trigger, 1,
+                                                     chan = self.chan)
             self._test_lost_block_alarm(i, False)
 
         # Try to put other blocks (overflow)
         for i in range(max(n_block)):
-            utils.trigger_hrt_fill_buffer(self.trigger, 1)
+            latency += utils.trigger_hrt_fill_buffer(self.trigger, 1,
+                                                     chan = self.chan)
             self._test_lost_block_alarm(i, True)
 
+        landed = [l for l in latency if l is not None]
+        if landed:
+            print("\tFire to ready latency: avg {0:.3f}ms, max {1:.3f}ms".format(
+                  sum(landed) * 1000 / len(landed), max(landed) * 1000))
+
 
         # Get the current status after filling the buffer
         ctrl_curr_post = self.chan.get_current_ctrl()
@@ -147,11 +151,17 @@ class Overflow(unittest.TestCase):
 
         # It verifies that the buffer is full. It reads all blocks within the
         # buffer to verify if it effectively stopped to store blocks on overflow
-        for i in range(min(buf_max_len_list)):
-            ready = self.interface.is_device_ready(config.select_wait)
-            self.assertTrue(ready[0], "Missing block {0}/{1}".format(i + 1, buffer_max_len))
-            self.interface.read_ctrl()
-            self.interface.read_data()
+        n_stored = min(buf_max_len_list)
+        ring = blockio.BlockRing(n_stored, blockio.block_size(self.cset))
+        blocks = blockio.BlockReader(self.interface, ring).read(n_stored,
+                                                         config.select_wait)
+        self.assertEqual(n_stored, len(blocks),
+            "Missing blocks {0}/{1}".format(n_stored - len(blocks), n_stored))
+        accountant = losses.LossAccountant()
+        for block in blocks:
+            accountant.feed(block.seq_num, block.alarms_zio)
+        self.assertEqual(0, accountant.lost + accountant.duplicates,
+            "Stored blocks should be sequential: {0}".format(accountant.report()))
 
 
         # Now, no more block should be in the buffer
@@ -161,7 +171,7 @@ class Overflow(unittest.TestCase):
         # Fill the buffer with one block and then get the control that must has
         # the same sequence number of the current block and it is not
         # sequential with previous blocks
-        utils.trigger_hrt_fill_buffer(self.trigger, 1)
+        utils.trigger_hrt_fill_buffer(self.trigger, 1, chan = self.chan)
         ready = self.interface.is_device_ready(config.select_wait)
         self.assertTrue(ready[0], "There should be one block")
         ctrl_cdev, __data = self.interface.read_block()
@@ -169,6 +179,11 @@ class Overflow(unittest.TestCase):
         self.assertEqual(ctrl_curr_post.seq_num + 1, ctrl_cdev.seq_num,
             "Sequence number should be {0}, but it is {1}".format(ctrl_curr_post.seq_num + 1, ctrl_cdev.seq_num))
 
+        # The blocks lost on overflow are a single gap
+        accountant.feed(ctrl_cdev.seq_num)
+        self.assertEqual([max(n_block)], accountant.bursts,
+            "Blocks lost on overflow: {0}".format(accountant.report()))
+
     def _test_lost_block_alarm(self, index, is_overflow):
         """
         It tests that the "lost block" alarm is consistent with the overflow
@@ -4,21 +4,17 @@
 @license: GPLv2
 """
 
-from PyZio.ZioConfig import devices_path, triggers, buffers
-from PyZio.ZioDev import ZioDev
-from test import config
+from test import config, manifest, devcache
 from test import utils
 import unittest
 import sys
 import os
 
-path = os.path.join(devices_path, "zzero-0000")
-
-@unittest.skipIf(not (os.path.exists(path) and os.path.isdir(path)),
+@unittest.skipIf(not manifest.has_device(config.device),
                  "zio zero is not loaded")
-@unittest.skipIf(not (config.buf in buffers), "Buffer '" + config.buf + "' " + \
+@unittest.skipIf(not manifest.has_buffer(config.buf), "Buffer '" + config.buf + "' " + \
                  "is required for this test")
-@unittest.skipIf(not ("hrt" in triggers),
+@unittest.skipIf(not manifest.has_trigger("hrt"),
                  "Trigger 'hrt' is required for this test")
 class Size(unittest.TestCase):
     """
@@ -29,7 +25,7 @@ class Size(unittest.TestCase):
 
 
     def setUp(self):
-        self.device = ZioDev(devices_path, "zzero-0000")
+        self.device = devcache.get_device(config.device)
         if self.device == None:
             self.skipTest("Missing device, cannot run tests")
 
@@ -125,7 +121,7 @@ class Size(unittest.TestCase):
         """
         # Set buffer size and fill it
         self.chan.buffer.attribute['max-buffer-len'].set_value(init_size)
-        utils.trigger_hrt_fill_buffer(self.trigger, nfill)
+        utils.trigger_hrt_fill_buffer(self.trigger, nfill, chan = self.chan)
 
         # Descrase buffer size in order to remove some blocks from it
         self.chan.buffer.attribute['max-buffer-len'].set_value(target_size)
@@ -148,7 +144,7 @@ class Size(unittest.TestCase):
         """
         # Set buffer size and fill it
         self.chan.buffer.attribute['max-buffer-kb'].set_value(init_size)
-        utils.trigger_hrt_fill_buffer(self.trigger, nfill)
+        utils.trigger_hrt_fill_buffer(self.trigger, nfill, chan = self.chan)
 
 
         # Descrase buffer size in order to remove some blocks from it
@@ -0,0 +1,420 @@
+"""
+@author: Federico Vaga <federico.vaga@gmail.com>
+@copyright: CERN 2014
+@license: GPLv2
+
+Capture files: the blocks read by a test, saved for an offline analysis.
+
+The record mode (see record()) saves every block that a test reads through
+a channel interface (ZioCharDevice.read_ctrl() and read_data()) or through
+test.blockio.BlockReader in a file named after the test in 'record_dir'. A
+capture file is made of:
+
+- magic "ZIOCAP01", length of the header (u32) and the header: JSON with
+  the device, the configuration of its channel sets and the compression;
+- the blocks: the control (512 bytes), the length of the stored data and of
+  the samples (u32, u32), the stored data (compressed or not);
+- the index: the offset (u64) of each block;
+- the trailer: offset of the index (u64), number of blocks (u32) and magic
+  "ZIOIDX01".
+
+Capture maps the file and gives random access to its blocks; ReplayInterface
+feeds them back through the channel interface API, so the assertions of a
+test can run again on the recorded data. The replay mode (see replay())
+does it for each test with the capture file named after it in
+'replay_dir'.
+"""
+from test import config, catalog, ctrlblock, blockio, devcache, snapshot
+from PyZio.ZioCtrl import ZioCtrl
+import struct
+import array
+import json
+import mmap
+import time
+import zlib
+import os
+
+try:
+    import lzma
+except ImportError:
+    lzma = None
+
+MAGIC = b"ZIOCAP01"
+INDEX_MAGIC = b"ZIOIDX01"
+_HEADER = struct.Struct("<8sI")
+_BLOCK = struct.Struct("<II")
+_TRAILER = struct.Struct("<QI8s")
+
+COMPRESSIONS = ("", "zlib", "lzma")
+
+
+def _compress(kind, data):
+    if kind == "zlib":
+        return zlib.compress(data)
+    if kind == "lzma":
+        return lzma.compress(data)
+    return data
+
+
+def _decompress(kind, data):
+    if kind == "zlib":
+        return zlib.decompress(data)
+    if kind == "lzma":
+        return lzma.decompress(data)
+    return data
+
+
+class CaptureWriter(object):
+    """
+    It writes a capture file. 'header' is a dictionary saved in the file,
+    'compression' is one of COMPRESSIONS
+    """
+
+    def __init__(self, path, header, compression = ""):
+        if compression not in COMPRESSIONS:
+            raise ValueError("Unknown compression '{0}'".format(compression))
+        if compression == "lzma" and lzma is None:
+            raise ValueError("Compression 'lzma' is not available")
+        self.compression = compression
+        self.offsets = array.array("Q")
+        header = dict(header, compression = compression)
+        raw = json.dumps(header, sort_keys = True).encode()
+        self.f = open(path, "wb")
+        self.f.write(_HEADER.pack(MAGIC, len(raw)))
+        self.f.write(raw)
+
+
+    def add(self, ctrl, data = b""):
+        """
+        It appends a block: the binary control and its samples
+        """
+        if len(ctrl) != ctrlblock.CTRL_SIZE:
+            raise ValueError("A control is {0} bytes, not {1}".format(
+                             ctrlblock.CTRL_SIZE, len(ctrl)))
+        stored = _compress(self.compression, bytes(data))
+        self.offsets.append(self.f.tell())
+        self.f.write(ctrl)
+        self.f.write(_BLOCK.pack(len(stored), len(data)))
+        self.f.write(stored)
+
+
+    def close(self):
+        if self.f is None:
+            return
+        index = self.f.tell()
+        self.f.write(self.offsets.tobytes())
+        self.f.write(_TRAILER.pack(index, len(self.offsets), INDEX_MAGIC))
+        self.f.close()
+        self.f = None
+
+
+class Capture(object):
+    """
+    A capture file mapped in memory
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self.map = mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ)
+        magic, length = _HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC:
+            raise ValueError("{0} is not a capture file".format(path))
+        start = _HEADER.size
+        self.header = json.loads(self.map[start:start + length].decode())
+        self.compression = self.header.get("compression", "")
+
+        index, count, magic = _TRAILER.unpack_from(self.map,
+                                                   len(self.map) - _TRAILER.size)
+        if magic != INDEX_MAGIC:
+            raise ValueError("{0} has no index, it was not closed".format(path))
+        self.offsets = array.array("Q")
+        self.offsets.frombytes(self.map[index:index + count * 8])
+
+
+    def __len__(self):
+        return len(self.offsets)
+
+
+    def ctrl(self, i):
+        """
+        It returns the binary control of the block 'i'
+        """
+        offset = self.offsets[i]
+        return self.map[offset:offset + ctrlblock.CTRL_SIZE]
+
+
+    def data(self, i):
+        """
+        It returns the samples of the block 'i'
+        """
+        offset = self.offsets[i] + ctrlblock.CTRL_SIZE
+        stored, _length = _BLOCK.unpack_from(self.map, offset)
+        offset += _BLOCK.size
+        return _decompress(self.compression, self.map[offset:offset + stored])
+
+
+    def columns(self, cset = None, chan = None):
+        """
+        It returns the controls of the blocks as columns (see
+        test.ctrlblock.decode()), optionally only for a channel
+        """
+        return ctrlblock.decode(b"".join([self.ctrl(i) for i in
+                                          self.blocks(cset, chan)]))
+
+
+    def blocks(self, cset = None, chan = None):
+        """
+        It returns the indexes of the blocks of a channel set and channel,
+        all the blocks by default
+        """
+        if cset is None and chan is None:
+            return list(range(len(self)))
+        cols = ctrlblock.decode(b"".join([self.ctrl(i)
+                                          for i in range(len(self))]))
+        return [i for i in range(len(self))
+                if (cset is None or int(cols.cset_i[i]) == cset) and
+                   (chan is None or int(cols.chan_i[i]) == chan)]
+
+
+    def close(self):
+        self.map.close()
+
+
+class ReplayInterface(object):
+    """
+    It replays the blocks of a capture through the API of a channel
+    interface (ZioCharDevice): open, select, read of control and data.
+    The blocks are always ready, until the end of the capture. The rest of
+    the API (e.g. the file descriptors) comes from 'interface', the real
+    one, when given.
+    """
+
+    def __init__(self, capture, cset = None, chan = None, interface = None):
+        self.capture = capture
+        self.order = capture.blocks(cset, chan)
+        self.pos = 0
+        self.lastctrl = None
+        self._pending = None
+        self._interface = interface
+
+
+    def __getattr__(self, name):
+        # What a capture cannot replay comes from the real interface
+        if self._interface is None:
+            raise AttributeError(name)
+        return getattr(self._interface, name)
+
+
+    def open_ctrl_data(self, perm):
+        pass
+
+
+    def open_ctrl(self, perm):
+        pass
+
+
+    def open_data(self, perm):
+        pass
+
+
+    def close_ctrl_data(self):
+        pass
+
+
+    def close_ctrl(self):
+        pass
+
+
+    def close_data(self):
+        pass
+
+
+    def is_device_ready(self, timeout = 0):
+        ctrl = self.pos < len(self.order)
+        return (ctrl, ctrl or self._pending is not None)
+
+
+    def read_ctrl(self):
+        if self.pos >= len(self.order):
+            raise EOFError("End of the capture")
+        self._pending = self.order[self.pos]
+        self.pos += 1
+        ctrl = ZioCtrl()
+        ctrl.unpack_to_ctrl(self.capture.ctrl(self._pending))
+        self.lastctrl = ctrl
+        return ctrl
+
+
+    def read_data(self, ctrl = None, unpack = True):
+        if self._pending is None:
+            self.read_ctrl()
+        data = self.capture.data(self._pending)
+        self._pending = None
+        return data
+
+
+    def read_block(self, rctrl = True, rdata = True):
+        ctrl = self.read_ctrl() if rctrl else None
+        data = self.read_data(ctrl) if rdata else None
+        return ctrl, data
+
+
+# # # # # # Record mode # # # # # # # #
+
+_recorder = None
+
+
+class _Recorder(object):
+    """
+    It saves the blocks read in this process (see
+    test.blockio.add_read_hook())
+    """
+
+    def __init__(self, writer):
+        self.writer = writer
+        self.pending = {}  # interface -> control without samples yet
+
+
+    def read(self, source, ctrl, data):
+        if ctrl is not None and data is not None:
+            self.writer.add(ctrl, data)
+        elif ctrl is not None:
+            self.flush(source)
+            self.pending[id(source)] = ctrl
+        else:
+            ctrl = self.pending.pop(id(source), None)
+            if ctrl is not None:
+                self.writer.add(ctrl, data)
+
+
+    def flush(self, source = None):
+        keys = [id(source)] if source is not None else \
+               list(self.pending.keys())
+        for key in keys:
+            ctrl = self.pending.pop(key, None)
+            if ctrl is not None:
+                self.writer.add(ctrl)
+
+
+    def close(self):
+        self.flush()
+        self.writer.close()
+
+
+def device_header(device):
+    """
+    It returns the configuration of a device for the header of a capture
+    """
+    csets = []
+    for cset in device.cset:
+        trigger = cset.trigger
+        csets.append({"name": cset.name,
+                      "trigger": cset.get_current_trigger(),
+                      "buffer": cset.get_current_buffer(),
+                      "post-samples": _attr(trigger, "post-samples"),
+                      "pre-samples": _attr(trigger, "pre-samples")})
+    return {"device": device.name, "backend": config.backend,
+            "time": time.time(), "csets": csets}
+
+
+def _attr(obj, name):
+    if name not in obj.attribute:
+        return None
+    return obj.attribute[name].get_value()
+
+
+def record(suite, device):
+    """
+    It makes each test of the suite save the blocks it reads in a capture
+    file in 'record_dir'
+    """
+    path = os.path.expanduser(config.record_dir)
+    if not os.path.isdir(path):
+        os.makedirs(path)
+    blockio.add_read_hook(_read)
+    for test in snapshot.tests(suite):
+        _record(test, device)
+    return suite
+
+
+def _record(test, device):
+    setup = getattr(test, "setUp", None)
+    if setup is None:
+        return
+    def recorded_setup():
+        global _recorder
+        setup()
+        header = device_header(devcache.get_device(device))
+        header["test"] = test.id()
+        header["footprint"] = repr(catalog.footprint(test.id()))
+        path = os.path.join(os.path.expanduser(config.record_dir),
+                            test.id() + ".zcap")
+        _recorder = _Recorder(CaptureWriter(path, header,
+                                            config.record_compression))
+        test.addCleanup(_stop)
+    test.setUp = recorded_setup
+
+
+# # # # # # Replay mode # # # # # # # #
+
+def replay(suite, device):
+    """
+    It makes each test of the suite read the blocks of its capture file in
+    'replay_dir' (see record()) instead of those of the device: the test
+    still drives the device, but its assertions run on the recorded data.
+    A test without a capture file is skipped.
+    """
+    for test in snapshot.tests(suite):
+        _replay(test, device)
+    return suite
+
+
+def _replay(test, device):
+    setup = getattr(test, "setUp", None)
+    if setup is None:
+        return
+    def replayed_setup():
+        path = os.path.join(os.path.expanduser(config.replay_dir),
+                            test.id() + ".zcap")
+        if not os.path.exists(path):
+            test.skipTest("No capture in {0}".format(path))
+        cap = Capture(path)
+        test.addCleanup(cap.close)
+        dev = devcache.get_device(device)
+        if dev is not None:
+            for cset_i, cset in enumerate(dev.cset):
+                for chan_i, chan in enumerate(cset.chan):
+                    _replace_interface(test, chan, ReplayInterface(cap,
+                                       cset_i, _chan_index(chan, chan_i),
+                                       chan.interface))
+        setup()
+    test.setUp = replayed_setup
+
+
+def _chan_index(chan, position):
+    """
+    It returns the index of a channel in the controls: the interleaved
+    channel has none
+    """
+    return 0xFFFF if chan.is_interleaved() else position
+
+
+def _replace_interface(test, chan, interface):
+    real = chan.interface
+    chan.interface = interface
+    def restore():
+        chan.interface = real
+    test.addCleanup(restore)
+
+
+def _stop():
+    global _recorder
+    if _recorder is not None:
+        _recorder.close()
+        _recorder = None
+
+
+def _read(source, ctrl, data):
+    if _recorder is not None:
+        _recorder.read(source, ctrl, data)
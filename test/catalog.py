@@ -0,0 +1,135 @@
+"""
+@author: Federico Vaga <federico.vaga@gmail.com>
+@copyright: CERN 2014
+@license: GPLv2
+
+The list of all tests with the resources they use and their tags. It does not
+import the tests, so it can be used before PyZio is pointed to the right ZIO
+tree, or on a host without ZIO at all.
+"""
+from test.footprint import Footprint, EXCLUSIVE, DEVICE
+import fnmatch
+
+# List of all tests with their footprint and tags. The csets are the ones of
+# zio-zero: 0 is input8, 1 is input16, 2 is input32. The tags are:
+#   fast -- it takes a few seconds at most
+#   timing -- it measures the trigger timings
+#   stress -- it repeats the test many times (see config.nstress)
+#   module-load -- it loads and unloads the ZIO modules
+# The tests of test.tool use no channel set: they test zio-ut.py and its
+# modules without a device.
+# New tests go at the end: the position in the list is the test code.
+catalog = [
+    ("test.module.CoreModule.ZioModule", EXCLUSIVE, ["module-load"]),
+    ("test.module.BufferModule.BufVmallocModule", EXCLUSIVE, ["module-load"]),
+    ("test.module.TriggerModule.TrigTimerModule", EXCLUSIVE, ["module-load"]),
+    ("test.module.TriggerModule.TrigHrtModule", EXCLUSIVE, ["module-load"]),
+    ("test.sysfs.Attribute", Footprint(csets = [2]), ["fast"]),
+    ("test.sysfs.Enable", DEVICE, ["fast"]),
+    ("test.sysfs.CurrentControl", Footprint(csets = [2], trigger = "hrt"),
+     ["fast", "stress"]),
+    ("test.buffer.CurrentBuffer", Footprint(csets = [0], buffer = "vmalloc"),
+     []),
+    ("test.buffer.Flush", Footprint(trigger = "timer"), []),
+    ("test.buffer.Size", Footprint(csets = [0], trigger = "hrt"), ["stress"]),
+    ("test.buffer.Overflow", Footprint(csets = [0], trigger = "hrt"),
+     ["stress"]),
+    ("test.trigger.CurrentTrigger", DEVICE, []),
+    ("test.trigger.PrePostSample", Footprint(csets = [0]), []),
+    ("test.trigger.timer.Period", Footprint(trigger = "timer"), ["timing"]),
+    ("test.trigger.timer.Phase", Footprint(trigger = "timer"), ["timing"]),
+    ("test.trigger.hrt.FireScalar", Footprint(trigger = "hrt"), ["timing"]),
+    ("test.trigger.hrt.FireSecond", Footprint(trigger = "hrt"), ["timing"]),
+    ("test.trigger.hrt.PeriodAndSlack", Footprint(trigger = "hrt"),
+     ["timing"]),
+    ("test.trigger.hrt.FireTime", Footprint(trigger = "hrt"), ["timing"]),
+    ("test.interface.ReadPolicy", Footprint(csets = [0], trigger = "hrt"), []),
+    ("test.interface.WritePolicy", Footprint(csets = [3], trigger = "hrt"),
+     []),
+    ("test.interface.ConcurrentRead", Footprint(csets = [0], trigger = "timer"),
+     ["stress"]),
+    ("test.interface.MultiChannelRead",
+     Footprint(csets = [0, 1, 2], trigger = "hrt"), []),
+    ("test.interface.InterleaveRead", Footprint(csets = [0], trigger = "hrt"),
+     []),
+    ("test.tool.Cli", Footprint(csets = []), ["fast"]),
+    ("test.tool.SteppedClock", Footprint(csets = []), ["timing"]),
+    ("test.tool.Capture", Footprint(csets = []), ["fast"]),
+    ("test.tool.DataPath", Footprint(csets = []), ["fast"]),
+    ("test.tool.Conflict", Footprint(csets = []), ["fast"]),
+          ]
+
+test_list = [name for name, fp, tgs in catalog]
+
+
+def footprint(name):
+    """
+    It returns the footprint of a test. A test not in the catalog (i.e. a
+    single test case) inherits the footprint of its module.
+    """
+    for test, fp, tgs in catalog:
+        if name == test or name.startswith(test + "."):
+            return fp
+    return EXCLUSIVE
+
+
+def tags(name):
+    """
+    It returns the tags of a test
+    """
+    for test, fp, tgs in catalog:
+        if name == test or name.startswith(test + "."):
+            return tgs
+    return []
+
+
+def all_tags():
+    """
+    It returns all the tags in use, in catalog order
+    """
+    found = []
+    for test, fp, tgs in catalog:
+        found.extend([t for t in tgs if t not in found])
+    return found
+
+
+def select(patterns):
+    """
+    It returns the names of the tests that match the given patterns, in the
+    order of the patterns. A pattern can be:
+
+    - the index of a test in the catalog
+    - 'tag:NAME', all the tests with the given tag
+    - a glob on the test names, e.g. 'test.trigger.hrt.*'
+    - the dotted name of a test module, of a package of tests or of a single
+      test within a module
+
+    It raises ValueError on patterns that do not match any test. It does not
+    import the tests.
+    """
+    selected = []
+    for pattern in patterns:
+        names = _match(pattern)
+        if not names:
+            raise ValueError("No test matches '{0}'".format(pattern))
+        selected.extend([n for n in names if n not in selected])
+    return selected
+
+
+def _match(pattern):
+    if pattern.isdigit():
+        index = int(pattern)
+        return [test_list[index]] if index < len(test_list) else []
+    if pattern.startswith("tag:"):
+        tag = pattern[len("tag:"):]
+        return [test for test, fp, tgs in catalog if tag in tgs]
+    if any([c in pattern for c in "*?["]):
+        return fnmatch.filter(test_list, pattern)
+    # A package of tests, a module or a test within a module
+    names = [test for test in test_list
+             if test == pattern or test.startswith(pattern + ".")]
+    if names:
+        return names
+    if any([pattern.startswith(test + ".") for test in test_list]):
+        return [pattern]
+    return []
@@ -0,0 +1,172 @@
+"""
+@author: Federico Vaga <federico.vaga@gmail.com>
+@copyright: CERN 2014
+@license: GPLv2
+
+The clock used by the tests to sleep and to get the current time. By default
+it is the real clock; on the simulated backend it can be replaced by a
+virtual clock so that timing tests run faster than the real time.
+"""
+import threading
+import time
+
+
+class RealClock(object):
+    """
+    The system clock (CLOCK_REALTIME)
+    """
+    rate = 1.0
+
+    def time(self):
+        return time.time()
+
+
+    def time_ns(self):
+        return int(time.time() * 1000000000)
+
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+
+    def real_timeout(self, seconds):
+        """
+        It converts a virtual time interval (seconds) in a real one
+        """
+        return seconds
+
+
+    def is_stepped(self):
+        return False
+
+
+    def add_listener(self, fn):
+        pass
+
+
+    def waiting(self, fds):
+        return _Wait(None, fds)
+
+
+class _Wait(object):
+    """
+    A wait for some file descriptors, in a 'with' block (see
+    VirtualClock.waiting())
+    """
+
+    def __init__(self, waits, fds):
+        self.waits = waits
+        self.fds = list(fds)
+
+
+    def __enter__(self):
+        if self.waits is not None:
+            self.waits[id(self)] = self.fds
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, tb):
+        if self.waits is not None:
+            del self.waits[id(self)]
+        return False
+
+
+class VirtualClock(object):
+    """
+    A clock that runs 'rate' times faster than the real clock. When 'rate'
+    is 0 the clock is stepped: the time advances only on sleep() and
+    advance(). Listeners are called each time the clock is moved forward by
+    hand, so the simulated device can fire the expired triggers. The tests
+    tell the clock when they wait for the device (see waiting()), so the
+    simulated device knows when it can move a stepped clock.
+    """
+
+    def __init__(self, rate = 0, start_ns = None):
+        self.rate = float(rate)
+        self.__lock = threading.Lock()
+        self.__base_real = time.time()
+        self.__base_virt = int(self.__base_real * 1000000000) \
+                           if start_ns is None else start_ns
+        self.__listeners = []
+        self.__waits = {}
+
+
+    def time(self):
+        return self.time_ns() / 1000000000.0
+
+
+    def time_ns(self):
+        with self.__lock:
+            elapsed = 0
+            if self.rate:
+                elapsed = int((time.time() - self.__base_real) * self.rate *
+                              1000000000)
+            return self.__base_virt + elapsed
+
+
+    def advance(self, seconds):
+        """
+        It moves the clock forward of the given number of seconds
+        """
+        with self.__lock:
+            self.__base_virt += int(seconds * 1000000000)
+        for fn in self.__listeners:
+            fn()
+
+
+    def advance_to(self, nsec):
+        """
+        It moves the clock forward to the given time (ns)
+        """
+        delta = nsec - self.time_ns()
+        if delta > 0:
+            self.advance(delta / 1000000000.0)
+
+
+    def sleep(self, seconds):
+        if self.rate:
+            time.sleep(seconds / self.rate)
+        else:
+            self.advance(seconds)
+
+
+    def real_timeout(self, seconds):
+        return seconds / self.rate if self.rate else None
+
+
+    def is_stepped(self):
+        return not self.rate
+
+
+    def add_listener(self, fn):
+        self.__listeners.append(fn)
+
+
+    def waiting(self, fds):
+        """
+        It returns a context manager: within its 'with' block the calling
+        thread waits for the given file descriptors (e.g. it is in poll() or
+        in read() on them)
+        """
+        return _Wait(self.__waits, fds)
+
+
+    def waited(self):
+        """
+        It returns the file descriptors that the tests are waiting for
+        """
+        return [fd for fds in list(self.__waits.values()) for fd in fds]
+
+
+clock = RealClock()
+
+def set_clock(new_clock):
+    """
+    It replaces the clock used by the test suite
+    """
+    global clock
+    clock = new_clock
+
+
+def get_clock():
+    return clock
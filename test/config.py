@@ -4,8 +4,121 @@
 @license: GPLv2
 """
 
+# # # # # # Backend configuration # # # # # # # #
+
+# "kernel" runs the tests on the loaded ZIO modules, "sim" runs them on a
+# simulated zio-zero device (see test.sim)
+backend = "kernel"
+
+# Speed of the clock on the simulated backend: 1 is the real time, N runs N
+# times faster than the real time, 0 advances only when the tests sleep or
+# wait for a block
+sim_clock_rate = 1
+
+# Number of test modules to run at the same time (see test.runner). With 1
+# the modules run one after the other
+jobs = 1
+
+# Seconds that the parallel runner waits for a worker on top of the usual
+# duration of its test; then it gives the test up as failed. The tests
+# without a duration history have just these seconds, but the long ones
+# (tags timing, stress and module-load) wait as long as they need
+worker_timeout = 600
+
+# The zio-zero devices that the parallel runner can use. On the simulated
+# backend these are the devices created
+devices = ["zzero-0000"]
+
+# Files where to save the results of the run in JSON and JUnit XML format
+# (see test.results). Empty to not save them
+results_json = ""
+results_junit = ""
+
+# File with the history of the test durations (see test.durations), e.g.
+# "~/.zio-ut-durations.json". Empty to not use it
+durations_db = ""
+
+# A test is reported as a regression when it takes more than this many times
+# its usual duration
+duration_regression = 1.5
+
+# File where to save the capabilities of the ZIO framework (see
+# test.manifest). Empty to scan the ZIO tree in each process
+manifest_path = "~/.zio-ut-manifest.json"
+
+# True to restore, after each test, the attributes of the device changed by
+# the test (see test.snapshot)
+isolate = True
+
+# True to account the blocks lost on each channel read by a test; the
+# report goes in the results (see test.losses)
+loss_accounting = True
+
+# True to keep the char devices open across the iterations of a test and
+# across the tests, until the buffer changes; the open and close counts go
+# in the results (see test.handles). It is off by default: it reaches into
+# the ZioCharDevice objects of PyZio.
+handle_pool = False
+
+# Directory where each test saves the blocks it reads, one capture file for
+# each test (see test.capture). Empty to not record. The data of the blocks
+# can be compressed with "zlib" or "lzma"
+record_dir = ""
+record_compression = ""
+
+# Directory of the capture files to replay: each test reads the blocks of its
+# capture file instead of those of the device (see test.capture). Empty to
+# read the device
+replay_dir = ""
+
+# # # # # # Benchmark configuration # # # # # # # #
+
+# Seconds of acquisition for each point of a benchmark (see zio-bench.py)
+bench_duration = 2
+
+# Channel sets to drive: 0 is input8, 1 is input16, 2 is input32 (the
+# write benchmark drives the output channel sets, e.g. 3 output8)
+bench_csets = [0, 1, 2]
+
+# Triggers and buffers to use; no buffers means all the loaded ones
+bench_triggers = ["hrt", "timer"]
+bench_buffers = []
+
+# Values of 'post-samples' to sweep
+bench_post_samples = [16, 256, 4096]
+
+# Trigger periods used to push data as fast as possible
+bench_hrt_period_ns = 100000
+bench_timer_ms_period = 1
+
+# Number of fires of the latency benchmark, and width (us) of the bins of
+# its histogram. The histogram is saved in CSV format in 'bench_histogram'
+bench_fires = 1000
+bench_hist_bin_us = 10
+bench_histogram = ""
+
+# Reader strategies of the maximum rate benchmark ('ring' reads in batches,
+# see test.blockio), and the precision of its search (fraction of the period)
+bench_readers = ["select", "poll", "ring"]
+bench_maxrate_precision = 0.1
+
+# Values of 'post-samples' of the data path benchmark, and the size of its
+# vmalloc buffer
+bench_mmap_post_samples = [4096, 65536]
+bench_mmap_buffer_kb = 4096
+
+# Blocks written at once by the write benchmark
+bench_write_batch = 8
+
+# File where to save the benchmark results in JSON format, empty to not save
+# them
+bench_json = ""
+
 # # # # # # SYSFS configuration # # # # # # # #
 
+# The zio-zero device to use
+device = "zzero-0000"
+
 # default buffer and trigger
 trig = "timer"
 buf = "kmalloc"
@@ -36,6 +149,10 @@ hrt_slack_nsec = 10000000
 time_tollerance_nsec = 20000000
 time_tollerance_msec = time_tollerance_nsec / 1000000
 
+# Fraction of the periods of a periodic acquisition that can be out of
+# tolerance (see test.analysis)
+timing_max_outliers = 0.0
+
 # Time to wait (seconds) before reading the acquisition. Usually used with
 # trigger timer to allow the trigger to fill the buffer
 acquisition_wait = 0.5
@@ -52,5 +169,10 @@ skip_long_test = False
 # True if you want to skip very long test (> 1 hour)
 skip_very_long_test = True
 
+# Number of reader processes of the concurrent read test, and the
+# 'ms-period' of the timer that fills the buffer for it
+concurrent_readers = 10
+concurrent_ms_period = 2
+
 # Number of block to load when you need a filled buffer
 n_block_load = 10
@@ -0,0 +1,176 @@
+"""
+@author: Federico Vaga <federico.vaga@gmail.com>
+@copyright: CERN 2014
+@license: GPLv2
+
+Layout of struct zio_control (zio-user.h) and bulk decoding of control
+blocks. decode() turns a buffer of many 512-byte controls into columns (one
+array for each field) in a single pass, so the checks on the sequence
+numbers, on the time stamps and on the attributes can run over a whole
+acquisition at once. It uses a NumPy structured type when NumPy is
+available, struct.iter_unpack() otherwise. patch() makes the controls of the
+blocks written to an output channel.
+"""
+import struct
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+CTRL_SIZE = 512
+
+# struct zio_control, little endian and packed
+CTRL_FORMAT = "<BBBBIIHH" + \
+              "HBB8sIHH12s" + \
+              "QQQ" + \
+              "III" + \
+              "12s" + \
+              "HHI16I32I" + \
+              "HHI16I32I" + \
+              "16s"
+
+# Offset of the sequence number, of the number of samples, of the time
+# stamp and of 'mem_offset' within the control
+SEQ_NUM_OFFSET = 4
+NSAMPLES_OFFSET = 8
+TSTAMP_OFFSET = struct.calcsize("<BBBBIIHH" + "HBB8sIHH12s")
+MEM_OFFSET_OFFSET = TSTAMP_OFFSET + struct.calcsize("<QQQ")
+
+_U32 = struct.Struct("<I")
+
+# Position of the fields in the unpacked control
+_SEQ_NUM = 4
+_ALARMS_ZIO = 2
+_NSAMPLES = 5
+_SSIZE = 6
+_CSET = 13
+_CHAN = 14
+_SECONDS = 16
+_TICKS = 17
+_CHAN_ATTR = 23
+_TRIG_ATTR = _CHAN_ATTR + 51
+
+_ATTR_DTYPE = [("std_mask", "<u2"), ("unused", "<u2"), ("ext_mask", "<u4"),
+               ("std_val", "<u4", (16,)), ("ext_val", "<u4", (32,))]
+CTRL_DTYPE = [("major_version", "u1"), ("minor_version", "u1"),
+              ("alarms_zio", "u1"), ("alarms_dev", "u1"),
+              ("seq_num", "<u4"), ("nsamples", "<u4"), ("ssize", "<u2"),
+              ("nbits", "<u2"),
+              ("sa_family", "<u2"), ("host_type", "u1"), ("filler", "u1"),
+              ("hostid", "S8"), ("dev_id", "<u4"), ("cset_i", "<u2"),
+              ("chan_i", "<u2"), ("devname", "S12"),
+              ("seconds", "<u8"), ("ticks", "<u8"), ("bins", "<u8"),
+              ("mem_offset", "<u4"), ("reserved", "<u4"), ("flags", "<u4"),
+              ("triggername", "S12"),
+              ("attr_channel", _ATTR_DTYPE), ("attr_trigger", _ATTR_DTYPE),
+              ("tlv", "S16")]
+
+
+class CtrlColumns(object):
+    """
+    The fields of a sequence of controls, one array (or list) for each
+    field. 'chan_std_val' and 'trig_std_val' have one row of 16 values for
+    each control.
+    """
+
+    def __init__(self, count):
+        self.count = count
+
+
+    def __len__(self):
+        return self.count
+
+
+def decode(buf):
+    """
+    It decodes a buffer of consecutive control blocks and it returns their
+    CtrlColumns
+    """
+    if len(buf) % CTRL_SIZE:
+        raise ValueError("{0} bytes are not a whole number of controls".format(
+                         len(buf)))
+    if numpy is not None:
+        return _decode_numpy(buf)
+    return _decode(buf)
+
+
+def _decode_numpy(buf):
+    ctrls = numpy.frombuffer(buf, dtype = numpy.dtype(CTRL_DTYPE))
+    cols = CtrlColumns(len(ctrls))
+    cols.seq_num = ctrls["seq_num"].astype(numpy.int64)
+    cols.alarms_zio = ctrls["alarms_zio"]
+    cols.nsamples = ctrls["nsamples"]
+    cols.ssize = ctrls["ssize"]
+    cols.cset_i = ctrls["cset_i"]
+    cols.chan_i = ctrls["chan_i"]
+    cols.tstamp_ns = ctrls["seconds"].astype(numpy.int64) * 1000000000 + \
+                     ctrls["ticks"].astype(numpy.int64)
+    cols.chan_std_mask = ctrls["attr_channel"]["std_mask"]
+    cols.chan_std_val = ctrls["attr_channel"]["std_val"]
+    cols.trig_std_mask = ctrls["attr_trigger"]["std_mask"]
+    cols.trig_std_val = ctrls["attr_trigger"]["std_val"]
+    return cols
+
+
+def _decode(buf):
+    values = list(struct.iter_unpack(CTRL_FORMAT, buf))
+    cols = CtrlColumns(len(values))
+    cols.seq_num = [v[_SEQ_NUM] for v in values]
+    cols.alarms_zio = [v[_ALARMS_ZIO] for v in values]
+    cols.nsamples = [v[_NSAMPLES] for v in values]
+    cols.ssize = [v[_SSIZE] for v in values]
+    cols.cset_i = [v[_CSET] for v in values]
+    cols.chan_i = [v[_CHAN] for v in values]
+    cols.tstamp_ns = [v[_SECONDS] * 1000000000 + v[_TICKS] for v in values]
+    cols.chan_std_mask = [v[_CHAN_ATTR] for v in values]
+    cols.chan_std_val = [list(v[_CHAN_ATTR + 3:_CHAN_ATTR + 19])
+                         for v in values]
+    cols.trig_std_mask = [v[_TRIG_ATTR] for v in values]
+    cols.trig_std_val = [list(v[_TRIG_ATTR + 3:_TRIG_ATTR + 19])
+                         for v in values]
+    return cols
+
+
+def patch(ctrl, seq_num = None, nsamples = None):
+    """
+    It returns a copy of a binary control with the given sequence number
+    and number of samples, the other fields as they are
+    """
+    ctrl = bytearray(ctrl)
+    if seq_num is not None:
+        _U32.pack_into(ctrl, SEQ_NUM_OFFSET, seq_num & 0xFFFFFFFF)
+    if nsamples is not None:
+        _U32.pack_into(ctrl, NSAMPLES_OFFSET, nsamples)
+    return ctrl
+
+
+def nsamples(ctrl):
+    """
+    It returns the number of samples of a binary control
+    """
+    return _U32.unpack_from(ctrl, NSAMPLES_OFFSET)[0]
+
+
+def seq_gaps(cols):
+    """
+    It returns the gaps in the sequence numbers as a list of (index, number
+    of missing blocks before the control at index)
+    """
+    seqs = [int(s) for s in cols.seq_num]
+    return [(i + 1, b - a - 1) for i, (a, b) in enumerate(zip(seqs, seqs[1:]))
+            if b - a != 1]
+
+
+def std_attr(cols, kind, index):
+    """
+    It returns the values of the standard attribute 'index' of the trigger
+    ("trigger") or of the channel ("channel"), None for the controls where
+    the attribute is not valid (its bit in 'std_mask' is clear)
+    """
+    if kind == "trigger":
+        masks, values = cols.trig_std_mask, cols.trig_std_val
+    else:
+        masks, values = cols.chan_std_mask, cols.chan_std_val
+    return [int(v[index]) if int(m) & (1 << index) else None
+            for m, v in zip(masks, values)]
@@ -0,0 +1,161 @@
+"""
+@author: Federico Vaga <federico.vaga@gmail.com>
+@copyright: CERN 2014
+@license: GPLv2
+
+A cache of the PyZio device models shared by the tests. Building a ZioDev
+walks the whole sysfs hierarchy of the device and creates an object for each
+attribute; the tests get the device from here, so it is built only the
+first time it is used.
+
+A cached device is valid while:
+- the capability manifest does not change (see test.manifest), i.e. no
+  module was loaded or unloaded;
+- the current trigger and buffer of its channel sets are the ones the model
+  was built with. The swaps done with set_current_trigger() and
+  set_current_buffer() update the model, PyZio rebuilds the trigger and the
+  buffers of the channel set; a swap done by other means (e.g. a shell)
+  invalidates the device.
+
+The listeners (see add_listener() and add_build_listener()) learn about the
+swaps and the rebuilds.
+"""
+from PyZio.ZioDev import ZioDev
+from PyZio import ZioConfig
+from test import manifest
+
+_cache = {}  # (devices_path, name) -> _Entry
+_hooked = []
+_listeners = []
+_build_listeners = []
+_GETTERS = {"set_current_trigger": "get_current_trigger",
+            "set_current_buffer": "get_current_buffer"}
+
+
+class _Entry(object):
+    def __init__(self, device):
+        self.device = device
+        self.fingerprint = manifest.get().fingerprint
+        self.state = dict([(cset.fullpath, _cset_state(cset))
+                           for cset in device.cset])
+
+
+    def is_valid(self):
+        if self.fingerprint != manifest.get().fingerprint:
+            return False
+        for cset in self.device.cset:
+            if self.state.get(cset.fullpath) != _cset_state(cset):
+                return False
+        return True
+
+
+def get_device(name):
+    """
+    It returns the model of a device, None if the device does not exist
+    """
+    key = (ZioConfig.devices_path, name)
+    entry = _cache.get(key)
+    if entry is not None and entry.is_valid():
+        return entry.device
+
+    if entry is not None:
+        del _cache[key]
+        _dropped(entry)
+    if not manifest.has_device(name):
+        return None
+    device = ZioDev(ZioConfig.devices_path, name)
+    _hook(device)
+    _cache[key] = _Entry(device)
+    for listener in _build_listeners:
+        listener(device)
+    return device
+
+
+def invalidate(name = None):
+    """
+    It removes a device, or all of them, from the cache
+    """
+    for key in list(_cache):
+        if name is None or key[1] == name:
+            del _cache[key]
+    _changed(None, None)
+
+
+def add_listener(listener):
+    """
+    It calls listener(cset, kind) when the trigger or the buffer ('kind' is
+    "trigger" or "buffer") of a channel set changes: before a swap done
+    through PyZio, or when a swap done by other means is found. It calls
+    listener(None, None) when the modules change or the cached models are
+    invalidated.
+    """
+    if listener not in _listeners:
+        _listeners.append(listener)
+
+
+def add_build_listener(listener):
+    """
+    It calls listener(device) for each device model built from now on, and
+    for the cached ones
+    """
+    if listener in _build_listeners:
+        return
+    _build_listeners.append(listener)
+    for entry in list(_cache.values()):
+        listener(entry.device)
+
+
+def _dropped(entry):
+    if entry.fingerprint != manifest.get().fingerprint:
+        _changed(None, None)
+        return
+    for cset in entry.device.cset:
+        old = entry.state.get(cset.fullpath, (None, None))
+        for kind, before, now in zip(("trigger", "buffer"), old,
+                                     _cset_state(cset)):
+            if before != now:
+                _changed(cset, kind)
+
+
+def _changed(cset, kind):
+    for listener in _listeners:
+        listener(cset, kind)
+
+
+def _cset_state(cset):
+    return (cset.get_current_trigger(), cset.get_current_buffer())
+
+
+def _swapped(cset):
+    """
+    The trigger or the buffer of a channel set was swapped through PyZio
+    """
+    for entry in _cache.values():
+        if [c for c in entry.device.cset if c is cset]:
+            entry.state[cset.fullpath] = _cset_state(cset)
+
+
+def _hook(device):
+    """
+    It wraps the methods that swap trigger and buffer of the channel set
+    class, so the cache knows about the swap
+    """
+    for cset in device.cset:
+        cls = type(cset)
+        if cls in _hooked:
+            continue
+        _hooked.append(cls)
+        for method in ("set_current_trigger", "set_current_buffer"):
+            setattr(cls, method, _notify(getattr(cls, method),
+                                         _GETTERS[method]))
+
+
+def _notify(method, getter):
+    kind = getter[len("get_current_"):]
+    def swap(cset, name, *args, **kwargs):
+        if _listeners and getattr(cset, getter)() != name:
+            _changed(cset, kind)
+        ret = method(cset, name, *args, **kwargs)
+        _swapped(cset)
+        return ret
+    return swap
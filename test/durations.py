@@ -0,0 +1,125 @@
+"""
+@author: Federico Vaga <federico.vaga@gmail.com>
+@copyright: CERN 2014
+@license: GPLv2
+
+The history of the test durations. After each run the wall time of the
+passed tests is saved in a local JSON file ('durations_db', none by
+default), separately for each combination of the configuration values that
+change the duration of the tests. The history is used to estimate the time
+of a run, to run the longest tests first and to find the tests that became
+slower.
+"""
+from test import config
+import json
+import os
+
+# The configuration values that change the test durations
+CONFIG_KEYS = ("backend", "sim_clock_rate", "trig", "buf", "nstress",
+               "nrandom", "timer_ms_period", "acquisition_wait",
+               "n_block_overflow", "n_block_load")
+
+# Number of durations to keep for each test
+HISTORY_LEN = 10
+
+# A test that takes less than this (seconds) more than usual is not a
+# regression, it is noise
+REGRESSION_MIN_DELTA = 0.5
+
+
+class DurationDB(object):
+    """
+    It stores the last durations of each test for the current configuration
+    """
+
+    def __init__(self, path = None):
+        self.path = os.path.expanduser(path or config.durations_db)
+        self.key = config_key()
+        self.data = {}
+        try:
+            with open(self.path, "r") as f:
+                self.data = json.load(f)
+        except (IOError, OSError, ValueError):
+            pass  # No history yet, or a broken one
+        self.history = self.data.setdefault(self.key, {})
+
+
+    def estimate(self, test_id):
+        """
+        It returns the expected duration of a test (seconds), None if it
+        never ran with this configuration
+        """
+        times = self.history.get(test_id)
+        if not times:
+            return None
+        return _median(times)
+
+
+    def estimate_module(self, name):
+        """
+        It returns the expected duration of all the tests within a module
+        (or class), None if none of them ever ran
+        """
+        times = [self.estimate(test_id) for test_id in self.history
+                 if test_id == name or test_id.startswith(name + ".")]
+        if not times:
+            return None
+        return sum(times)
+
+
+    def update(self, records):
+        """
+        It adds the durations of the passed tests to the history. It returns
+        the records of the tests slower than 'duration_regression' times
+        their usual duration, and it marks them with the ratio.
+        """
+        regressions = []
+        for rec in records:
+            if rec["status"] != "pass":
+                continue
+            usual = self.estimate(rec["id"])
+            if usual is not None and \
+               rec["time"] > usual * config.duration_regression and \
+               rec["time"] - usual > REGRESSION_MIN_DELTA:
+                rec["regression"] = rec["time"] / usual
+                regressions.append(rec)
+            times = self.history.setdefault(rec["id"], [])
+            times.append(rec["time"])
+            del times[:-HISTORY_LEN]
+        return regressions
+
+
+    def save(self):
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.data, f, indent = 1, sort_keys = True)
+        os.rename(tmp, self.path)
+
+
+def config_key():
+    """
+    It returns the key of the current configuration in the history
+    """
+    return ",".join(["{0}={1}".format(k, getattr(config, k))
+                     for k in CONFIG_KEYS])
+
+
+def _median(values):
+    values = sorted(values)
+    mid = len(values) // 2
+    if len(values) % 2:
+        return values[mid]
+    return (values[mid - 1] + values[mid]) / 2.0
+
+
+def format_eta(seconds):
+    if seconds is None:
+        return "unknown"
+    minutes, seconds = divmod(int(seconds + 0.5), 60)
+    return "{0}m{1:02d}s".format(minutes, seconds)
+
+
+def report_regressions(regressions):
+    for rec in regressions:
+        print("WARNING: {0} took {1:.3f}s, {2:.1f} times its usual duration".format(
+              rec["id"], rec["time"], rec["regression"]))
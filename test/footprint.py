@@ -0,0 +1,65 @@
+"""
+@author: Federico Vaga <federico.vaga@gmail.com>
+@copyright: CERN 2014
+@license: GPLv2
+
+The resources used by a test module. The parallel runner uses them to run at
+the same time only the tests that do not touch the same resources.
+"""
+
+
+class Footprint(object):
+    """
+    It describes what a test uses on a zio-zero device:
+
+    csets -- the indexes of the channel sets used by the test, None means all
+             the channel sets of the device
+    trigger -- the trigger type required by the test (None: the default one)
+    buffer -- the buffer type required by the test (None: the default one)
+    exclusive -- the test changes the whole ZIO framework (e.g. it loads and
+                 unloads modules), nothing else can run with it
+    """
+
+    def __init__(self, csets = None, trigger = None, buffer = None,
+                 exclusive = False):
+        self.csets = None if csets is None else frozenset(csets)
+        self.trigger = trigger
+        self.buffer = buffer
+        self.exclusive = exclusive
+
+
+    def conflicts(self, other):
+        """
+        It returns True if the two footprints cannot run together on the same
+        device: they share a channel set, or they need different types of
+        trigger, or of buffer, even on different channel sets
+        """
+        if self.exclusive or other.exclusive:
+            return True
+        if self.csets is None or other.csets is None:
+            return True
+        if len(self.csets & other.csets) > 0:
+            return True
+        return _differ(self.trigger, other.trigger) or \
+               _differ(self.buffer, other.buffer)
+
+
+    def __repr__(self):
+        if self.exclusive:
+            return "exclusive"
+        csets = "all" if self.csets is None else \
+                ",".join([str(i) for i in sorted(self.csets)])
+        return "csets={0} trigger={1} buffer={2}".format(csets, self.trigger,
+                                                        self.buffer)
+
+
+def _differ(a, b):
+    """
+    It returns True when two tests need different types (None: any type)
+    """
+    return a is not None and b is not None and a != b
+
+
+# Common footprints
+EXCLUSIVE = Footprint(exclusive = True)
+DEVICE = Footprint()
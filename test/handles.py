@@ -0,0 +1,219 @@
+"""
+@author: Federico Vaga <federico.vaga@gmail.com>
+@copyright: CERN 2014
+@license: GPLv2
+
+A pool of the file descriptors of the char devices. The stress tests open
+and close the char devices of a channel at each iteration, and the time of
+open() and close() ends up in their numbers. When the pool is enabled
+(config.handle_pool), it is attached to the channel interfaces of the cached
+device models (see test.devcache): a char device closed through an interface stays open in the
+pool, and the next open of the same char device with the same flags gets it
+back. The descriptors live across the iterations and across the tests, and
+across the rebuilds of the models while the char devices do not change.
+
+The pool closes the descriptors for real when the buffer of a channel set
+changes (see test.devcache.add_listener()), when the modules change and
+before a test that loads or unloads the modules. A swap of the trigger
+keeps them open. The counters of each test go in its record (see
+test.results).
+
+A ZioCharDevice keeps its descriptors in private attributes: the pool must
+replace them, and it fails loudly when the PyZio in use keeps them
+elsewhere.
+"""
+import fcntl
+import time
+import os
+
+# File status flags that fcntl(F_SETFL) can change on an open descriptor
+_STATUS_FLAGS = os.O_APPEND | os.O_NONBLOCK | getattr(os, "O_ASYNC", 0)
+
+
+class HandlePool(object):
+    """
+    It keeps the closed descriptors, by path and flags, for the next open
+    """
+
+    def __init__(self):
+        self.parked = {}  # (path, flags) -> [fd]
+        self.owned = {}  # fd -> (path, flags)
+        self.clear_stats()
+
+
+    def clear_stats(self):
+        self.opens = 0
+        self.reuses = 0
+        self.closes = 0
+        self.open_time = 0.0
+        self.close_time = 0.0
+
+
+    def open(self, path, flags, *args):
+        """
+        It returns a parked descriptor for the path and the flags, it opens
+        a new one when there is none
+        """
+        key = (path, flags)
+        fds = self.parked.get(key)
+        if fds:
+            fd = fds.pop()
+            fcntl.fcntl(fd, fcntl.F_SETFL, flags & _STATUS_FLAGS)
+            self.reuses += 1
+            return fd
+        start = time.time()
+        fd = os.open(path, flags, *args)
+        self.open_time += time.time() - start
+        self.opens += 1
+        self.owned[fd] = key
+        return fd
+
+
+    def close(self, fd):
+        """
+        It parks a descriptor opened by the pool, it closes any other
+        """
+        key = self.owned.get(fd)
+        if key is None:
+            os.close(fd)
+            return
+        self.parked.setdefault(key, []).append(fd)
+
+
+    def reset(self, path_prefix = None):
+        """
+        It closes the parked descriptors, only those of the char devices
+        starting with 'path_prefix' if given. The descriptors in use stay
+        open, they are closed for real when they get back to the pool.
+        """
+        for key in list(self.parked):
+            if path_prefix is not None and \
+               not os.path.basename(key[0]).startswith(path_prefix):
+                continue
+            for fd in self.parked.pop(key):
+                del self.owned[fd]
+                start = time.time()
+                os.close(fd)
+                self.close_time += time.time() - start
+                self.closes += 1
+
+
+    def report(self):
+        return {"opens": self.opens, "reuses": self.reuses,
+                "closes": self.closes, "open_time": self.open_time,
+                "close_time": self.close_time,
+                "parked": sum([len(fds) for fds in self.parked.values()])}
+
+
+def attach(interface, pool):
+    """
+    It makes a channel interface (a ZioCharDevice) open and close its char
+    devices through the pool
+    """
+    if getattr(interface, "_handle_pool", None) is pool:
+        return
+    interface._handle_pool = pool
+    fdc = _fd_attribute(interface, "fdc")
+    fdd = _fd_attribute(interface, "fdd")
+
+    def opener(path, attr, fileno):
+        def open_fd(perm):
+            fd = pool.open(getattr(interface, path), perm)
+            setattr(interface, attr, fd)
+            if getattr(interface, fileno)() != fd:
+                pool.close(fd)
+                raise AttributeError("{0} does not keep its descriptor in '{1}', "
+                                     "run with handle_pool=0".format(
+                                     type(interface).__name__, attr))
+        return open_fd
+
+    def closer(attr):
+        def close_fd():
+            fd = getattr(interface, attr)
+            if fd is not None:
+                pool.close(fd)
+                setattr(interface, attr, None)
+        return close_fd
+
+    interface.open_ctrl = opener("ctrlfile", fdc, "fileno_ctrl")
+    interface.open_data = opener("datafile", fdd, "fileno_data")
+    interface.close_ctrl = closer(fdc)
+    interface.close_data = closer(fdd)
+
+    def open_ctrl_data(perm):
+        interface.open_ctrl(perm)
+        interface.open_data(perm)
+
+    def close_ctrl_data():
+        interface.close_ctrl()
+        interface.close_data()
+
+    interface.open_ctrl_data = open_ctrl_data
+    interface.close_ctrl_data = close_ctrl_data
+
+
+def _fd_attribute(interface, suffix):
+    """
+    It returns the name of the attribute where a ZioCharDevice keeps the
+    descriptor of a char device ('fdc' for control, 'fdd' for data)
+    """
+    for name in vars(interface):
+        if name.endswith(suffix):
+            return name
+    raise AttributeError("{0} has no descriptor '{1}'".format(
+                         type(interface).__name__, suffix))
+
+
+# # # # # # The pool of the tests # # # # # # # #
+
+_pool = None
+
+
+def enable():
+    """
+    It makes the channel interfaces of this process use the pool from now on
+    """
+    global _pool
+    if _pool is not None:
+        return
+    from test import devcache  # it needs PyZio
+    _pool = HandlePool()
+    devcache.add_listener(_changed)
+    devcache.add_build_listener(_built)
+
+
+def _built(device):
+    for cset in device.cset:
+        for chan in cset.chan:
+            attach(chan.interface, _pool)
+
+
+def _changed(cset, kind):
+    if cset is None:
+        reset()
+        return
+    if kind != "buffer":
+        return  # the char devices stay valid across a trigger swap
+    # the char devices of a channel set are named <device>-<cset>-<chan>-*
+    reset("{0}-{1}-".format(cset.dev.name, cset.name[4:]))
+
+
+def reset(path_prefix = None):
+    """
+    It closes the parked descriptors (see HandlePool.reset())
+    """
+    if _pool is not None:
+        _pool.reset(path_prefix)
+
+
+def clear_stats():
+    if _pool is not None:
+        _pool.clear_stats()
+
+
+def report():
+    """
+    It returns the counters of the pool since the last clear_stats(), None
+    when the pool is not enabled
+    """
+    return _pool.report() if _pool is not None else None
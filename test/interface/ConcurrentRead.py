@@ -4,125 +4,120 @@
 @license: GPLv2
 """
 
-from PyZio.ZioConfig import devices_path, triggers, buffers
-from PyZio.ZioDev import ZioDev
-from PyZio.ZioCharDevice import ZioCharDevice
-from test import config
-from multiprocessing import Process, Queue
+from test import config, utils, manifest, devcache, readpool
 import unittest
-import time
-import os
+import sys
 
-path = os.path.join(devices_path, "zzero-0000")
-
-@unittest.skipIf(not (os.path.exists(path) and os.path.isdir(path)),
+@unittest.skipIf(not manifest.has_device(config.device),
                  "zio zero is not loaded")
-@unittest.skipIf(not (config.buf in buffers),
+@unittest.skipIf(not manifest.has_buffer(config.buf),
                  "Buffer '" + config.buf + "' " + \
                  "is required for this test")
-@unittest.skipIf(not ("timer" in triggers),
+@unittest.skipIf(not manifest.has_trigger("timer"),
                  "Trigger 'timer' is required for this test")
 class ConcurrentRead(unittest.TestCase):
     """
-    It tests the char device interface during concurrent read.
+    It tests the char device interface during concurrent read. The readers
+    are the processes of a pool (see test.readpool), started once for all
+    the tests.
     """
 
+    @classmethod
+    def setUpClass(cls):
+        cls.pool = readpool.ReaderPool(config.concurrent_readers)
+
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.pool.close()
+
+
     def setUp(self):
-        self.device = ZioDev(devices_path, "zzero-0000")
+        self.device = devcache.get_device(config.device)
         if self.device == None:
             self.skipTest("Missing device, cannot run tests")
 
         # Set channel set and channel to use
         self.cset = self.device.cset[0]  # Use cset input8
         self.chan = self.cset.chan[0]
+        self.interface = self.chan.interface
         self.chan.attribute["alarms"].set_value(0xFF)
 
-        # Set and configure 'hrt' trigger
+        # Set and configure 'timer' trigger
+        self.n_block = 512
         self.cset.set_current_trigger("timer")
         self.trigger = self.cset.trigger
         self.trigger.disable()
-        self.trigger.attribute["ms-period"].set_value(config.timer_ms_period);
+        self.trigger.attribute["ms-period"].set_value(config.concurrent_ms_period)
 
         # Set and flush buffer
         self.cset.set_current_buffer(config.buf)
         self.chan.buffer.flush()
-        self.chan.buffer.attribute["max-buffer-len"].set_value(512)
-
-
-        self.blocks_queue = Queue()
-        self.acquired_blocks = []
-
-        print("\nit can take about 1 minute")
+        self.chan.buffer.attribute["max-buffer-len"].set_value(self.n_block)
+        sys.stdout.write("\n")
 
     def tearDown(self):
         self.trigger.disable()
 
 
-    def test_concurrent_control_acquisition(self):
-        """
-        It test that concurrent read does not allow the user to read the same
-        block in different process.
-        """
-        self.process_list = []
-
-        # Enable trigger
+    def _fill_buffer(self):
+        self.trigger.disable()
+        self.chan.buffer.flush()
         self.trigger.enable()
-        time.sleep(0.1 * 512)
+        utils.sleep(config.concurrent_ms_period * self.n_block / 1000.0)
         self.trigger.disable()
 
-        for i in range(10):
-            p = Process(target = _control_acquisition, args = (i, self.chan, self.blocks_queue))
-            self.process_list.append(p)
 
-        # Start all process
-        for proc in self.process_list:
-            proc.start()
+    def _concurrent_read(self, nreaders, read_data = False):
+        """
+        It reads the buffer with 'nreaders' readers at the same time. It
+        returns the statistics of the read and the sequence numbers of the
+        blocks read by all the readers
+        """
+        seen = set()
+        duplicated = []
+        def account(reader, ctrl, data):
+            seq_num = readpool.seq_num(ctrl)
+            if seq_num in seen:
+                duplicated.append((reader, seq_num))
+            seen.add(seq_num)
 
-        self._test_concurrent_control_acquisition(self.blocks_queue)
+        try:
+            result = self.pool.read(self.interface, nreaders,
+                                    read_data = read_data, on_block = account)
+        except RuntimeError as e:
+            self.fail(str(e))
+        print(result)
+        self.assertEqual([], duplicated,
+            "Duplicated acquisition (reader, sequence number): {0}".format(duplicated))
+        return result, seen
 
 
-        # Wait the end of all process
-        for proc in self.process_list:
-            if proc.is_alive():
-                proc.join()
+    def test_concurrent_control_acquisition(self):
+        """
+        It test that concurrent read does not allow the user to read the same
+        block in different process.
+        """
+        self._fill_buffer()
+        self._concurrent_read(len(self.pool))
 
 
-    def _test_concurrent_control_acquisition(self, queue):
+    def test_concurrent_scaling(self):
         """
-        It tests that no duplicated block was acquired and that all blocks
-        have consecutive sequence number.
+        It reads the buffer, samples included, with 1 to N readers: together
+        the readers must read every block of the buffer once, whatever their
+        number
         """
-        is_duplicated = False
+        nreaders = 1
         while True:
-            try:
-                blocks = queue.get(True, 2)  # Blocking request for 1s
-            except:
+            self._fill_buffer()
+            result, seen = self._concurrent_read(nreaders, read_data = True)
+            self.assertGreater(result.blocks, 0, "No block acquired")
+            self.assertGreater(result.bytes, 0, "No sample read")
+            expected = set(range(min(seen), max(seen) + 1))
+            self.assertEqual(expected, seen,
+                "{0} readers did not read the blocks {1}".format(nreaders,
+                sorted(expected - seen)))
+            if nreaders == len(self.pool):
                 break
-
-            proc_id, ctrl, _data = blocks
-            if ctrl in self.acquired_blocks:
-                is_duplicated = True
-            else:
-                self.acquired_blocks.append(ctrl)
-
-        self.assertFalse(is_duplicated,
-            "Duplicated acquisition at process {0}".format(proc_id))
-
-
-def _control_acquisition(proc_id, channel, queue):
-    """
-    It acquires blocks from the channel buffer and put them in the queue shared
-    with the other processes
-    """
-    time.sleep(1)  # Sleep to allow all processes to start
-    interface = ZioCharDevice(channel)
-    interface.open_ctrl(os.O_RDONLY | os.O_NONBLOCK)
-    while interface.is_device_ready(0)[0]:
-        try:
-            block = (proc_id, interface.read_ctrl(), interface.read_data())
-            queue.put(block)
-        except:
-            print("Some other process stole the block")
-            continue
-    queue.close()
-    interface.close_ctrl()
+            nreaders = min(nreaders * 2, len(self.pool))
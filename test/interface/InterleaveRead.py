@@ -0,0 +1,139 @@
+"""
+@author: Federico Vaga <federico.vaga@gmail.com>
+@copyright: CERN 2014
+@license: GPLv2
+"""
+
+from test import config, utils, manifest, devcache, multiplex, interleave
+import unittest
+import sys
+import os
+
+@unittest.skipIf(not manifest.has_device(config.device),
+                 "zio zero is not loaded")
+@unittest.skipIf(not manifest.has_buffer(config.buf),
+                 "Buffer '" + config.buf + "' " + \
+                 "is required for this test")
+@unittest.skipIf(not manifest.has_trigger("hrt"),
+                 "Trigger 'hrt' is required for this test")
+class InterleaveRead(unittest.TestCase):
+    """
+    It tests the acquisition through the interleaved channel against the
+    acquisition channel by channel: once de-interleaved (see
+    test.interleave), the samples of each channel must look like the ones
+    of the channel itself.
+    """
+
+    def setUp(self):
+        self.device = devcache.get_device(config.device)
+        if self.device == None:
+            self.skipTest("Missing device, cannot run tests")
+        self.csets = [cset for cset in self.device.cset
+                      if cset.is_interleaved()]
+        if not self.csets:
+            self.skipTest("No channel set with an interleaved channel")
+        self.n_fire = 10
+        self.post_samples = 16
+        sys.stdout.write("\n")
+
+
+    def tearDown(self):
+        for cset in self.csets:
+            cset.trigger.disable()
+            cset.interleave.disable()
+            for chan in cset.chan:
+                if not chan.is_interleaved():
+                    chan.enable()
+        sys.stdout.write("\n")
+
+
+    def _setup_cset(self, cset, interleaved):
+        """
+        It enables the interleaved channel, or the normal ones, and it
+        returns the channels to read
+        """
+        cset.set_current_trigger("hrt")
+        cset.trigger.disable()
+        cset.set_current_buffer(config.buf)
+        cset.trigger.attribute["post-samples"].set_value(self.post_samples)
+        cset.trigger.attribute["pre-samples"].set_value(0)
+        chans = [chan for chan in cset.chan if not chan.is_interleaved()]
+        if interleaved:
+            cset.interleave.enable()
+            chans = [cset.interleave]
+        else:
+            cset.interleave.disable()
+            for chan in chans:
+                chan.enable()
+        for chan in cset.chan:
+            chan.buffer.flush()
+        return chans
+
+
+    def _acquire(self, cset, chans):
+        """
+        It fires the trigger 'n_fire' times and it returns the data of each
+        channel, as a dictionary channel -> list of (control, data)
+        """
+        mux = multiplex.Multiplexer()
+        for chan in chans:
+            chan.interface.open_ctrl_data(os.O_RDONLY)
+            mux.register(chan)
+        blocks = dict([(chan, []) for chan in chans])
+        try:
+            utils.trigger_hrt_fill_buffer(cset.trigger, self.n_fire,
+                                          disable = True, chan = chans[-1])
+            read = mux.read_ready(0)
+            while read:
+                for chan, ctrl, data in read:
+                    blocks[chan].append((ctrl, data))
+                read = mux.read_ready(0)
+        finally:
+            mux.close()
+            for chan in chans:
+                chan.interface.close_ctrl_data()
+        return blocks
+
+
+    def test_interleaved_samples(self):
+        """
+        It acquires channel by channel, then through the interleaved
+        channel, and it compares the streams of samples of each channel
+        """
+        for cset in self.csets:
+            chans = self._setup_cset(cset, False)
+            ssize = None
+            profiles = []
+            for chan, blocks in sorted(self._acquire(cset, chans).items(),
+                                       key = lambda item: chans.index(item[0])):
+                self.assertEqual(self.n_fire, len(blocks),
+                    "{0}/{1}: {2} blocks for {3} fires".format(cset.name,
+                    chan.name, len(blocks), self.n_fire))
+                ssize = blocks[0][0].ssize
+                values = []
+                for ctrl, data in blocks:
+                    values += interleave.samples(data, ssize)
+                profiles.append(interleave.profile(values, ssize))
+
+            ichan = self._setup_cset(cset, True)[0]
+            blocks = self._acquire(cset, [ichan])[ichan]
+            self.assertEqual(self.n_fire, len(blocks),
+                "{0}/{1}: {2} blocks for {3} fires".format(cset.name,
+                ichan.name, len(blocks), self.n_fire))
+            streams = [[] for chan in chans]
+            for ctrl, data in blocks:
+                self.assertEqual(self.post_samples * len(chans) * ssize,
+                                 len(data),
+                    "An interleaved block must have the samples of {0} channels".format(
+                    len(chans)))
+                for i, values in enumerate(interleave.deinterleave(data,
+                                                        len(chans), ssize)):
+                    streams[i] += values
+            for chan, reference, values in zip(chans, profiles, streams):
+                self.assertEqual(self.n_fire * self.post_samples, len(values),
+                    "{0}/{1}: {2} de-interleaved samples for {3} fires".format(
+                    cset.name, chan.name, len(values), self.n_fire))
+                self.assertTrue(interleave.same_kind(reference, values, ssize),
+                    "{0}/{1}: the de-interleaved samples are {2}, the channel gives {3}".format(
+                    cset.name, chan.name, interleave.profile(values, ssize),
+                    reference))
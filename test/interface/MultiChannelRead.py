@@ -0,0 +1,199 @@
+"""
+@author: Federico Vaga <federico.vaga@gmail.com>
+@copyright: CERN 2014
+@license: GPLv2
+"""
+
+from test import config, utils, manifest, devcache, multiplex
+import unittest
+import time
+import sys
+import os
+
+@unittest.skipIf(not manifest.has_device(config.device),
+                 "zio zero is not loaded")
+@unittest.skipIf(not manifest.has_buffer(config.buf),
+                 "Buffer '" + config.buf + "' " + \
+                 "is required for this test")
+@unittest.skipIf(not manifest.has_trigger("hrt"),
+                 "Trigger 'hrt' is required for this test")
+class MultiChannelRead(unittest.TestCase):
+    """
+    It tests the acquisition on all the channels of a channel set at once:
+    each fire of the trigger produces one block on every enabled channel.
+    The channels are read together with a single multiplexer (see
+    test.multiplex).
+    """
+
+    def setUp(self):
+        self.device = devcache.get_device(config.device)
+        if self.device == None:
+            self.skipTest("Missing device, cannot run tests")
+        self.csets = [cset for cset in self.device.cset
+                      if cset.chan[0].interface.is_ctrl_readable()]
+        self.mux = None
+        sys.stdout.write("\n")
+
+
+    def tearDown(self):
+        if self.mux is not None:
+            chans = list(self.mux.chans)
+            self.mux.close()
+            for chan in chans:
+                chan.interface.close_ctrl_data()
+        for cset in self.csets:
+            cset.trigger.disable()
+        sys.stdout.write("\n")
+
+
+    def _setup_cset(self, cset):
+        """
+        It enables all the channels (but the interleaved one) of a channel
+        set, it empties their buffers and it watches their char devices. It
+        returns the channels.
+        """
+        cset.set_current_trigger("hrt")
+        cset.trigger.disable()
+        cset.set_current_buffer(config.buf)
+        for chan in cset.chan:
+            if chan.is_interleaved():
+                chan.disable()
+        chans = [chan for chan in cset.chan if not chan.is_interleaved()]
+        for chan in chans:
+            chan.enable()
+            chan.buffer.flush()
+            chan.attribute["alarms"].set_value(0xFF)
+            chan.interface.open_ctrl_data(os.O_RDONLY)
+
+        if self.mux is None:
+            self.mux = multiplex.Multiplexer()
+        for chan in chans:
+            self.mux.register(chan)
+        return chans
+
+
+    def _drain(self, blocks):
+        """
+        It reads the blocks of the watched channels until they are all empty.
+        It appends to 'blocks', for each channel, the (sequence number, time
+        stamp in nanoseconds) of the blocks.
+        """
+        while True:
+            read = self.mux.read_ready(0)
+            if not read:
+                return blocks
+            for chan, ctrl, data in read:
+                self.assertEqual(ctrl.nsamples * ctrl.ssize, len(data),
+                    "Incomplete data on {0}".format(chan.name))
+                blocks.setdefault(chan, []).append((ctrl.seq_num,
+                                    utils.convert_ZioTimeStamp_to_ns(ctrl.tstamp)))
+
+
+    def _common_fires(self, chans, blocks):
+        """
+        It keeps, for each channel, the blocks of the fires that all the
+        channels stored. A full buffer loses the block of one channel and not
+        those of the others, so after a lost block the channels cannot be
+        compared block by block.
+        """
+        if not [chan for chan in chans
+                if utils.zio_alarms(chan) & utils.ZIO_ALARM_LOST_BLOCK]:
+            return blocks
+        fires = None
+        for chan in chans:
+            tstamps = set([tstamp for seq, tstamp in blocks.get(chan, [])])
+            fires = tstamps if fires is None else fires & tstamps
+        return dict([(chan, [block for block in blocks.get(chan, [])
+                             if block[1] in fires]) for chan in chans])
+
+
+    def _check_blocks(self, cset, chans, blocks, n_fire):
+        """
+        It verifies that each fire gave one block on every channel: the i-th
+        blocks of the channels have the same time stamp and their sequence
+        numbers move in lockstep
+        """
+        blocks = dict([(chan, blocks.get(chan, [])) for chan in chans])
+        ref_chan = chans[0]
+        ref = blocks[ref_chan]
+        for chan, chan_blocks in blocks.items():
+            self.assertEqual(n_fire, len(chan_blocks),
+                "{0}/{1}: {2} blocks for {3} fires".format(cset.name,
+                    chan.name, len(chan_blocks), n_fire))
+            for i, ((seq, tstamp), (ref_seq, ref_tstamp)) in \
+                    enumerate(zip(chan_blocks, ref)):
+                self.assertEqual(ref_tstamp, tstamp,
+                    "{0}/{1}: block {2} has time stamp {3}, {4} has {5}".format(
+                    cset.name, chan.name, i, tstamp, ref_chan.name, ref_tstamp))
+                self.assertEqual(seq - chan_blocks[0][0], ref_seq - ref[0][0],
+                    "{0}/{1}: block {2} has sequence number {3}, out of step with {4}".format(
+                    cset.name, chan.name, i, seq, ref_chan.name))
+
+
+    def test_one_block_per_channel(self):
+        """
+        It fires the trigger of each input channel set a few times with all
+        its channels enabled, then it reads all the channels together
+        """
+        n_fire = 10
+        for cset in self.csets:
+            chans = self._setup_cset(cset)
+            utils.trigger_hrt_fill_buffer(cset.trigger, n_fire, disable = True,
+                                          chan = chans[-1])
+            self._check_blocks(cset, chans, self._drain({}), n_fire)
+
+
+    def test_wait_all(self):
+        """
+        It waits for all the channels of each input channel set: none of
+        them is ready before the fire, all of them are ready after it
+        """
+        for cset in self.csets:
+            chans = self._setup_cset(cset)
+            self.assertEqual(chans, self.mux.wait_all(time.time() + 0.05),
+                "{0}: no channel can be ready before the fire".format(
+                cset.name))
+            utils.trigger_hrt_fill_buffer(cset.trigger, 1, disable = True,
+                                          chan = chans[-1])
+            pending = self.mux.wait_all(time.time() + config.select_wait)
+            self.assertEqual([], pending,
+                "{0}: {1} not ready after the fire".format(cset.name,
+                [chan.name for chan in pending]))
+            self._drain({})
+            for chan in chans:
+                self.mux.unregister(chan)
+                chan.interface.close_ctrl_data()
+
+
+    def test_drain_while_acquiring(self):
+        """
+        It reads all the channels of all the input channel sets while a
+        periodic trigger acquires on all of them
+        """
+        n_fire = 50
+        period_ns = 2000000
+        chans = {}
+        for cset in self.csets:
+            chans[cset] = self._setup_cset(cset)
+        for cset in self.csets:
+            cset.trigger.attribute["period-ns"].set_value(period_ns)
+            cset.trigger.enable()
+            cset.trigger.attribute["exp-scalar-l"].set_value(0)
+            cset.trigger.attribute["exp-scalar-h"].set_value(1)  # fire now
+
+        # Read what is there every few periods
+        blocks = {}
+        for _i in range(n_fire // 5):
+            utils.sleep(5 * period_ns / 1000000000.0)
+            self._drain(blocks)
+        for cset in self.csets:
+            cset.trigger.disable()
+            cset.trigger.attribute["period-ns"].set_value(0)
+        self._drain(blocks)
+
+        for cset in self.csets:
+            cset_blocks = self._common_fires(chans[cset], blocks)
+            n_block = len(cset_blocks.get(chans[cset][0], []))
+            self.assertGreater(n_block, 0,
+                               "No block acquired on {0}".format(cset.name))
+            self._check_blocks(cset, chans[cset], cset_blocks, n_block)
@@ -4,22 +4,18 @@
 @license: GPLv2
 """
 
-from PyZio.ZioConfig import devices_path, triggers, buffers
-from PyZio.ZioDev import ZioDev
-from test import config
-from test import utils
+from test import config, manifest, devcache
+from test import utils, blockio, losses, interleave
 import unittest
 import sys
 import os
 
-path = os.path.join(devices_path, "zzero-0000")
-
-@unittest.skipIf(not (os.path.exists(path) and os.path.isdir(path)),
+@unittest.skipIf(not manifest.has_device(config.device),
                  "zio zero is not loaded")
-@unittest.skipIf(not (config.buf in buffers),
+@unittest.skipIf(not manifest.has_buffer(config.buf),
                  "Buffer '" + config.buf + "' " + \
                  "is required for this test")
-@unittest.skipIf(not ("hrt" in triggers),
+@unittest.skipIf(not manifest.has_trigger("hrt"),
                  "Trigger 'hrt' is required for this test")
 class ReadPolicy(unittest.TestCase):
     """
@@ -27,7 +23,7 @@ class ReadPolicy(unittest.TestCase):
     """
 
     def setUp(self):
-        self.device = ZioDev(devices_path, "zzero-0000")
+        self.device = devcache.get_device(config.device)
         if self.device == None:
             self.skipTest("Missing device, cannot run tests")
 
@@ -71,7 +67,8 @@ class ReadPolicy(unittest.TestCase):
         """
 
         # Fill the buffer
-        utils.trigger_hrt_fill_buffer(self.trigger, 1, 0, 1, 0.1, True)
+        utils.trigger_hrt_fill_buffer(self.trigger, 1, disable = True,
+                                      chan = self.chan)
 
         self.interface.open_ctrl_data(os.O_RDONLY)
         ready = self.interface.is_device_ready(0.01)
@@ -92,6 +89,72 @@ class ReadPolicy(unittest.TestCase):
             self.interface.close_ctrl_data()
 
 
+    @unittest.skipIf(not manifest.has_buffer("vmalloc"),
+                     "Buffer 'vmalloc' is required for this test")
+    def test_read_mmap(self):
+        """
+        It verifies that the samples of the blocks in a vmalloc buffer can be
+        retrieved by mapping the data char device: each block is a slice of
+        the map, at the offset given by its control. It reads the channel
+        that acquires a sequence, so the samples must go on from one block to
+        the next one.
+        """
+        n_block = 10
+        chan = self.cset.chan[2]  # Channel 2 of the cset input8: a sequence
+        interface = chan.interface
+
+        self.trigger.disable()
+        self.cset.set_current_buffer("vmalloc")
+        chan.buffer.flush()
+        utils.trigger_hrt_fill_buffer(self.trigger, n_block, disable = True,
+                                      chan = chan)
+
+        interface.open_ctrl_data(os.O_RDONLY)
+        path = blockio.data_path(chan)
+        try:
+            if path.method != "mmap":
+                self.skipTest("The data char device cannot be mapped")
+            last = None
+            for _i in range(n_block):
+                ready = interface.is_device_ready(10)
+                self.assertTrue(ready[0], "Blocks must be available")
+                ctrl, data = path.read_block()
+                self.assertEqual(ctrl.nsamples * ctrl.ssize, len(data),
+                    "The block should be {0} bytes, but it is {1}".format(ctrl.nsamples * ctrl.ssize, len(data)))
+                values = interleave.samples(data, ctrl.ssize)
+                data.release()  # the map closes only without views on it
+                mask = (1 << (ctrl.ssize * 8)) - 1
+                for sample in values:
+                    if last is not None:
+                        self.assertEqual((last + 1) & mask, sample,
+                            "Mapped samples do not match the acquisition: {0} after {1} (block {2})".format(
+                            sample, last, ctrl.seq_num))
+                    last = sample
+        finally:
+            path.close()
+            interface.close_ctrl_data()
+
+
+    def test_read_data_path_fallback(self):
+        """
+        It verifies that without a vmalloc buffer the data path falls back to
+        read() and that it retrieves whole blocks
+        """
+        if config.buf == "vmalloc":
+            self.skipTest("Buffer 'vmalloc' can be mapped")
+        utils.trigger_hrt_fill_buffer(self.trigger, 1, disable = True,
+                                      chan = self.chan)
+
+        self.interface.open_ctrl_data(os.O_RDONLY)
+        path = blockio.data_path(self.chan)
+        self.assertEqual("read", path.method)
+        ready = self.interface.is_device_ready(10)
+        self.assertTrue(ready[0], "A block must be in the buffer")
+        ctrl, data = path.read_block()
+        self.assertEqual(ctrl.nsamples, len(data),
+            "The number of sample should be {0}, but it is {1}".format(ctrl.nsamples, len(data)))
+
+
     def test_double_read_control(self):
         """
         The test verify that you retrieve a new block each time you read the
@@ -102,14 +165,17 @@ class ReadPolicy(unittest.TestCase):
         n_block = 10
 
         # Fill the buffer
-        utils.trigger_hrt_fill_buffer(self.trigger, n_block, 0, 1, 0.1, True)
+        utils.trigger_hrt_fill_buffer(self.trigger, n_block, disable = True,
+                                      chan = self.chan)
 
         ctrl_old = None
+        accountant = losses.LossAccountant()
         self.interface.open_ctrl(os.O_RDONLY)
         for _i in range(n_block):
             ready = self.interface.is_device_ready(0.01)
             self.assertTrue(ready[0], "Blocks must be available")
             ctrl_new = self.interface.read_ctrl()
+            status = accountant.feed(ctrl_new.seq_num)
 
             if ctrl_old == None:
                 ctrl_old = ctrl_new
@@ -117,14 +183,16 @@ class ReadPolicy(unittest.TestCase):
             # Further tests
             self.assertNotEqual(ctrl_old, ctrl_new,
                 "Control must be different from the previous one")
-            self.assertEqual(ctrl_old.seq_num + 1, ctrl_new.seq_num,
-                "Block should be consecutive")
+            self.assertEqual("ok", status,
+                "Block should be consecutive: {0}".format(accountant.report()))
             ctrl_old = ctrl_new
 
         ready = self.interface.is_device_ready(0.01)
         self.assertFalse(ready[0], "Buffer must be empty")
 
 
+    @unittest.skipIf(config.backend == "sim",
+                     "The simulated device cannot drop the samples of a block when the next control is read")
     def test_dobule_read_data(self):
         """
         The test verify that you retrieve a new block each time you completely
@@ -136,8 +204,8 @@ class ReadPolicy(unittest.TestCase):
         n_block = 10
 
         # Fill the buffer
-        utils.trigger_hrt_fill_buffer(self.trigger, n_block, 0, 1, 0.1, True)
-
+        utils.trigger_hrt_fill_buffer(self.trigger, n_block, disable = True,
+                                      chan = self.chan)
 
         self.interface.open_ctrl_data(os.O_RDONLY)
         ready = self.interface.is_device_ready(10)
@@ -155,14 +223,16 @@ class ReadPolicy(unittest.TestCase):
         self.assertFalse(ready[0], "Buffer must be empty")
 
 
+    @unittest.skipIf(config.backend == "sim",
+                     "The simulated device cannot reject a control read of the wrong size")
     def test_control_read_size(self):
         """
         It tests that you can request to the control char device only 512byte
         at time, no more, no less.
         """
 
-        utils.trigger_hrt_fill_buffer(self.trigger, config.n_block_load, \
-                                      0.1, True)
+        utils.trigger_hrt_fill_buffer(self.trigger, config.n_block_load,
+                                      disable = True, chan = self.chan)
 
         self.interface.open_ctrl_data(os.O_RDONLY)
         fd = self.interface.fileno_ctrl()
@@ -4,34 +4,38 @@
 @license: GPLv2
 """
 
-from PyZio.ZioConfig import devices_path, triggers, buffers
-from PyZio.ZioDev import ZioDev
-from test import config
+from test import config, manifest, devcache
+from test import utils, blockio, ctrlblock
 import unittest
+import time
 import sys
 import os
 
-path = os.path.join(devices_path, "zzero-0000")
-
-@unittest.skipIf(not (os.path.exists(path) and os.path.isdir(path)),
+@unittest.skipIf(not manifest.has_device(config.device),
                  "zio zero is not loaded")
-@unittest.skipIf(not (config.buf in buffers),
+@unittest.skipIf(not manifest.has_buffer(config.buf),
                  "Buffer '" + config.buf + "' " + \
                  "is required for this test")
-@unittest.skipIf(not ("hrt" in triggers),
+@unittest.skipIf(not manifest.has_trigger("hrt"),
                  "Trigger 'hrt' is required for this test")
 class WritePolicy(unittest.TestCase):
     """
-    It tests that the char device interface write blocks correctly.
+    It tests that the char device interface write blocks correctly. Each fire
+    of the trigger outputs one block; a fire without a block raises the
+    lost trigger alarm (underrun).
     """
 
     def setUp(self):
-        self.device = ZioDev(devices_path, "zzero-0000")
+        self.device = devcache.get_device(config.device)
         if self.device == None:
             self.skipTest("Missing device, cannot run tests")
 
         # Set channel set and channel to use
-        self.cset = self.device.cset[0]  # Use cset input8
+        csets = [cset for cset in self.device.cset
+                 if cset.chan[0].interface.is_ctrl_writable()]
+        if not csets:
+            self.skipTest("No output channel set")
+        self.cset = csets[0]  # Use cset output8
         self.chan = self.cset.chan[0]
         self.interface = self.chan.interface
         self.chan.attribute["alarms"].set_value(0xFF)
@@ -41,6 +45,7 @@ class WritePolicy(unittest.TestCase):
         self.trigger = self.cset.trigger
 
         # Set and flush buffer
+        self.trigger.disable()
         self.cset.set_current_buffer(config.buf)
         self.chan.buffer.flush()
 
@@ -56,8 +61,39 @@ class WritePolicy(unittest.TestCase):
         sys.stdout.write("\n")
 
 
+    def _writer(self):
+        self.interface.open_ctrl_data(os.O_WRONLY)
+        return blockio.BlockWriter(self.interface,
+                                   blockio.output_ctrl(self.chan))
+
+
+    def _fire(self, n_fire = 1):
+        """
+        It fires the trigger 'n_fire' times and it returns the number of
+        blocks output
+        """
+        seq_num = self.chan.get_current_ctrl().seq_num
+        for _i in range(n_fire):
+            last = self.chan.get_current_ctrl().seq_num
+            utils.trigger_hrt_fill_buffer(self.trigger, 1, wait = 0)
+            utils.wait_block(self.chan, last, utils.now() + config.select_wait)
+        return self.chan.get_current_ctrl().seq_num - seq_num
+
+
     def test_write(self):
-        pass
+        """
+        It writes a block, the control and then the samples, and a fire of
+        the trigger outputs it
+        """
+        writer = self._writer()
+        writer.write_block(bytes(16 * writer.ssize))
+        self.assertEqual(1, self._fire(),
+                         "The block written must be output by the trigger")
+        self.assertEqual(16, self.chan.get_current_ctrl().nsamples,
+                         "The block output must be the one written")
+        self.assertEqual(0, utils.zio_alarms(self.chan) & \
+                            utils.ZIO_ALARM_LOST_TRIGGER,
+                         "No underrun when a block is available")
 
 
     def test_write_stress(self):
@@ -66,9 +102,91 @@ class WritePolicy(unittest.TestCase):
             self.interface.close_ctrl_data()
 
 
+    def test_underrun(self):
+        """
+        It fires the trigger with an empty buffer: nothing is output and the
+        lost trigger alarm is raised
+        """
+        self.interface.open_ctrl_data(os.O_WRONLY)
+        seq_num = self.chan.get_current_ctrl().seq_num
+        utils.trigger_hrt_fill_buffer(self.trigger, 1, wait = 0.05)
+        self.assertEqual(seq_num, self.chan.get_current_ctrl().seq_num,
+                         "Nothing to output, nothing must be output")
+        self.assertNotEqual(0, utils.zio_alarms(self.chan) & \
+                               utils.ZIO_ALARM_LOST_TRIGGER,
+                            "The lost trigger alarm must be raised on underrun")
+
+
+    @unittest.skipIf(config.backend == "sim",
+                     "The simulated device cannot tell the order of the writes on two char devices")
     def test_double_write_control(self):
-        pass
+        """
+        It writes two controls and then the samples: the second control
+        replaces the first one
+        """
+        writer = self._writer()
+        os.write(self.interface.fileno_ctrl(),
+                 ctrlblock.patch(writer.template, nsamples = 8))
+        writer.write_block(bytes(32 * writer.ssize))
+        self.assertEqual(1, self._fire(), "One block must be output")
+        self.assertEqual(32, self.chan.get_current_ctrl().nsamples,
+                         "The last control written must be used")
 
 
     def test_double_write_data(self):
-        pass
+        """
+        It writes a control and then the samples of two blocks: the second
+        block uses the control of the first one
+        """
+        writer = self._writer()
+        writer.write_block(bytes(16 * writer.ssize))
+        os.write(self.interface.fileno_data(), bytes(16 * writer.ssize))
+        self.assertEqual(2, self._fire(2), "Two blocks must be output")
+        self.assertEqual(16, self.chan.get_current_ctrl().nsamples,
+                         "The second block must have the size of the first")
+        self.assertEqual(0, utils.zio_alarms(self.chan) & \
+                            utils.ZIO_ALARM_LOST_TRIGGER,
+                         "No underrun when a block is available")
+
+
+    def test_write_batch(self):
+        """
+        It keeps the buffer full while a periodic trigger outputs the blocks:
+        every block written is output and the trigger never finds the buffer
+        empty
+        """
+        n_block = 100
+        period_ns = 2000000
+        writer = self._writer()
+        blocks = [bytes(16 * writer.ssize)] * n_block
+        seq_num = self.chan.get_current_ctrl().seq_num
+        written = writer.write(blocks[:8], config.select_wait)
+
+        self.trigger.attribute["period-ns"].set_value(period_ns)
+        self.trigger.attribute["exp-scalar-l"].set_value(0)
+        self.trigger.attribute["exp-scalar-h"].set_value(1)  # fire now
+        deadline = time.time() + config.select_wait
+        while written < n_block and time.time() < deadline:
+            n = writer.write(blocks[written:written + 8],
+                             period_ns / 1000000000.0)
+            if n:
+                deadline = time.time() + config.select_wait
+            written += n
+            utils.sleep(period_ns / 1000000000.0)
+        self.assertEqual(n_block, written,
+                         "Cannot write: {0} of {1} blocks written, no room in the buffer for {2}s".format(
+                         written, n_block, config.select_wait))
+        self.assertEqual(0, utils.zio_alarms(self.chan) & \
+                            utils.ZIO_ALARM_LOST_TRIGGER,
+                         "The trigger found the buffer empty while writing")
+
+        # Wait for the last blocks, then stop before the underrun
+        deadline = time.time() + config.select_wait
+        while self.chan.get_current_ctrl().seq_num - seq_num < n_block and \
+              time.time() < deadline:
+            utils.sleep(period_ns / 4000000000.0)
+        self.trigger.disable()
+        self.trigger.attribute["period-ns"].set_value(0)
+
+        self.assertEqual(n_block, self.chan.get_current_ctrl().seq_num - seq_num,
+                         "Every block written must be output")
@@ -0,0 +1,72 @@
+"""
+@author: Federico Vaga <federico.vaga@gmail.com>
+@copyright: CERN 2014
+@license: GPLv2
+
+Samples of the interleaved channel. A block of the interleaved channel holds
+the samples of all the channels of the channel set: sample 0 of every
+channel, then sample 1 of every channel and so on. deinterleave() splits it
+back into one stream per channel; profile() describes the stream of a
+channel, so the streams acquired through the interleaved channel can be
+checked against those acquired channel by channel.
+"""
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+FORMATS = {1: "B", 2: "H", 4: "I"}
+
+
+def samples(data, ssize):
+    """
+    It returns the samples of a buffer as a list of integers
+    """
+    return memoryview(data).cast(FORMATS[ssize]).tolist()
+
+
+def deinterleave(data, nchan, ssize):
+    """
+    It splits the samples of an interleaved block into 'nchan' lists of
+    samples, one for each channel
+    """
+    if len(data) % (nchan * ssize):
+        raise ValueError("{0} bytes are not a whole number of samples of {1} channels".format(
+                         len(data), nchan))
+    if numpy is not None:
+        values = numpy.frombuffer(data, dtype = "<u{0}".format(ssize))
+        return [column.tolist() for column in values.reshape(-1, nchan).T]
+    values = memoryview(data).cast(FORMATS[ssize])
+    return [values[i::nchan].tolist() for i in range(nchan)]
+
+
+def profile(values, ssize):
+    """
+    It returns what a stream of samples looks like: ("constant", value) when
+    all the samples are the same, ("sequence", first) when each sample is
+    the previous one plus one (modulo the sample size), ("other", None)
+    otherwise
+    """
+    if not values:
+        return ("other", None)
+    if values.count(values[0]) == len(values):
+        return ("constant", values[0])
+    mask = (1 << (ssize * 8)) - 1
+    if all([(b - a) & mask == 1 for a, b in zip(values, values[1:])]):
+        return ("sequence", values[0])
+    return ("other", None)
+
+
+def same_kind(reference, values, ssize):
+    """
+    It returns True when a stream of samples has the same profile of a
+    reference one: the same constant, a sequence (from any value) or
+    another content, neither constant nor a sequence (e.g. random samples)
+    """
+    kind, first = reference
+    got, got_first = profile(values, ssize)
+    if kind == "constant":
+        return got == "constant" and got_first == first
+    if kind == "sequence":
+        return got == "sequence"
+    return got == "other"
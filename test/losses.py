@@ -0,0 +1,155 @@
+"""
+@author: Federico Vaga <federico.vaga@gmail.com>
+@copyright: CERN 2014
+@license: GPLv2
+
+Accounting of the lost blocks. A LossAccountant follows the sequence numbers
+of the blocks of a channel: it finds duplicates and gaps in constant time,
+it counts the lost blocks and the length of the bursts of losses, and it
+checks that each gap comes with the lost-block alarm in the control of the
+next block.
+
+When 'loss_accounting' is enabled every block read by a test (see
+test.blockio.add_read_hook()) goes to the accountant of its channel, and the
+report of each test is saved in its record (see test.results).
+"""
+from test import blockio
+import struct
+
+# ZIO alarm bit of the lost block
+ZIO_ALARM_LOST_BLOCK = 0x1
+
+# Head of struct zio_control, up to the channel index (see test.ctrlblock)
+_HEAD = struct.Struct("<BBBBIIHH" + "HBB8sIHH")
+_ALARMS_ZIO = 2
+_SEQ_NUM = 4
+_CSET = 13
+_CHAN = 14
+
+# Sequence numbers are 32 bit and they wrap
+_SEQ_MASK = 0xFFFFFFFF
+
+
+class LossAccountant(object):
+    """
+    It follows the sequence numbers of the blocks of a channel. A block
+    that comes after a higher sequence number (e.g. with many readers) is
+    'late': it is no more lost, but it does not change the bursts.
+
+    The blocks seen are a bitmap of the last 'window' sequence numbers up to
+    the highest one, so the memory does not grow with the blocks. A block
+    older than the window cannot be told from a duplicate: it counts as
+    late. The sequence numbers are 32 bit values, compared modulo 2**32.
+    """
+
+    def __init__(self, window = 4096):
+        self.window = window
+        self.seen = 0  # bit i: the block 'last - i' was seen
+        self.last = None
+        self.blocks = 0
+        self.duplicates = 0
+        self.late = 0
+        self.lost = 0
+        self.bursts = []  # length of each gap
+        self.unflagged = 0  # gaps without the lost-block alarm
+
+
+    def feed(self, seq_num, alarms = None):
+        """
+        It accounts a block and it returns what it is: "ok", "gap",
+        "duplicate" or "late". 'alarms' is the ZIO alarms field of the
+        control, None if unknown.
+        """
+        seq_num &= _SEQ_MASK
+        if self.last is None:
+            self.last = seq_num
+            self.seen = 1
+            self.blocks += 1
+            return "ok"
+        ahead = (seq_num - self.last) & _SEQ_MASK
+        if ahead == 0:
+            self.duplicates += 1
+            return "duplicate"
+        if ahead > _SEQ_MASK // 2:
+            behind = _SEQ_MASK + 1 - ahead
+            if behind < self.window:
+                if self.seen >> behind & 1:
+                    self.duplicates += 1
+                    return "duplicate"
+                self.seen |= 1 << behind
+            self.blocks += 1
+            self.late += 1
+            self.lost = max(self.lost - 1, 0)
+            return "late"
+
+        self.blocks += 1
+        self.last = seq_num
+        if ahead < self.window:
+            self.seen = (self.seen << ahead | 1) & ((1 << self.window) - 1)
+        else:
+            self.seen = 1
+        if ahead == 1:
+            return "ok"
+        gap = ahead - 1
+        self.lost += gap
+        self.bursts.append(gap)
+        if alarms is not None and not alarms & ZIO_ALARM_LOST_BLOCK:
+            self.unflagged += 1
+        return "gap"
+
+
+    def loss_rate(self):
+        """
+        It returns the fraction of the blocks that got lost
+        """
+        total = self.blocks + self.lost
+        return self.lost / float(total) if total else 0.0
+
+
+    def report(self):
+        bursts = self.bursts
+        return {"blocks": self.blocks, "lost": self.lost,
+                "duplicates": self.duplicates, "late": self.late,
+                "gaps": len(bursts), "loss_rate": self.loss_rate(),
+                "max_burst": max(bursts) if bursts else 0,
+                "mean_burst": sum(bursts) / float(len(bursts)) if bursts else 0.0,
+                "unflagged_gaps": self.unflagged}
+
+
+# # # # # # Accounting of the blocks read by the tests # # # # # # # #
+
+_accountants = {}  # (cset, chan) -> LossAccountant
+
+
+def enable():
+    """
+    It accounts the blocks read in this process from now on
+    """
+    blockio.add_read_hook(_read)
+
+
+def _read(source, ctrl, data):
+    if ctrl is None:
+        return
+    head = _HEAD.unpack_from(ctrl)
+    key = (head[_CSET], head[_CHAN])
+    if key not in _accountants:
+        _accountants[key] = LossAccountant()
+    _accountants[key].feed(head[_SEQ_NUM], head[_ALARMS_ZIO])
+
+
+def reset():
+    _accountants.clear()
+
+
+def report():
+    """
+    It returns the report of each channel read since the last reset(), as a
+    list of dictionaries
+    """
+    reports = []
+    for (cset, chan), acc in sorted(_accountants.items()):
+        rep = acc.report()
+        rep.update({"cset": cset, "chan": chan})
+        reports.append(rep)
+    return reports
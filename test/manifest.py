@@ -0,0 +1,203 @@
+"""
+@author: Federico Vaga <federico.vaga@gmail.com>
+@copyright: CERN 2014
+@license: GPLv2
+
+The capabilities of the ZIO framework under test. The ZIO sysfs tree is
+scanned once: the manifest contains the available triggers and buffers, the
+devices with their channel sets, channels and attributes (and if they are
+writable). The tests and the runner use it to decide what to skip.
+
+The manifest is saved in a file (config.manifest_path), so the parallel
+workers do not scan the tree again. It is valid while the fingerprint of
+the framework does not change: the available triggers and buffers, the
+devices and the ZIO modules loaded in the kernel. Loading or unloading a
+module invalidates it.
+"""
+from PyZio import ZioConfig
+from test import config
+import json
+import stat
+import os
+
+_manifest = None
+
+
+class Manifest(object):
+    """
+    A snapshot of the ZIO capabilities
+    """
+
+    def __init__(self, data):
+        self.data = data
+        self.fingerprint = data["fingerprint"]
+        self.loaded = data["loaded"]
+        self.triggers = data["triggers"]
+        self.buffers = data["buffers"]
+        self.devices = data["devices"]
+
+
+    def has_device(self, name):
+        return name in self.devices
+
+
+    def has_trigger(self, name):
+        return name in self.triggers
+
+
+    def has_buffer(self, name):
+        return name in self.buffers
+
+
+    def is_writable(self, device, *path):
+        """
+        It returns True if the attribute exists and it is writable. The path
+        is made of the names of the objects and of the attribute, e.g.
+        is_writable("zzero-0000", "cset0", "chan0", "buffer", "flush")
+        """
+        obj = self.devices.get(device)
+        for name in path[:-1]:
+            if obj is None:
+                return False
+            obj = obj["children"].get(name)
+        if obj is None:
+            return False
+        return obj["attributes"].get(path[-1], False)
+
+
+    def supports(self, footprint, device):
+        """
+        It returns the reason why a test with the given footprint cannot run
+        on a device, None if it can run
+        """
+        if not self.has_device(device):
+            return "Device '{0}' is not loaded".format(device)
+        if footprint.trigger and not self.has_trigger(footprint.trigger):
+            return "Trigger '{0}' is required for this test".format(footprint.trigger)
+        if footprint.buffer and not self.has_buffer(footprint.buffer):
+            return "Buffer '{0}' is required for this test".format(footprint.buffer)
+        return None
+
+
+def fingerprint():
+    """
+    It returns what identifies the state of the ZIO framework. It is cheap
+    compared to a full scan of the tree.
+    """
+    bus = ZioConfig.zio_bus_path
+    fp = [config.backend, os.path.isdir(bus)]
+    for name in ("available_triggers", "available_buffers"):
+        fp.append(_read(os.path.join(bus, name)))
+    try:
+        fp.append(sorted(os.listdir(ZioConfig.devices_path)))
+    except OSError:
+        fp.append([])
+    modules = _read("/proc/modules") or ""
+    fp.append(sorted([l.split()[0] for l in modules.splitlines()
+                      if l.startswith("zio") or " zio" in l]))
+    return fp
+
+
+def scan():
+    """
+    It walks the ZIO sysfs tree and it returns its manifest
+    """
+    bus = ZioConfig.zio_bus_path
+    data = {"fingerprint": fingerprint(),
+            "loaded": os.path.isdir(bus),
+            "triggers": (_read(os.path.join(bus, "available_triggers")) or "").split(),
+            "buffers": (_read(os.path.join(bus, "available_buffers")) or "").split(),
+            "devices": {}}
+    if data["loaded"] and os.path.isdir(ZioConfig.devices_path):
+        for name in sorted(os.listdir(ZioConfig.devices_path)):
+            path = os.path.join(ZioConfig.devices_path, name)
+            if os.path.isdir(path):
+                data["devices"][name] = _scan_object(path)
+    return Manifest(data)
+
+
+def _scan_object(path):
+    """
+    It returns the attributes of a ZIO object, and its children objects
+    """
+    obj = {"attributes": {}, "children": {}}
+    for name in sorted(os.listdir(path)):
+        full = os.path.join(path, name)
+        if os.path.islink(full):
+            continue  # i.e. 'subsystem', it goes out of the device
+        if os.path.isdir(full):
+            if name.startswith("cset") or name.startswith("chan") or \
+               name in ("trigger", "buffer"):
+                obj["children"][name] = _scan_object(full)
+        elif name != "uevent":
+            mode = os.stat(full).st_mode
+            obj["attributes"][name] = bool(mode & stat.S_IWUSR)
+    return obj
+
+
+def get():
+    """
+    It returns the manifest of the current ZIO framework. It uses, in order,
+    the one already in memory, the one saved in the manifest file and a new
+    scan; the first one with the current fingerprint wins.
+    """
+    global _manifest
+    fp = fingerprint()
+    if _manifest is not None and _manifest.fingerprint == fp:
+        return _manifest
+
+    path = os.path.expanduser(config.manifest_path) \
+           if config.manifest_path else None
+    if path:
+        try:
+            with open(path, "r") as f:
+                cached = Manifest(json.load(f))
+            if cached.fingerprint == fp:
+                _manifest = cached
+                return _manifest
+        except (IOError, OSError, ValueError, KeyError):
+            pass  # No manifest yet, or a broken one
+
+    _manifest = scan()
+    if path:
+        tmp = "{0}.{1}".format(path, os.getpid())
+        with open(tmp, "w") as f:
+            json.dump(_manifest.data, f, sort_keys = True)
+        os.rename(tmp, path)
+    return _manifest
+
+
+def apply():
+    """
+    It loads the available triggers and buffers in PyZio, in place of
+    ZioUtil.update_all_zio_objects()
+    """
+    man = get()
+    _replace(ZioConfig.triggers, man.triggers)
+    _replace(ZioConfig.buffers, man.buffers)
+    return man
+
+
+def has_device(name):
+    return get().has_device(name)
+
+
+def has_trigger(name):
+    return get().has_trigger(name)
+
+
+def has_buffer(name):
+    return get().has_buffer(name)
+
+
+def _replace(lst, values):
+    del lst[:]
+    lst.extend(values)
+
+
+def _read(path):
+    try:
+        with open(path, "r") as f:
+            return f.read()
+    except (IOError, OSError):
+        return None
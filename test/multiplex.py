@@ -0,0 +1,167 @@
+"""
+@author: Federico Vaga <federico.vaga@gmail.com>
+@copyright: CERN 2014
+@license: GPLv2
+
+Readiness of many channels at once. ZioCharDevice.is_device_ready() runs a
+select() for a single channel, and its callers do not agree on the unit of
+its timeout. A Multiplexer watches the char devices of any number of
+channels (of any channel set and device) with a single epoll instance; the
+times are always explicit: 'timeout_s' is relative, in seconds, 'deadline'
+is absolute, a time.time() value.
+"""
+from test import clock
+import select
+import time
+import math
+
+try:
+    _epoll = select.epoll
+except AttributeError:
+    _epoll = None  # not Linux, use poll()
+
+
+class Multiplexer(object):
+    """
+    It watches the control and data char devices of the registered channels.
+    The char devices must be open before the registration.
+    """
+
+    def __init__(self):
+        if _epoll is not None:
+            self._poller = _epoll()
+            self._events = select.EPOLLIN
+        else:
+            self._poller = select.poll()
+            self._events = select.POLLIN
+        self._fds = {}  # fd -> (channel, 0 for control or 1 for data)
+        self.chans = []
+
+
+    def register(self, chan, ctrl = True, data = True):
+        """
+        It watches the control and/or the data char device of a channel
+        """
+        if chan not in self.chans:
+            self.chans.append(chan)
+        interface = chan.interface
+        for index, enabled, fileno in ((0, ctrl, interface.fileno_ctrl),
+                                       (1, data, interface.fileno_data)):
+            fd = fileno() if enabled else None
+            if fd is None or fd in self._fds:
+                continue
+            self._poller.register(fd, self._events)
+            self._fds[fd] = (chan, index)
+
+
+    def unregister(self, chan):
+        for fd, (c, _index) in list(self._fds.items()):
+            if c is chan:
+                self._poller.unregister(fd)
+                del self._fds[fd]
+        if chan in self.chans:
+            self.chans.remove(chan)
+
+
+    def close(self):
+        for chan in list(self.chans):
+            self.unregister(chan)
+        if _epoll is not None:
+            self._poller.close()
+
+
+    def poll(self, timeout_s = 0.0):
+        """
+        It waits up to 'timeout_s' seconds for at least one ready char
+        device. It returns a dictionary channel -> (control ready, data
+        ready) with the ready channels only.
+        """
+        events = self._events_within(timeout_s, list(self._fds))
+        ready = {}
+        for fd, _event in events:
+            chan, index = self._fds[fd]
+            flags = ready.get(chan, [False, False])
+            flags[index] = True
+            ready[chan] = flags
+        return dict([(chan, tuple(flags)) for chan, flags in ready.items()])
+
+
+    def wait(self, deadline):
+        """
+        It waits until at least one char device is ready or the deadline
+        (time.time() seconds) expires. It returns like poll().
+        """
+        return self.poll(deadline - time.time())
+
+
+    def wait_all(self, deadline, ctrl = True):
+        """
+        It waits until all the channels have the control char device ready
+        (the data char device with 'ctrl' False) or the deadline expires. It
+        returns the list of the channels not ready.
+        """
+        index = 0 if ctrl else 1
+        # Only the char devices still waited on stay in the poller: those
+        # already ready, and those of the other kind, would wake it up at
+        # once. They are back in it at the end.
+        waiting = {}
+        for fd, (chan, i) in self._fds.items():
+            if i == index:
+                waiting[fd] = chan
+            else:
+                self._poller.unregister(fd)
+        ready = set()
+        try:
+            while waiting:
+                for fd, _event in self._events_within(deadline - time.time(),
+                                                     list(waiting)):
+                    if fd in waiting:
+                        self._poller.unregister(fd)
+                        ready.add(waiting.pop(fd))
+                if time.time() >= deadline:
+                    break
+        finally:
+            for fd, (chan, i) in self._fds.items():
+                if fd not in waiting:
+                    self._poller.register(fd, self._events)
+        return [chan for chan in self.chans if chan not in ready]
+
+
+    def _events_within(self, timeout_s, fds):
+        """
+        It waits up to 'timeout_s' seconds for events on the char devices in
+        the poller, 'fds', and it returns them as a list of (fd, event)
+        """
+        timeout_s = max(timeout_s, 0)
+        with clock.get_clock().waiting(fds if timeout_s else []):
+            if _epoll is not None:
+                return self._poller.poll(timeout_s, len(fds) or 1)
+            return self._poller.poll(int(math.ceil(timeout_s * 1000)))
+
+
+    def read_ready(self, timeout_s = 0.0, read_data = True):
+        """
+        It waits up to 'timeout_s' seconds for ready channels, and it reads
+        one block from each channel with a ready control char device. It
+        returns the blocks as a list of (channel, control, data); the data is
+        None when 'read_data' is False.
+        """
+        blocks = []
+        for chan, (ctrl, _data) in self.poll(timeout_s).items():
+            if not ctrl:
+                continue
+            interface = chan.interface
+            block = interface.read_ctrl()
+            data = interface.read_data(block) if read_data else None
+            blocks.append((chan, block, data))
+        return blocks
+
+
+    def status(self):
+        """
+        It returns the readiness of every registered channel now, as a
+        dictionary channel -> (control ready, data ready)
+        """
+        ready = self.poll(0)
+        return dict([(chan, ready.get(chan, (False, False)))
+                     for chan in self.chans])
@@ -0,0 +1,281 @@
+"""
+@author: Federico Vaga <federico.vaga@gmail.com>
+@copyright: CERN 2014
+@license: GPLv2
+
+A pool of reader processes for the concurrent read of a channel. The readers
+are started once and they get a new job for each read. Each reader passes the
+blocks it reads to the parent through its own ring in shared memory: the
+reader fills a slot and moves the head, the parent consumes the slot and
+moves the tail. Nothing is pickled but the job and the final statistics.
+"""
+from test.ctrlblock import CTRL_SIZE
+import multiprocessing
+import traceback
+import ctypes
+import struct
+import errno
+import time
+import os
+
+# seq_num, nsamples and ssize of struct zio_control
+_HEAD = struct.Struct("<IIH")
+_HEAD_OFFSET = 4
+
+
+class _Ring(object):
+    """
+    A ring of 'nslots' blocks in shared memory, with a single producer and a
+    single consumer
+    """
+
+    def __init__(self, nslots, data_size):
+        self.nslots = nslots
+        self.data_size = data_size
+        self.ctrl = multiprocessing.RawArray(ctypes.c_ubyte, nslots * CTRL_SIZE)
+        self.data = multiprocessing.RawArray(ctypes.c_ubyte,
+                                             max(nslots * data_size, 1))
+        self.length = multiprocessing.RawArray(ctypes.c_uint32, nslots)
+        self.head = multiprocessing.RawValue(ctypes.c_uint64, 0)
+        self.tail = multiprocessing.RawValue(ctypes.c_uint64, 0)
+
+
+    def push(self, ctrl, data):
+        """
+        It copies a block in the next free slot, it waits when the ring is
+        full
+        """
+        while self.head.value - self.tail.value >= self.nslots:
+            time.sleep(0.0001)
+        slot = self.head.value % self.nslots
+        start = slot * CTRL_SIZE
+        memoryview(self.ctrl).cast("B")[start:start + CTRL_SIZE] = ctrl
+        data = data[:self.data_size]
+        if data:
+            start = slot * self.data_size
+            memoryview(self.data).cast("B")[start:start + len(data)] = data
+        self.length[slot] = len(data)
+        self.head.value += 1
+
+
+    def pop(self):
+        """
+        It returns the views on the control and on the data of the oldest
+        block, None when the ring is empty. The views are valid until the
+        next pop().
+        """
+        if self.tail.value >= self.head.value:
+            return None
+        slot = self.tail.value % self.nslots
+        ctrl = memoryview(self.ctrl).cast("B")[slot * CTRL_SIZE:
+                                                 (slot + 1) * CTRL_SIZE]
+        start = slot * self.data_size
+        data = memoryview(self.data).cast("B")[start:start + self.length[slot]]
+        return ctrl, data
+
+
+    def release(self):
+        self.tail.value += 1
+
+
+class ReaderPool(object):
+    """
+    It starts 'nreaders' reader processes, each one with a ring of
+    'ring_blocks' blocks of at most 'data_size' bytes of samples
+    """
+
+    def __init__(self, nreaders, ring_blocks = 256, data_size = 0):
+        self.rings = []
+        self.conns = []
+        self.procs = []
+        for i in range(nreaders):
+            ring = _Ring(ring_blocks, data_size)
+            parent, child = multiprocessing.Pipe()
+            proc = multiprocessing.Process(target = _reader,
+                                           args = (i, child, ring))
+            proc.daemon = True
+            proc.start()
+            self.rings.append(ring)
+            self.conns.append(parent)
+            self.procs.append(proc)
+
+
+    def __len__(self):
+        return len(self.procs)
+
+
+    def read(self, interface, nreaders = None, read_data = False,
+             on_block = None, timeout = 60):
+        """
+        It makes 'nreaders' readers (all by default) read the blocks of a
+        channel interface at the same time, until its buffer is empty. For
+        each block it calls on_block(reader, ctrl, data) with views on the
+        shared memory. It returns the statistics of the read (see
+        PoolResult). It raises RuntimeError when a reader dies or fails, or
+        when the readers do not finish within 'timeout' seconds; then the
+        pool is useless.
+        """
+        nreaders = nreaders or len(self)
+        job = (interface.ctrlfile, interface.datafile if read_data else None)
+        start = time.time()
+        deadline = start + timeout
+        for i, conn in enumerate(self.conns[:nreaders]):
+            try:
+                conn.send(job)
+            except (IOError, OSError):
+                self._check([None] * (i + 1), deadline, timeout)
+                raise
+
+        stats = [None] * nreaders
+        while True:
+            idle = True
+            for i in range(nreaders):
+                ring = self.rings[i]
+                block = ring.pop()
+                while block is not None:
+                    idle = False
+                    if on_block is not None:
+                        on_block(i, block[0], block[1])
+                    ring.release()
+                    block = ring.pop() if time.time() < deadline else None
+                if stats[i] is None and self.conns[i].poll():
+                    try:
+                        stats[i] = self.conns[i].recv()
+                    except EOFError:
+                        pass  # the reader is dead, see _check()
+                    idle = False
+            self._check(stats, deadline, timeout)
+            if None not in stats and \
+               not [r for r in self.rings[:nreaders] if r.pop() is not None]:
+                break
+            if idle:
+                time.sleep(0.001)
+        return PoolResult(stats, time.time() - start)
+
+
+    def _check(self, stats, deadline, timeout):
+        """
+        It raises RuntimeError, and it stops the readers, when a reader of
+        the running read is dead or failed, or when the read is late
+        """
+        error = None
+        for i, stat in enumerate(stats):
+            if stat is not None and "error" in stat:
+                error = "Reader {0} failed:\n{1}".format(i, stat["error"])
+            elif stat is None and not self.procs[i].is_alive():
+                error = "Reader {0} died (exit code {1})".format(i,
+                        self.procs[i].exitcode)
+            if error:
+                break
+        if error is None and time.time() > deadline:
+            error = "The readers did not empty the buffer in {0}s".format(
+                    timeout)
+        if error is None:
+            return
+        for proc in self.procs:
+            proc.terminate()
+        raise RuntimeError(error)
+
+
+    def close(self):
+        for conn in self.conns:
+            try:
+                conn.send(None)
+            except (IOError, OSError):
+                pass  # the reader is dead already
+        for proc in self.procs:
+            proc.join(5)
+        self.procs = []
+
+
+class PoolResult(object):
+    """
+    The statistics of a concurrent read: 'readers' has the blocks, the bytes
+    and the share of the blocks of each reader
+    """
+
+    def __init__(self, stats, elapsed):
+        self.elapsed = elapsed
+        self.blocks = sum([s["blocks"] for s in stats])
+        self.bytes = sum([s["bytes"] for s in stats])
+        self.readers = []
+        for i, s in enumerate(stats):
+            share = s["blocks"] / float(self.blocks) if self.blocks else 0.0
+            self.readers.append(dict(s, reader = i, share = share))
+
+
+    def blocks_s(self):
+        return self.blocks / self.elapsed if self.elapsed else 0.0
+
+
+    def mb_s(self):
+        return self.bytes / 1000000.0 / self.elapsed if self.elapsed else 0.0
+
+
+    def __repr__(self):
+        return "{0} readers, {1} blocks in {2:.3f}s ({3:.1f} blocks/s, " \
+               "{4:.3f} MB/s), shares {5}".format(len(self.readers),
+                    self.blocks, self.elapsed, self.blocks_s(), self.mb_s(),
+                    " ".join(["{0:.0%}".format(r["share"])
+                              for r in self.readers]))
+
+
+def seq_num(ctrl):
+    """
+    It returns the sequence number of a binary control
+    """
+    return _HEAD.unpack_from(ctrl, _HEAD_OFFSET)[0]
+
+
+def _reader(index, conn, ring):
+    """
+    The body of a reader process: it runs the jobs sent by the pool
+    """
+    while True:
+        job = conn.recv()
+        if job is None:
+            break
+        try:
+            conn.send(_drain(ring, *job))
+        except Exception:
+            conn.send({"error": traceback.format_exc()})
+    conn.close()
+
+
+def _drain(ring, ctrlfile, datafile):
+    """
+    It reads blocks until the buffer is empty, and it pushes them in the
+    ring. Another reader can take the block between the read of the control
+    and of the data: in this case the data is shorter or missing.
+    """
+    fdc = os.open(ctrlfile, os.O_RDONLY | os.O_NONBLOCK)
+    fdd = os.open(datafile, os.O_RDONLY | os.O_NONBLOCK) if datafile else None
+    blocks = 0
+    nbytes = 0
+    start = time.time()
+    try:
+        while True:
+            ctrl = _read(fdc, CTRL_SIZE)
+            if len(ctrl) != CTRL_SIZE:
+                break
+            data = b""
+            if fdd is not None:
+                _seq, nsamples, ssize = _HEAD.unpack_from(ctrl, _HEAD_OFFSET)
+                data = _read(fdd, nsamples * ssize)
+            ring.push(ctrl, data)
+            blocks += 1
+            nbytes += len(data)
+    finally:
+        os.close(fdc)
+        if fdd is not None:
+            os.close(fdd)
+    return {"blocks": blocks, "bytes": nbytes, "elapsed": time.time() - start}
+
+
+def _read(fd, size):
+    try:
+        return os.read(fd, size)
+    except OSError as e:
+        if e.errno != errno.EAGAIN:
+            raise
+        return b""
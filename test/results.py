@@ -0,0 +1,229 @@
+"""
+@author: Federico Vaga <federico.vaga@gmail.com>
+@copyright: CERN 2014
+@license: GPLv2
+
+It collects the results of a whole run of the test suite: the outcome of each
+test, its wall time (setUp and tearDown included), the time spent in setUp
+and tearDown, the skip reason, the failure details and the blocks lost on
+the channels it read (see test.losses) and the use of the char device
+handles (see test.handles). The results can be saved in JSON and JUnit XML
+format.
+"""
+from test import config, catalog, losses, handles
+import xml.etree.ElementTree as ET
+import unittest
+import json
+import time
+
+
+class ResultCollector(unittest.TextTestResult):
+    """
+    A text result that records every test. Each record is a dictionary, so
+    the records can be sent from a worker process to the runner.
+    """
+
+    def __init__(self, stream, descriptions, verbosity):
+        unittest.TextTestResult.__init__(self, stream, descriptions, verbosity)
+        self.records = []
+        self.device = config.device
+        self.__current = None
+        if config.loss_accounting:
+            losses.enable()
+        if config.handle_pool:
+            handles.enable()
+
+
+    def startTest(self, test):
+        self.__current = self._new_record(test)
+        self.__current["start"] = time.time()
+        self.records.append(self.__current)
+        losses.reset()
+        if "module-load" in catalog.tags(test.id()):
+            handles.reset()  # an open char device keeps the module busy
+        handles.clear_stats()
+        _time_fixture(test, "setUp", self.__current, "setup")
+        _time_fixture(test, "tearDown", self.__current, "teardown")
+        unittest.TextTestResult.startTest(self, test)
+
+
+    def stopTest(self, test):
+        unittest.TextTestResult.stopTest(self, test)
+        if self.__current is not None:
+            self.__current["time"] = time.time() - self.__current.pop("start")
+            self.__current["losses"] = losses.report()
+            self.__current["handles"] = handles.report()
+            self.__current = None
+
+
+    def addSuccess(self, test):
+        unittest.TextTestResult.addSuccess(self, test)
+        self._record(test)["status"] = "pass"
+
+
+    def addFailure(self, test, err):
+        unittest.TextTestResult.addFailure(self, test, err)
+        self._set_failure(test, "failure", err, self.failures)
+
+
+    def addError(self, test, err):
+        unittest.TextTestResult.addError(self, test, err)
+        self._set_failure(test, "error", err, self.errors)
+
+
+    def addSkip(self, test, reason):
+        unittest.TextTestResult.addSkip(self, test, reason)
+        rec = self._record(test)
+        rec["status"] = "skip"
+        rec["reason"] = reason
+
+
+    def addExpectedFailure(self, test, err):
+        unittest.TextTestResult.addExpectedFailure(self, test, err)
+        self._record(test)["status"] = "expected-failure"
+
+
+    def addUnexpectedSuccess(self, test):
+        unittest.TextTestResult.addUnexpectedSuccess(self, test)
+        self._set_failure(test, "failure", None, None)
+        self._record(test)["message"] = "unexpected success"
+
+
+    def _new_record(self, test):
+        test_id = test.id()
+        classname, _dot, name = test_id.rpartition(".")
+        return {"id": test_id, "classname": classname, "name": name,
+                "device": self.device, "status": None, "time": 0.0,
+                "setup": 0.0, "teardown": 0.0, "reason": None,
+                "message": None, "details": None, "losses": [],
+                "handles": None}
+
+
+    def _record(self, test):
+        """
+        It returns the record of a test. Errors in class or module fixtures
+        come without startTest(), they get their own record.
+        """
+        if self.__current is not None and self.__current["id"] == test.id():
+            return self.__current
+        rec = self._new_record(test)
+        self.records.append(rec)
+        return rec
+
+
+    def _set_failure(self, test, status, err, lst):
+        rec = self._record(test)
+        rec["status"] = status
+        if err is not None:
+            rec["message"] = "{0}: {1}".format(err[0].__name__, err[1])
+            rec["details"] = lst[-1][1]  # the formatted traceback
+
+
+def _time_fixture(test, name, rec, key):
+    """
+    It replaces the fixture method of a test instance with one that
+    measures its time
+    """
+    method = getattr(test, name, None)
+    if method is None:
+        return
+    def timed():
+        start = time.time()
+        try:
+            method()
+        finally:
+            rec[key] = time.time() - start
+    setattr(test, name, timed)
+
+
+def summary(records):
+    """
+    It returns the number of tests by outcome
+    """
+    count = {"tests": len(records), "pass": 0, "failure": 0, "error": 0,
+             "skip": 0, "expected-failure": 0}
+    for rec in records:
+        if rec["status"] in count:
+            count[rec["status"]] += 1
+    return count
+
+
+def success(records):
+    count = summary(records)
+    return count["failure"] == 0 and count["error"] == 0
+
+
+def save(records, duration):
+    """
+    It saves the records in the files given by the configuration
+    """
+    if config.results_json:
+        write_json(records, config.results_json, duration)
+    if config.results_junit:
+        write_junit(records, config.results_junit, duration)
+
+
+def write_json(records, path, duration):
+    """
+    It saves the records in JSON format
+    """
+    data = {"duration": duration,
+            "summary": summary(records),
+            "tests": records}
+    with open(path, "w") as f:
+        json.dump(data, f, indent = 2, sort_keys = True)
+
+
+def write_junit(records, path, duration):
+    """
+    It saves the records in JUnit XML format: a testsuite for each test
+    class. The setUp and tearDown times are testcase properties.
+    """
+    count = summary(records)
+    root = ET.Element("testsuites", name = "zio-ut",
+                      tests = str(count["tests"]),
+                      failures = str(count["failure"]),
+                      errors = str(count["error"]),
+                      skipped = str(count["skip"]),
+                      time = "{0:.3f}".format(duration))
+    suites = {}
+    for rec in records:
+        if rec["classname"] not in suites:
+            suites[rec["classname"]] = []
+        suites[rec["classname"]].append(rec)
+
+    for classname in sorted(suites):
+        recs = suites[classname]
+        count = summary(recs)
+        suite = ET.SubElement(root, "testsuite", name = classname,
+                              tests = str(count["tests"]),
+                              failures = str(count["failure"]),
+                              errors = str(count["error"]),
+                              skipped = str(count["skip"]),
+                              time = "{0:.3f}".format(sum([r["time"] for r in recs])))
+        for rec in recs:
+            case = ET.SubElement(suite, "testcase", classname = classname,
+                                 name = rec["name"],
+                                 time = "{0:.3f}".format(rec["time"]))
+            props = ET.SubElement(case, "properties")
+            for key in ("setup", "teardown"):
+                ET.SubElement(props, "property", name = key + "-time",
+                              value = "{0:.3f}".format(rec[key]))
+            if rec["device"]:
+                ET.SubElement(props, "property", name = "device",
+                              value = rec["device"])
+            for rep in rec.get("losses") or []:
+                ET.SubElement(props, "property",
+                    name = "losses-cset{0}-chan{1}".format(rep["cset"], rep["chan"]),
+                    value = "blocks {blocks}, lost {lost}, gaps {gaps}, max burst {max_burst}, duplicates {duplicates}, unflagged gaps {unflagged_gaps}".format(**rep))
+            if rec.get("handles"):
+                ET.SubElement(props, "property", name = "handles",
+                    value = "opens {opens}, reuses {reuses}, closes {closes}, open time {open_time:.6f}, close time {close_time:.6f}".format(**rec["handles"]))
+            if rec["status"] in ("failure", "error"):
+                elem = ET.SubElement(case, rec["status"],
+                                     message = rec["message"] or "")
+                elem.text = rec["details"]
+            elif rec["status"] == "skip":
+                ET.SubElement(case, "skipped", message = rec["reason"] or "")
+
+    ET.ElementTree(root).write(path, encoding = "utf-8")
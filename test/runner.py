@@ -0,0 +1,342 @@
+"""
+@author: Federico Vaga <federico.vaga@gmail.com>
+@copyright: CERN 2014
+@license: GPLv2
+
+Parallel test runner. Each test module runs in its own worker process; the
+runner starts at the same time only the modules whose footprints (see
+test.footprint) do not conflict, on the same device or on different
+zio-zero devices. Most of the tests spend their time sleeping, so running
+them together shortens the whole run. With a duration history (see
+test.durations) the longest tests start first.
+
+On the simulated backend each worker has its own simulated ZIO tree.
+
+A worker that dies, or that gives no result for 'worker_timeout' seconds
+more than the usual duration of its test, fails its test instead of
+stalling the run. The first time, the tests tagged as long have no
+timeout.
+"""
+from test import catalog, config, results, durations, setup
+import multiprocessing
+import traceback
+import unittest
+import time
+import sys
+
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+try:
+    import Queue as queue
+except ImportError:
+    import queue
+
+
+# The tags of the tests that can take long (see test.catalog): without a
+# duration history they have no timeout
+LONG_TAGS = ("timing", "stress", "module-load")
+
+
+class ParallelRunner(object):
+    """
+    It runs a list of test modules with at most 'jobs' worker processes on
+    the given devices
+    """
+
+    def __init__(self, jobs, devices, stream = sys.stdout, db = None):
+        self.jobs = jobs
+        self.devices = list(devices)
+        self.stream = stream
+        self.db = db
+
+
+    def run(self, names):
+        """
+        It runs all the given tests and it returns their records (see
+        test.results)
+        """
+        settings = _settings()
+        pending = self._order(names)
+        running = []  # (name, device, footprint)
+        started = {}
+        done = queue.Queue()
+        records = []
+        total = len(pending)
+
+        start = time.time()
+        self.stream.write("Estimated duration: {0}\n".format(
+                          durations.format_eta(self.estimate(pending, []))))
+        pool = multiprocessing.Pool(self.jobs, maxtasksperchild = 1)
+        try:
+            while pending or running:
+                for name, device, footprint in self._schedule(pending, running):
+                    running.append((name, device, footprint))
+                    started[name, device] = time.time()
+                    pool.apply_async(_run_test, (name, device, settings),
+                                     callback = done.put,
+                                     error_callback = _on_error(done, name,
+                                                                device))
+
+                deadlines = [self._deadline(name, started[name, device])
+                             for name, device, fp in running]
+                deadlines = [d for d in deadlines if d is not None]
+                timeout = max(min(deadlines) - time.time(), 0) \
+                          if deadlines else None
+                try:
+                    res = done.get(timeout = timeout)
+                except queue.Empty:
+                    # A worker hangs: give up its test, start again the
+                    # others, which die with the pool, and go on with a new
+                    # pool
+                    now = time.time()
+                    for name, device, fp in reversed(running):
+                        deadline = self._deadline(name, started[name, device])
+                        if deadline is None or deadline > now:
+                            pending.insert(0, (name, fp))
+                            continue
+                        res = _failure(name, device, "worker timeout",
+                            "No result after {0:.1f}s".format(
+                            now - started[name, device]))
+                        self._report(res)
+                        records.extend(res["records"])
+                    running = []
+                    pool.terminate()
+                    pool.join()
+                    pool = multiprocessing.Pool(self.jobs, maxtasksperchild = 1)
+                    continue
+                if (res["name"], res["device"]) not in \
+                        [r[:2] for r in running]:
+                    continue  # late result of a test given up
+                running = [r for r in running if r[:2] != (res["name"],
+                                                           res["device"])]
+                self._report(res)
+                records.extend(res["records"])
+
+                now = time.time()
+                left = [(name, device, fp, now - started[name, device])
+                        for name, device, fp in running]
+                self.stream.write("[{0}/{1}] remaining time: {2}\n".format(
+                                  total - len(pending) - len(running), total,
+                                  durations.format_eta(self.estimate(pending, left))))
+        finally:
+            pool.close()
+            pool.join()
+
+        count = results.summary(records)
+        self.stream.write("-" * 70 + "\n")
+        self.stream.write("Ran {0} tests in {1:.3f}s with {2} jobs\n\n".format(
+                          count["tests"], time.time() - start, self.jobs))
+        if results.success(records):
+            self.stream.write("OK (skipped={0})\n".format(count["skip"]))
+        else:
+            self.stream.write("FAILED (failures={0}, errors={1}, skipped={2})\n".format(
+                              count["failure"], count["error"], count["skip"]))
+        return records
+
+
+    def _duration(self, name):
+        if self.db is None:
+            return None
+        return self.db.estimate_module(name)
+
+
+    def _deadline(self, name, started):
+        """
+        It returns when (a time.time() value) a test started at 'started'
+        is given up: 'worker_timeout' seconds after its usual duration. A
+        test without history has 'worker_timeout' seconds, or no deadline
+        when its tags say that it can take long (see LONG_TAGS).
+        """
+        duration = self._duration(name)
+        if duration is None:
+            if set(catalog.tags(name)) & set(LONG_TAGS):
+                return None
+            duration = 0
+        return started + duration + config.worker_timeout
+
+
+    def _order(self, names):
+        """
+        It returns the pending list with the longest tests first. The tests
+        without history go first, the exclusive ones do not move.
+        """
+        pending = []
+        group = []
+        for name in names + [None]:
+            footprint = catalog.footprint(name) if name else None
+            if name is None or footprint.exclusive:
+                group.sort(key = lambda e: -(self._duration(e[0]) or float("inf")))
+                pending.extend(group)
+                group = []
+                if name is not None:
+                    pending.append((name, footprint))
+            else:
+                group.append((name, footprint))
+        return pending
+
+
+    def estimate(self, pending, running):
+        """
+        It returns the time (seconds) to run the pending tests and to
+        complete the running ones, given as (name, device, footprint,
+        elapsed). It replays the scheduling with the durations of the
+        history; the tests without history count as 0.
+        """
+        pending = list(pending)
+        running = [(name, device, fp, (self._duration(name) or 0) - elapsed)
+                   for name, device, fp, elapsed in running]
+        now = 0.0
+        while pending or running:
+            for name, device, fp in self._schedule(pending,
+                                                   [r[:3] for r in running]):
+                running.append((name, device, fp,
+                                now + (self._duration(name) or 0)))
+            if not running:
+                break
+            running.sort(key = lambda r: r[3])
+            now = max(now, running.pop(0)[3])
+        return now
+
+
+    def _schedule(self, pending, running):
+        """
+        It removes from 'pending' and it returns the tests that can start now.
+        An exclusive test waits for all the running ones and the following
+        tests wait for it, so the tests that load and unload modules never
+        overlap with anything.
+        """
+        started = []
+        busy = list(running)
+        for entry in list(pending):
+            if len(busy) >= self.jobs:
+                break
+            name, footprint = entry
+            if footprint.exclusive:
+                if not busy and entry is pending[0]:
+                    pending.remove(entry)
+                    started.append((name, self.devices[0], footprint))
+                break
+            device = self._free_device(footprint, busy)
+            if device is None:
+                continue
+            pending.remove(entry)
+            busy.append((name, device, footprint))
+            started.append((name, device, footprint))
+        return started
+
+
+    def _free_device(self, footprint, busy):
+        """
+        It returns the first device where the footprint does not conflict
+        with the running tests
+        """
+        for device in self.devices:
+            conflict = False
+            for name, dev, fp in busy:
+                if fp.exclusive or (dev == device and fp.conflicts(footprint)):
+                    conflict = True
+                    break
+            if not conflict:
+                return device
+        return None
+
+
+    def _report(self, res):
+        self.stream.write("=" * 70 + "\n")
+        self.stream.write("{0} on {1}\n".format(res["name"], res["device"]))
+        self.stream.write(res["output"])
+        self.stream.flush()
+
+
+def _settings():
+    """
+    It returns the configuration to give to the workers
+    """
+    return dict([(k, v) for k, v in vars(config).items()
+                 if not k.startswith("_")])
+
+
+def _run_test(name, device, settings):
+    """
+    It runs a test module in a worker process. It returns the output of the
+    test and its records.
+    """
+    for key, value in settings.items():
+        setattr(config, key, value)
+    config.device = device
+
+    res = {"name": name, "device": device, "records": []}
+    stream = StringIO()
+    stdout = sys.stdout
+    sys.stdout = stream  # tests write on stdout too
+    sim = None
+    try:
+        sim = setup.start_backend()
+
+        from test import manifest
+        reason = manifest.apply().supports(catalog.footprint(name), device)
+        if reason:
+            # Do not even import the tests
+            stream.write("skipped '{0}'\n".format(reason))
+            res["records"].append(_module_record(name, device, "skip",
+                                                 reason = reason))
+        else:
+            suite = unittest.TestLoader().loadTestsFromName(name)
+            if config.isolate:
+                from test import snapshot
+                snapshot.isolate(suite, device)
+            if config.record_dir:
+                from test import capture
+                capture.record(suite, device)
+            if config.replay_dir:
+                from test import capture
+                capture.replay(suite, device)
+            result = unittest.TextTestRunner(stream = stream, verbosity = 2,
+                            resultclass = results.ResultCollector).run(suite)
+            res["records"] = result.records
+    except:
+        details = traceback.format_exc()
+        stream.write(details)
+        res["records"].append(_module_record(name, device, "error",
+                                             message = "worker failure",
+                                             details = details))
+    finally:
+        sys.stdout = stdout
+        if sim:
+            sim.stop()
+    res["output"] = stream.getvalue()
+    return res
+
+
+def _failure(name, device, message, details):
+    """
+    It returns the result of a test module that did not run to the end
+    """
+    return {"name": name, "device": device, "output": details + "\n",
+            "records": [_module_record(name, device, "error",
+                                       message = message,
+                                       details = details)]}
+
+
+def _on_error(done, name, device):
+    """
+    It returns the callback of a worker that died: it gives the result of a
+    failure
+    """
+    def callback(exc):
+        done.put(_failure(name, device, "worker failure", repr(exc)))
+    return callback
+
+
+def _module_record(name, device, status, reason = None, message = None,
+                   details = None):
+    """
+    It returns a record for a whole test module
+    """
+    return {"id": name, "classname": name, "name": "", "device": device,
+            "status": status, "time": 0.0, "setup": 0.0, "teardown": 0.0,
+            "reason": reason, "message": message, "details": details,
+            "losses": [], "handles": None}
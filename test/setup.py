@@ -7,6 +7,58 @@ from test import config
 import os
 
 def parse_environment():
+    config.backend = _set_variable(config.backend, "backend")
+    config.sim_clock_rate = float(_set_variable(config.sim_clock_rate, \
+                                                "sim_clock_rate"))
+    config.jobs = int(_set_variable(config.jobs, "jobs"))
+    config.worker_timeout = float(_set_variable(config.worker_timeout, \
+                                                "worker_timeout"))
+    config.devices = _set_variable(" ".join(config.devices), "devices").split()
+    config.device = config.devices[0]
+    config.results_json = _set_variable(config.results_json, "results_json")
+    config.results_junit = _set_variable(config.results_junit, "results_junit")
+    config.durations_db = _set_variable(config.durations_db, "durations_db")
+    config.duration_regression = float(_set_variable(config.duration_regression, \
+                                                     "duration_regression"))
+    config.manifest_path = _set_variable(config.manifest_path, "manifest_path")
+    config.isolate = _set_variable(config.isolate, "isolate") in (True, "1", "True", "yes")
+    config.loss_accounting = _set_variable(config.loss_accounting, \
+                                "loss_accounting") in (True, "1", "True", "yes")
+    config.handle_pool = _set_variable(config.handle_pool, \
+                                "handle_pool") in (True, "1", "True", "yes")
+    config.record_dir = _set_variable(config.record_dir, "record_dir")
+    config.record_compression = _set_variable(config.record_compression, \
+                                              "record_compression")
+    config.replay_dir = _set_variable(config.replay_dir, "replay_dir")
+    config.bench_duration = float(_set_variable(config.bench_duration, \
+                                                "bench_duration"))
+    config.bench_csets = _int_list(config.bench_csets, "bench_csets")
+    config.bench_triggers = _set_variable(" ".join(config.bench_triggers), \
+                                          "bench_triggers").split()
+    config.bench_buffers = _set_variable(" ".join(config.bench_buffers), \
+                                         "bench_buffers").split()
+    config.bench_post_samples = _int_list(config.bench_post_samples, \
+                                          "bench_post_samples")
+    config.bench_hrt_period_ns = int(_set_variable(config.bench_hrt_period_ns, \
+                                                   "bench_hrt_period_ns"))
+    config.bench_timer_ms_period = int(_set_variable(config.bench_timer_ms_period, \
+                                                     "bench_timer_ms_period"))
+    config.bench_fires = int(_set_variable(config.bench_fires, "bench_fires"))
+    config.bench_hist_bin_us = int(_set_variable(config.bench_hist_bin_us, \
+                                                 "bench_hist_bin_us"))
+    config.bench_histogram = _set_variable(config.bench_histogram, \
+                                           "bench_histogram")
+    config.bench_readers = _set_variable(" ".join(config.bench_readers), \
+                                         "bench_readers").split()
+    config.bench_maxrate_precision = float(_set_variable(config.bench_maxrate_precision, \
+                                                         "bench_maxrate_precision"))
+    config.bench_mmap_post_samples = _int_list(config.bench_mmap_post_samples,
+                                               "bench_mmap_post_samples")
+    config.bench_mmap_buffer_kb = int(_set_variable(config.bench_mmap_buffer_kb, \
+                                                    "bench_mmap_buffer_kb"))
+    config.bench_write_batch = int(_set_variable(config.bench_write_batch, \
+                                                 "bench_write_batch"))
+    config.bench_json = _set_variable(config.bench_json, "bench_json")
     config.trig = _set_variable(config.trig, "trig")
     config.buf = _set_variable(config.buf, "buf")
     config.nstress = int(_set_variable(config.nstress, "nstress"))
@@ -18,6 +70,37 @@ def parse_environment():
                                                 "acquisition_wait"))
     config.hrt_slack_nsec = int(_set_variable(config.hrt_slack_nsec, \
                                                 "hrt_slack_nsec"))
+    config.concurrent_readers = int(_set_variable(config.concurrent_readers, \
+                                                  "concurrent_readers"))
+    config.concurrent_ms_period = int(_set_variable(config.concurrent_ms_period, \
+                                                    "concurrent_ms_period"))
+    config.timing_max_outliers = float(_set_variable(config.timing_max_outliers, \
+                                             "timing_max_outliers"))
+
+def start_backend():
+    """
+    It prepares the backend chosen by the configuration. On the simulated
+    backend it returns the running simulator, to stop at the end; it must be
+    called before loading PyZio objects and test modules.
+    """
+    if config.backend != "sim":
+        return None
+    from test.sim.backend import SimBackend
+    from test import clock
+    if config.sim_clock_rate != 1:
+        clock.set_clock(clock.VirtualClock(config.sim_clock_rate))
+    sim = SimBackend(devices = config.devices)
+    sim.start()
+    try:
+        sim.install()
+    except:
+        sim.stop()
+        raise
+    return sim
+
+def _int_list(var, name):
+    value = _set_variable(" ".join([str(v) for v in var]), name)
+    return [int(v) for v in value.split()]
 
 def _set_variable(var, name):
     print("looking for {0}".format(name))
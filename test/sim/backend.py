@@ -0,0 +1,316 @@
+"""
+@author: Federico Vaga <federico.vaga@gmail.com>
+@copyright: CERN 2014
+@license: GPLv2
+
+Simulated ZIO backend. It builds a fake ZIO sysfs tree with 'zzero' devices
+and their char devices in a temporary directory, then it points PyZio to it.
+A background thread emulates the triggers; user writes are handled
+immediately through PyZio attributes or, for writes done by other means
+(e.g. a shell), by scanning the tree.
+
+All the times come from the test clock (see test.clock): with a virtual
+clock the triggers fire in virtual time. With a stepped clock, when the
+tests wait and the channels that they have open are empty, the clock jumps
+to the next expiration of the trigger, so a reader never waits in vain. The
+channels nobody reads do not hold the clock back, and the clock does not
+move while the tests are still programming the device.
+
+The char devices are FIFOs: they do not enforce the 512 byte read of the
+control, and the data of a block remains readable until somebody reads it.
+"""
+import threading
+import tempfile
+import shutil
+import time
+import sys
+import os
+
+from test.sim import zzero
+from test import clock as test_clock
+
+# How often (seconds) the tree is scanned for writes not done through PyZio
+RECONCILE_PERIOD = 0.01
+# How often (seconds) a stepped clock checks whether the tests wait
+STEP_CHECK_PERIOD = 0.001
+# The methods of ZioCharDevice that wait for the device, with the char
+# devices they wait on: the first one open
+WAITING_CALLS = {"is_device_ready": ("fileno_ctrl", "fileno_data"),
+                 "read_block": ("fileno_ctrl", "fileno_data"),
+                 "read_ctrl": ("fileno_ctrl",),
+                 "read_data": ("fileno_data",)}
+
+
+class SimBackend(object):
+    """
+    It emulates the ZIO framework with a set of 'zzero' devices
+    """
+
+    def __init__(self, root = None, devices = ("zzero-0000",), clock = None):
+        self.root = root
+        self.clock = clock or test_clock.get_clock()
+        self.device_names = devices
+        self.devices = []
+        self.objects = {}
+        self.lock = threading.RLock()
+        self.cond = threading.Condition(self.lock)
+        self.thread = None
+        self.running = False
+        self.__tmp = False
+        self.__orig_set_value = None
+        self.__orig_waits = {}
+
+
+    def now_ns(self):
+        return self.clock.time_ns()
+
+
+    def clock_changed(self):
+        """
+        The clock moved forward, fire all the expired triggers
+        """
+        with self.cond:
+            self._run_triggers()
+            self.cond.notify()
+
+
+    def start(self):
+        """
+        It builds the ZIO tree and it starts the trigger emulation
+        """
+        if self.root is None:
+            self.root = tempfile.mkdtemp(prefix = "zio-sim-")
+            self.__tmp = True
+        self.zio_bus_path = os.path.join(self.root, "sys", "bus", "zio") + "/"
+        self.devices_path = os.path.join(self.zio_bus_path, "devices") + "/"
+        self.cdev_path = os.path.join(self.root, "dev", "zio") + "/"
+        os.makedirs(self.devices_path)
+        os.makedirs(self.cdev_path)
+
+        with open(os.path.join(self.zio_bus_path, "available_triggers"), "w") as f:
+            f.write("\n".join(zzero.TRIGGERS) + "\n")
+        with open(os.path.join(self.zio_bus_path, "available_buffers"), "w") as f:
+            f.write("\n".join(zzero.BUFFERS) + "\n")
+
+        with self.lock:
+            for name in self.device_names:
+                self.devices.append(zzero.SimDevice(self, name))
+            self._update_objects()
+
+        self.clock.add_listener(self.clock_changed)
+        self.running = True
+        self.thread = threading.Thread(target = self._run, name = "zio-sim")
+        self.thread.daemon = True
+        self.thread.start()
+
+
+    def stop(self):
+        with self.cond:
+            self.running = False
+            self.cond.notify()
+        if self.thread:
+            self.thread.join()
+        for dev in self.devices:
+            dev.destroy()
+        self.devices = []
+        if self.__tmp:
+            shutil.rmtree(self.root)
+
+
+    def install(self):
+        """
+        It points PyZio to the simulated tree. It must be called before
+        importing the test modules because they copy 'devices_path' at import
+        time.
+        """
+        from PyZio import ZioConfig, ZioAttribute, ZioCharDevice
+
+        paths = {"zio_bus_path": self.zio_bus_path,
+                 "devices_path": self.devices_path,
+                 "zio_cdev_path": self.cdev_path}
+        for name, mod in list(sys.modules.items()):
+            if mod is None or not name.startswith("PyZio"):
+                continue
+            for attr, value in paths.items():
+                if hasattr(mod, attr) or mod is ZioConfig:
+                    setattr(mod, attr, value)
+
+        _replace(ZioConfig.triggers, zzero.TRIGGERS)
+        _replace(ZioConfig.buffers, zzero.BUFFERS)
+
+        # Writes through PyZio take effect immediately, as in sysfs
+        cls = ZioAttribute.ZioAttribute
+        self.__orig_set_value = cls.set_value
+        orig = self.__orig_set_value
+        backend = self
+        def set_value(attr, val):
+            ret = orig(attr, val)
+            backend.attribute_written(attr.fullpath)
+            return ret
+        cls.set_value = set_value
+
+        # The waits through PyZio tell the clock what the tests wait for
+        cls = ZioCharDevice.ZioCharDevice
+        for name, filenos in WAITING_CALLS.items():
+            self.__orig_waits[name] = getattr(cls, name)
+            setattr(cls, name, _waiting(getattr(cls, name), filenos))
+
+
+    def uninstall(self):
+        from PyZio import ZioAttribute, ZioCharDevice
+        if self.__orig_set_value:
+            ZioAttribute.ZioAttribute.set_value = self.__orig_set_value
+            self.__orig_set_value = None
+        for name, fn in self.__orig_waits.items():
+            setattr(ZioCharDevice.ZioCharDevice, name, fn)
+        self.__orig_waits = {}
+
+
+    def attribute_written(self, path):
+        """
+        It applies the side effects of a write on an attribute
+        """
+        with self.cond:
+            obj = self.objects.get(os.path.dirname(path))
+            name = os.path.basename(path)
+            if obj is None or name not in obj.writable:
+                return
+            self._consume(obj, name)
+            self._update_objects()
+            self._run_triggers()  # i.e. an hrt programmed in the past
+            self.cond.notify()
+
+
+    def _consume(self, obj, name):
+        """
+        It handles a write, unless the scan of the tree already did it
+        """
+        path = os.path.join(obj.fullpath, name)
+        try:
+            mtime = os.stat(path).st_mtime
+            if mtime == 0:
+                return
+            with open(path, "r") as f:
+                value = f.read().strip()
+            # The scan may run between the truncate and the write of a
+            # writer, leave the write to the next pass
+            if not value or os.stat(path).st_mtime != mtime:
+                return
+        except (IOError, OSError):
+            return  # The object has been removed meanwhile
+        obj.store(name, value)
+        os.utime(path, (0, 0))
+
+
+    def _update_objects(self):
+        """
+        Triggers and buffers change with the user configuration, the map
+        between directories and objects must follow them
+        """
+        self.objects = {}
+        for dev in self.devices:
+            for obj in dev.objects():
+                self.objects[obj.fullpath] = obj
+
+
+    def _reconcile(self):
+        for obj in list(self.objects.values()):
+            for name in list(obj.writable):
+                self._consume(obj, name)
+        self._update_objects()
+
+
+    def _csets(self):
+        for dev in self.devices:
+            for cset in dev.cset:
+                yield cset
+
+
+    def _run_triggers(self):
+        now = self.now_ns()
+        for cset in self._csets():
+            cset.trigger.run(now)
+
+
+    def _idle_expire(self):
+        """
+        It returns the first expiration among the idle channel sets. Only
+        the char devices that the tests wait for count (see
+        VirtualClock.waiting()): None when the tests do not wait.
+        """
+        chardevs = {}
+        for cset in self._csets():
+            for chan in cset.all_channels():
+                for index, key in enumerate(chan.inodes):
+                    chardevs[key] = (chan, index)
+        waited = {}
+        for fd in self.clock.waited():
+            try:
+                chan, index = chardevs[zzero.inode(fd)]
+            except (KeyError, OSError):
+                continue  # not a char device of the tree, or closed meanwhile
+            waited.setdefault(chan.cset, []).append((chan, index))
+        expires = [cset.trigger.next_fire() for cset, chans in waited.items()
+                   if cset.is_idle(chans)]
+        expires = [e for e in expires if e is not None]
+        return min(expires) if expires else None
+
+
+    def _run(self):
+        next_reconcile = 0
+        with self.cond:
+            while self.running:
+                if time.time() >= next_reconcile:
+                    self._reconcile()
+                    next_reconcile = time.time() + RECONCILE_PERIOD
+
+                self._run_triggers()
+                now = self.now_ns()
+                for cset in self._csets():
+                    cset.consume_output(now)
+
+                if self.clock.is_stepped():
+                    expire = self._idle_expire()
+                    if expire is not None:
+                        self.clock.advance_to(expire)
+                        self.cond.wait(0)
+                        continue
+
+                now = self.now_ns()
+                timeout = RECONCILE_PERIOD
+                for cset in self._csets():
+                    expire = cset.trigger.next_fire()
+                    if expire is None:
+                        continue
+                    if self.clock.is_stepped():
+                        # Catch the tests as soon as they wait, even briefly
+                        timeout = min(timeout, STEP_CHECK_PERIOD)
+                        continue
+                    real = self.clock.real_timeout((expire - now) / 1000000000.0)
+                    if real is not None:
+                        timeout = min(timeout, real)
+                self.cond.wait(max(timeout, 0))
+
+
+def _waiting(fn, filenos):
+    """
+    It wraps a method of ZioCharDevice that can block: the tests wait for
+    the first open char device among 'filenos' meanwhile. A poll without
+    timeout does not wait.
+    """
+    def wrapper(interface, *args, **kwargs):
+        if fn.__name__ == "is_device_ready" and \
+           not (args[0] if args else kwargs.get("timeout", 0)):
+            return fn(interface, *args, **kwargs)
+        fds = [getattr(interface, name)() for name in filenos]
+        fds = [fd for fd in fds if fd is not None][:1]
+        with test_clock.get_clock().waiting(fds):
+            return fn(interface, *args, **kwargs)
+    wrapper.__name__ = fn.__name__
+    wrapper.__doc__ = fn.__doc__
+    return wrapper
+
+
+def _replace(lst, values):
+    del lst[:]
+    lst.extend(values)
@@ -0,0 +1,792 @@
+"""
+@author: Federico Vaga <federico.vaga@gmail.com>
+@copyright: CERN 2014
+@license: GPLv2
+
+It models the 'zio-zero' device: its sysfs hierarchy (device, channel sets,
+channels, trigger and buffer) and its char devices. Every object keeps its
+attributes as regular files under a given root directory, so PyZio can walk
+them as if they were the real sysfs attributes. The char devices are FIFOs
+where the model pushes control blocks and samples; on the output channels
+the user writes the blocks and each fire of the trigger takes one of them.
+The model cannot tell the order of the writes on two different FIFOs: it
+pairs each control with the next block of samples, and the samples written
+without a control use the last control.
+"""
+import os
+import struct
+import fcntl
+import errno
+import termios
+import array
+import shutil
+
+from test.ctrlblock import CTRL_SIZE, CTRL_FORMAT, nsamples as ctrl_nsamples
+
+ZIO_MAJOR_VERSION = 1
+ZIO_MINOR_VERSION = 0
+AF_ZIO = 27
+
+# ZIO alarm bits: lost block on input (see test.buffer.Overflow), lost
+# trigger (a fire without a block to output) on output
+ZIO_ALARM_LOST_BLOCK = 0x1
+ZIO_ALARM_LOST_TRIGGER = 0x2
+
+# Standard attributes, the position is the index within the control block
+CHAN_STD_ATTR = ("resolution-bits", "gain_factor", "offset",
+                 "max-sample-rate", "vref-src")
+TRIG_STD_ATTR = ("nshots", "post-samples", "pre-samples")
+
+# Channel sets of zio-zero: name, sample size, channels, direction, interleave
+CSETS = (("zero-input-8", 1, ("zero", "random", "sequence"), "input", True),
+         ("zero-input-16", 2, ("zero", "sequence"), "input", False),
+         ("zero-input-32", 4, ("sequence",), "input", False),
+         ("zero-output-8", 1, ("sink",), "output", False),
+        )
+
+TRIGGERS = ("user", "timer", "hrt")
+BUFFERS = ("kmalloc", "vmalloc")
+
+# Maximum number of fires to recover when the clock jumps forward
+MAX_CATCHUP = 4096
+
+# Size of the pipes used as char devices
+PIPE_SIZE = 1024 * 1024
+F_SETPIPE_SZ = 1031
+F_GETPIPE_SZ = 1032
+
+
+def pack_ctrl(seq_num, nsamples, ssize, nbits, dev_id, cset, chan, devname,
+              tstamp_ns, trigname, chan_std, trig_std, alarms = 0):
+    """
+    It returns the binary representation of a control block
+    """
+    chan_val = list(chan_std) + [0] * (16 - len(chan_std))
+    trig_val = list(trig_std) + [0] * (16 - len(trig_std))
+    chan_mask = (1 << len(chan_std)) - 1
+    trig_mask = (1 << len(trig_std)) - 1
+    sec, ticks = divmod(tstamp_ns, 1000000000)
+    values = [ZIO_MAJOR_VERSION, ZIO_MINOR_VERSION, alarms & 0xFF, 0,
+              seq_num & 0xFFFFFFFF, nsamples, ssize, nbits,
+              AF_ZIO, 0, 0, b"", dev_id, cset, chan, devname.encode(),
+              sec, ticks, 0,
+              0, 0, 0,
+              trigname.encode()]
+    values += [chan_mask, 0, 0] + [v & 0xFFFFFFFF for v in chan_val] + [0] * 32
+    values += [trig_mask, 0, 0] + [v & 0xFFFFFFFF for v in trig_val] + [0] * 32
+    values.append(b"")
+    return struct.pack(CTRL_FORMAT, *values)
+
+
+class SimObject(object):
+    """
+    A generic ZIO object. Attributes are stored in files within the object
+    directory. A file is 'consumed' when its modification time is zero: every
+    time the model writes a file it sets the modification time to zero, so
+    it can recognize the writes done by somebody else.
+    """
+
+    def __init__(self, path, name):
+        self.fullpath = os.path.join(path, name)
+        self.name = name
+        self.writable = set()
+        os.mkdir(self.fullpath)
+
+
+    def add_attr(self, name, value, writable = True):
+        if writable:
+            self.writable.add(name)
+        self.set(name, value)
+        os.chmod(os.path.join(self.fullpath, name), 0o644 if writable else 0o444)
+
+
+    def set(self, name, value):
+        """
+        It writes the value of an attribute as the kernel does
+        """
+        path = os.path.join(self.fullpath, name)
+        if not isinstance(value, bytes):
+            value = (str(value) + "\n").encode()
+        # Truncate after the write, so a reader never gets an empty value
+        with open(path, "r+b" if os.path.exists(path) else "wb") as f:
+            f.write(value)
+            f.truncate()
+        os.utime(path, (0, 0))
+
+
+    def get(self, name):
+        with open(os.path.join(self.fullpath, name), "r") as f:
+            return f.read().strip()
+
+
+    def get_int(self, name):
+        try:
+            return int(self.get(name), 0)
+        except ValueError:
+            return 0
+
+
+    def store(self, name, value):
+        """
+        It handles a user write. By default the attribute keeps the value
+        """
+        self.set(name, value)
+
+
+class SimTrigger(SimObject):
+    """
+    Generic trigger, it never fires by itself
+    """
+    extra_attr = ()
+
+    def __init__(self, cset, name):
+        SimObject.__init__(self, cset.fullpath, "trigger")
+        self.cset = cset
+        self.trig_name = name
+        self.enabled = True
+        self.expire = None
+        self.add_attr("name", name, False)
+        self.add_attr("enable", 1)
+        self.add_attr("nshots", 1)
+        self.add_attr("post-samples", 16)
+        self.add_attr("pre-samples", 0)
+        for attr_name, value in self.extra_attr:
+            self.add_attr(attr_name, value)
+
+
+    def std_values(self):
+        return [self.get_int(n) for n in TRIG_STD_ATTR]
+
+
+    def store(self, name, value):
+        if name == "enable":
+            self.enabled = _to_int(value) != 0
+            self.set(name, 1 if self.enabled else 0)
+            if self.enabled:
+                self.arm(self.cset.backend.now_ns())
+            return
+        self.set(name, value)
+        if name in TRIG_STD_ATTR:
+            self.cset.update_current_control()
+
+
+    def arm(self, now):
+        pass
+
+
+    def next_fire(self):
+        """
+        It returns the next expiration time (ns), None if nothing is pending
+        """
+        return self.expire if self.enabled else None
+
+
+    def run(self, now):
+        """
+        It fires for every expiration up to 'now'. When the clock jumps
+        forward a lot, the expirations over MAX_CATCHUP are skipped as the
+        hrtimer forward does.
+        """
+        n = 0
+        while self.enabled and self.expire is not None and self.expire <= now:
+            if n == MAX_CATCHUP:
+                self.expire = self.forward(now)
+                continue
+            tstamp = self.expire
+            self.expire = self.next_expire(tstamp)
+            self.cset.fire(tstamp)
+            n += 1
+
+
+    def next_expire(self, tstamp):
+        return None
+
+
+    def forward(self, now):
+        """
+        It returns the first expiration after 'now'
+        """
+        return None
+
+
+    def destroy(self):
+        shutil.rmtree(self.fullpath)
+
+
+class SimTriggerUser(SimTrigger):
+    pass
+
+
+class SimTriggerTimer(SimTrigger):
+    """
+    Periodic trigger aligned to 'ms-period' plus 'ms-phase'
+    """
+    extra_attr = (("ms-period", 1000), ("ms-phase", 0))
+
+    def __init__(self, cset, name):
+        SimTrigger.__init__(self, cset, name)
+        self.arm(cset.backend.now_ns())
+
+
+    def store(self, name, value):
+        SimTrigger.store(self, name, value)
+        if name in ("ms-period", "ms-phase"):
+            self.arm(self.cset.backend.now_ns())
+
+
+    def arm(self, now):
+        self.expire = self.next_expire(now)
+
+
+    def next_expire(self, tstamp):
+        period = max(self.get_int("ms-period"), 1) * 1000000
+        phase = self.get_int("ms-phase") * 1000000
+        return ((tstamp - phase) // period + 1) * period + phase
+
+
+    def forward(self, now):
+        return self.next_expire(now)
+
+
+class SimTriggerHrt(SimTrigger):
+    """
+    High resolution timer trigger. It is armed by writing 'exp-scalar-h' or
+    'exp-sec'; values lower than 2^32ns are relative to the current time
+    """
+    extra_attr = (("exp-scalar-l", 0), ("exp-scalar-h", 0),
+                  ("exp-nsec", 0), ("exp-sec", 0),
+                  ("period-ns", 0), ("slack-ns", 10000))
+
+    def store(self, name, value):
+        SimTrigger.store(self, name, value)
+        now = self.cset.backend.now_ns()
+        if name == "exp-scalar-h":
+            scalar = (self.get_int("exp-scalar-h") << 32) | \
+                     (self.get_int("exp-scalar-l") & 0xFFFFFFFF)
+            self.program(scalar if scalar >= (1 << 32) else now + scalar, now)
+        elif name == "exp-sec":
+            sec = self.get_int("exp-sec")
+            nsec = self.get_int("exp-nsec")
+            if sec * 1000000000 < (1 << 32):
+                sec += now // 1000000000
+            self.program(sec * 1000000000 + nsec, now)
+        elif name == "period-ns" and self.get_int("period-ns") == 0:
+            if self.expire is not None and self.expire > now:
+                self.expire = None
+
+
+    def arm(self, now):
+        # The timer kept running while the trigger was disabled: a pending
+        # expiration fires once on enable, the periods are not replayed
+        if self.expire is not None and self.expire < now:
+            self.expire = now
+
+
+    def program(self, expire, now):
+        self.expire = max(expire, now)
+
+
+    def next_expire(self, tstamp):
+        period = self.get_int("period-ns")
+        return tstamp + period if period > 0 else None
+
+
+    def forward(self, now):
+        period = self.get_int("period-ns")
+        if period <= 0:
+            return None
+        return self.expire + ((now - self.expire) // period + 1) * period
+
+
+TRIGGER_CLASS = {"user": SimTriggerUser,
+                 "timer": SimTriggerTimer,
+                 "hrt": SimTriggerHrt}
+
+
+class SimBuffer(SimObject):
+    """
+    It is the 'buffer' directory of a channel. Blocks are stored in the
+    channel char devices, here we have only the buffer limits.
+    """
+
+    def __init__(self, chan, name):
+        SimObject.__init__(self, chan.fullpath, "buffer")
+        self.chan = chan
+        self.buf_name = name
+        self.add_attr("name", name, False)
+        self.add_attr("flush", 0)
+        self.add_attr("max-buffer-len", 16)
+        if name == "vmalloc":
+            self.add_attr("max-buffer-kb", 128)
+
+
+    def store(self, name, value):
+        if name == "flush":
+            self.chan.flush()
+            self.set(name, 0)
+            return
+        self.set(name, _to_int(value))
+        if name == "max-buffer-kb":  # vmalloc reallocates on resize
+            self.chan.flush()
+        if name == "max-buffer-len":
+            self.chan.resize_output()
+
+
+    def is_full(self, data_len):
+        if self.chan.stored_blocks() >= self.get_int("max-buffer-len"):
+            return True
+        if self.buf_name == "vmalloc":
+            size = self.get_int("max-buffer-kb") * 1024
+            if self.chan.stored_bytes() + data_len > size:
+                return True
+        return False
+
+
+    def destroy(self):
+        shutil.rmtree(self.fullpath)
+
+
+class SimChannel(SimObject):
+    """
+    A channel. The control and data char devices are FIFOs, the model keeps
+    a non-blocking read-write descriptor on both of them to push and flush
+    blocks.
+    """
+
+    def __init__(self, cset, index, kind):
+        name = "chani" if index == "i" else "chan{0}".format(index)
+        SimObject.__init__(self, cset.fullpath, name)
+        self.cset = cset
+        self.index = index
+        self.kind = kind
+        self.enabled = index != "i"
+        self.alarms = 0
+        self.seq_num = 0
+        self.counter = 0
+        self.out_ctrl = None  # control of the next block to output
+        self.last_out_ctrl = None
+        self.buffer = None
+        self.add_attr("name", name, False)
+        self.add_attr("enable", 1 if self.enabled else 0)
+        self.add_attr("alarms", "0 0")
+        self.add_attr("current-control", b"\0" * CTRL_SIZE, False)
+
+        prefix = "{0}-{1}-{2}".format(cset.device.name, cset.index, index)
+        self.ctrlfile = os.path.join(cset.backend.cdev_path, prefix + "-ctrl")
+        self.datafile = os.path.join(cset.backend.cdev_path, prefix + "-data")
+        self.fdc = _open_fifo(self.ctrlfile)
+        self.fdd = _open_fifo(self.datafile)
+        self.inodes = (inode(self.fdc), inode(self.fdd))
+        self.set_buffer(cset.buf_name)
+
+
+    def is_interleaved(self):
+        return self.index == "i"
+
+
+    def set_buffer(self, name):
+        if self.buffer:
+            self.buffer.destroy()
+            self.flush()
+        self.buffer = SimBuffer(self, name)
+        self.resize_output()
+
+
+    def resize_output(self):
+        """
+        On output the control FIFO holds the blocks of the buffer: the user
+        can write up to 'max-buffer-len' controls, rounded up to pages
+        """
+        if self.cset.direction != "output":
+            return
+        size = self.buffer.get_int("max-buffer-len") * CTRL_SIZE
+        try:
+            fcntl.fcntl(self.fdc, F_SETPIPE_SZ, max(size, 1))
+        except (IOError, OSError):
+            pass  # More blocks than the new size, keep the current one
+
+
+    def store(self, name, value):
+        if name == "enable":
+            self.cset.enable_channel(self, _to_int(value) != 0)
+        elif name == "alarms":  # Writing bits clears the alarms
+            self.alarms &= ~_to_int(value)
+            self.set("alarms", "{0} 0".format(self.alarms))
+        else:
+            self.set(name, value)
+
+
+    def update_enable(self):
+        self.set("enable", 1 if self.enabled else 0)
+
+
+    def stored_bytes(self):
+        return _pending(self.fdd)
+
+
+    def stored_blocks(self):
+        return _pending(self.fdc) // CTRL_SIZE
+
+
+    def pending(self, index):
+        """
+        It returns the bytes waiting on the control (index 0) or on the data
+        (index 1) char device
+        """
+        return _pending((self.fdc, self.fdd)[index])
+
+
+    def flush(self):
+        self.out_ctrl = None
+        for fd in (self.fdc, self.fdd):
+            while True:
+                try:
+                    if not os.read(fd, PIPE_SIZE):
+                        break
+                except OSError as e:
+                    if e.errno != errno.EAGAIN:
+                        raise
+                    break
+
+
+    def samples(self, nsamples, ssize):
+        """
+        It returns the samples of the next block according to the channel
+        kind: zeros, random values or a sequence
+        """
+        if self.kind == "random":
+            return os.urandom(nsamples * ssize)
+        if self.kind == "sequence":
+            mask = (1 << (ssize * 8)) - 1
+            fmt = {1: "B", 2: "H", 4: "I"}[ssize]
+            data = array.array(fmt, [(self.counter + i) & mask
+                                     for i in range(nsamples)])
+            self.counter += nsamples
+            return data.tobytes()
+        return b"\0" * (nsamples * ssize)
+
+
+    def control(self, nsamples, tstamp):
+        return pack_ctrl(self.seq_num, nsamples, self.cset.ssize,
+                         self.cset.ssize * 8, self.cset.device.dev_id,
+                         self.cset.index,
+                         0xFFFF if self.is_interleaved() else self.index,
+                         self.cset.device.devname, tstamp,
+                         self.cset.trigger.trig_name,
+                         self.cset.std_values(),
+                         self.cset.trigger.std_values(), self.alarms)
+
+
+    def store_block(self, nsamples, tstamp, data):
+        """
+        It stores a new block in the buffer. When the buffer is full the
+        block is lost and the lost block alarm is raised
+        """
+        self.seq_num += 1
+        stored = False
+        if not self.buffer.is_full(len(data)) and \
+                _free(self.fdc) >= CTRL_SIZE and _free(self.fdd) >= len(data):
+            os.write(self.fdc, self.control(nsamples, tstamp))
+            _write_all(self.fdd, data)
+            stored = True
+        if not stored:
+            self.raise_alarm(ZIO_ALARM_LOST_BLOCK)
+        self.set("current-control", self.control(nsamples, tstamp))
+        return stored
+
+
+    def output_block(self, tstamp):
+        """
+        It takes the oldest complete block written by the user. It returns
+        False when there is none.
+        """
+        if self.out_ctrl is None and _pending(self.fdc) >= CTRL_SIZE:
+            self.out_ctrl = os.read(self.fdc, CTRL_SIZE)
+            self.last_out_ctrl = self.out_ctrl
+        ctrl = self.out_ctrl or self.last_out_ctrl
+        nsamples = ctrl_nsamples(ctrl) if ctrl else 0
+        if not nsamples:
+            nsamples = sum(self.cset.trigger.std_values()[1:3])
+        size = nsamples * self.cset.ssize
+        if not size or _pending(self.fdd) < size:
+            return False
+        while size:
+            size -= len(os.read(self.fdd, size))
+        self.out_ctrl = None
+        self.seq_num += 1
+        self.set("current-control", self.control(nsamples, tstamp))
+        return True
+
+
+    def raise_alarm(self, alarm):
+        self.alarms |= alarm
+        self.set("alarms", "{0} 0".format(self.alarms))
+
+
+    def update_current_control(self):
+        nsamples = sum(self.cset.trigger.std_values()[1:3])
+        self.set("current-control", self.control(nsamples, 0))
+
+
+    def destroy(self):
+        for fd in (self.fdc, self.fdd):
+            os.close(fd)
+
+
+class SimCset(SimObject):
+    """
+    A channel set. It owns the current trigger and it produces the blocks
+    for all its enabled channels when the trigger fires.
+    """
+
+    def __init__(self, device, index, name, ssize, kinds, direction,
+                 interleave):
+        SimObject.__init__(self, device.fullpath, "cset{0}".format(index))
+        self.device = device
+        self.backend = device.backend
+        self.index = index
+        self.ssize = ssize
+        self.direction = direction
+        self.enabled = True
+        self.buf_name = "kmalloc"
+        self.add_attr("name", name, False)
+        self.add_attr("enable", 1)
+        self.add_attr("direction", direction, False)
+        self.add_attr("current_trigger", "user")
+        self.add_attr("current_buffer", self.buf_name)
+        for i, attr_name in enumerate(CHAN_STD_ATTR):
+            self.add_attr(attr_name, ssize * 8 if i == 0 else 0)
+
+        self.trigger = SimTriggerUser(self, "user")
+        self.chan = [SimChannel(self, i, kind) for i, kind in enumerate(kinds)]
+        self.interleave = SimChannel(self, "i", "interleave") \
+                          if interleave else None
+        self.update_current_control()
+
+
+    def all_channels(self):
+        return self.chan + ([self.interleave] if self.interleave else [])
+
+
+    def std_values(self):
+        return [self.get_int(n) for n in CHAN_STD_ATTR]
+
+
+    def store(self, name, value):
+        value = str(value).strip()
+        if name == "enable":
+            self.set_enable(_to_int(value) != 0)
+        elif name == "current_trigger":
+            if value not in TRIGGER_CLASS:
+                return
+            self.trigger.destroy()
+            self.trigger = TRIGGER_CLASS[value](self, value)
+            self.set(name, value)
+            self.update_current_control()
+        elif name == "current_buffer":
+            if value not in BUFFERS:
+                return
+            self.buf_name = value
+            for chan in self.all_channels():
+                chan.set_buffer(value)
+            self.set(name, value)
+        else:
+            self.set(name, value)
+            if name in CHAN_STD_ATTR:
+                self.update_current_control()
+
+
+    def set_enable(self, enable):
+        if enable and not self.device.enabled:
+            self.update_enable()
+            return
+        self.enabled = enable
+        if not enable:
+            for chan in self.all_channels():
+                chan.enabled = False
+        self.update_enable()
+
+
+    def enable_channel(self, chan, enable):
+        """
+        The normal channels cannot be enabled while the cset is disabled or
+        the interleaved channel is enabled. Enabling the interleaved channel
+        disables the normal ones.
+        """
+        if enable and not self.enabled:
+            pass
+        elif chan.is_interleaved():
+            chan.enabled = enable
+            if enable:
+                for c in self.chan:
+                    c.enabled = False
+        elif not (enable and self.interleave and self.interleave.enabled):
+            chan.enabled = enable
+        self.update_enable()
+
+
+    def update_enable(self):
+        self.set("enable", 1 if self.enabled else 0)
+        for chan in self.all_channels():
+            chan.update_enable()
+
+
+    def update_current_control(self):
+        for chan in self.all_channels():
+            chan.update_current_control()
+
+
+    def is_idle(self, waited):
+        """
+        It returns True when the cset can acquire and the char devices that
+        the readers wait for are empty. 'waited' is the list of these char
+        devices as (channel, 0 for control or 1 for data).
+        """
+        if not self.enabled or self.direction != "input":
+            return False
+        return not any(chan.pending(index) for chan, index in waited)
+
+
+    def fire(self, tstamp):
+        """
+        It acquires one block on each enabled channel, or it outputs one
+        """
+        if self.enabled and self.direction == "output":
+            for chan in self.chan:
+                if chan.enabled and not chan.output_block(tstamp):
+                    chan.raise_alarm(ZIO_ALARM_LOST_TRIGGER)
+            return
+        if not self.enabled or self.direction != "input":
+            return
+        trig = self.trigger.std_values()
+        nsamples = trig[1] + trig[2]
+        data = [chan.samples(nsamples, self.ssize) for chan in self.chan]
+        for chan, samples in zip(self.chan, data):
+            if chan.enabled:
+                chan.store_block(nsamples, tstamp, samples)
+        if self.interleave and self.interleave.enabled:
+            samples = _interleave(data, self.ssize)
+            self.interleave.store_block(nsamples * len(self.chan), tstamp,
+                                        samples)
+
+
+    def consume_output(self, tstamp):
+        """
+        With the 'user' trigger the output channels take the blocks as soon
+        as they are written
+        """
+        if self.direction != "output" or not self.enabled or \
+           self.trigger.trig_name != "user":
+            return
+        for chan in self.chan:
+            while chan.enabled and chan.output_block(tstamp):
+                pass
+
+
+    def destroy(self):
+        for chan in self.all_channels():
+            chan.destroy()
+
+
+class SimDevice(SimObject):
+    """
+    The zio-zero device
+    """
+
+    def __init__(self, backend, name):
+        SimObject.__init__(self, backend.devices_path, name)
+        self.backend = backend
+        self.devname = name.split("-")[0]
+        self.dev_id = int(name.split("-")[1], 16)
+        self.enabled = True
+        self.add_attr("name", name, False)
+        self.add_attr("devname", self.devname, False)
+        self.add_attr("enable", 1)
+        self.cset = [SimCset(self, i, *desc) for i, desc in enumerate(CSETS)]
+
+
+    def store(self, name, value):
+        if name != "enable":
+            self.set(name, value)
+            return
+        self.enabled = _to_int(value) != 0
+        self.set("enable", 1 if self.enabled else 0)
+        if not self.enabled:
+            for cset in self.cset:
+                cset.set_enable(False)
+
+
+    def objects(self):
+        """
+        It returns all the objects of the device hierarchy
+        """
+        objs = [self]
+        for cset in self.cset:
+            objs += [cset, cset.trigger]
+            for chan in cset.all_channels():
+                objs += [chan, chan.buffer]
+        return objs
+
+
+    def destroy(self):
+        for cset in self.cset:
+            cset.destroy()
+
+
+def _to_int(value):
+    try:
+        return int(str(value).strip(), 0)
+    except ValueError:
+        return 0
+
+
+def _interleave(data, ssize):
+    """
+    It merges the samples of all channels: sample 0 of all channels, then
+    sample 1 of all channels and so on
+    """
+    out = bytearray()
+    nsamples = len(data[0]) // ssize if data else 0
+    for i in range(nsamples):
+        for samples in data:
+            out += samples[i * ssize:(i + 1) * ssize]
+    return bytes(out)
+
+
+def _open_fifo(path):
+    os.mkfifo(path, 0o666)
+    fd = os.open(path, os.O_RDWR | os.O_NONBLOCK)
+    try:
+        fcntl.fcntl(fd, F_SETPIPE_SZ, PIPE_SIZE)
+    except (IOError, OSError):
+        pass  # Keep the default size
+    return fd
+
+
+def inode(fd):
+    """
+    It returns what identifies the file open on a descriptor: all the
+    descriptors of a char device have the same one
+    """
+    st = os.fstat(fd)
+    return (st.st_dev, st.st_ino)
+
+
+def _pending(fd):
+    buf = array.array("i", [0])
+    fcntl.ioctl(fd, termios.FIONREAD, buf, True)
+    return buf[0]
+
+
+def _free(fd):
+    return fcntl.fcntl(fd, F_GETPIPE_SZ) - _pending(fd)
+
+
+def _write_all(fd, data):
+    """
+    It writes the whole buffer in the FIFO; the caller verified that there
+    is enough space
+    """
+    view = memoryview(data)
+    while len(view):
+        view = view[os.write(fd, view):]
@@ -0,0 +1,163 @@
+"""
+@author: Federico Vaga <federico.vaga@gmail.com>
+@copyright: CERN 2014
+@license: GPLv2
+
+Snapshot and restore of the state of a device. Before a test the runner
+saves the value of all the writable sysfs attributes of the device; after
+the test it writes back only the attributes that changed, so the state left
+by a test does not leak into the following ones.
+
+The snapshot covers only the channel sets in the footprint of the test (see
+test.footprint): the tests running at the same time on the other channel
+sets are not disturbed.
+"""
+from PyZio.ZioAttribute import ZioAttribute
+from PyZio import ZioConfig
+from test import catalog, devcache
+import unittest
+import stat
+import os
+
+# Attributes that do something on write instead of holding a state
+ACTIONS = ("flush", "alarms", "uevent", "exp-scalar-l", "exp-scalar-h",
+           "exp-nsec", "exp-sec")
+
+# Attributes that replace the trigger or the buffers of a channel set
+SWAPS = ("current_trigger", "current_buffer")
+
+
+class Snapshot(object):
+    """
+    The writable attributes of a device (or of some of its channel sets)
+    """
+
+    def __init__(self, device, csets = None):
+        self.device = device
+        self.path = os.path.join(ZioConfig.devices_path, device)
+        self.csets = None if csets is None else \
+                     ["cset{0}".format(i) for i in csets]
+        self.values = {}  # path relative to the device -> value
+        self._walk("")
+
+
+    def _walk(self, rel):
+        full = os.path.join(self.path, rel)
+        for name in sorted(os.listdir(full)):
+            path = os.path.join(full, name)
+            if os.path.islink(path):
+                continue
+            if os.path.isdir(path):
+                if rel == "" and self.csets is not None and \
+                   name not in self.csets:
+                    continue
+                if name.startswith("cset") or name.startswith("chan") or \
+                   name in ("trigger", "buffer"):
+                    self._walk(os.path.join(rel, name))
+                continue
+            if rel == "" and self.csets is not None:
+                continue  # device attributes are shared with other tests
+            if name in ACTIONS or not os.stat(path).st_mode & stat.S_IWUSR:
+                continue
+            value = _read(path)
+            if value is not None:
+                self.values[os.path.join(rel, name)] = value
+
+
+    def restore(self):
+        """
+        It writes back the attributes that changed since the snapshot and it
+        returns their number. The trigger and buffer types go first, because
+        they reset the attributes of the trigger and of the buffers; the
+        enables go last (the disables first) and the trigger enables after
+        everything, so the triggers do not fire while the device is being
+        restored.
+        """
+        writes = 0
+        for rel in self._order():
+            path = os.path.join(self.path, rel)
+            current = _read(path)
+            if current is None or current == self.values[rel]:
+                continue  # i.e. attribute of another trigger type
+            if os.path.basename(rel) in SWAPS:
+                self._swap(rel)
+            else:
+                ZioAttribute(os.path.dirname(path),
+                             os.path.basename(path)).set_value(self.values[rel])
+            writes += 1
+        return writes
+
+
+    def _swap(self, rel):
+        """
+        It restores the trigger or the buffer type of a channel set through
+        its cached model (see test.devcache), so the model follows the swap
+        """
+        path = os.path.normpath(os.path.join(self.path, os.path.dirname(rel)))
+        device = devcache.get_device(self.device)
+        for cset in device.cset if device is not None else []:
+            if os.path.normpath(cset.fullpath) == path:
+                name = os.path.basename(rel)
+                getattr(cset, "set_" + name)(self.values[rel])
+                return
+        ZioAttribute(os.path.dirname(os.path.join(self.path, rel)),
+                     os.path.basename(rel)).set_value(self.values[rel])
+
+
+    def _order(self):
+        def rank(rel):
+            parts = rel.split(os.sep)
+            name = parts[-1]
+            if name in SWAPS:
+                return (0, 0, len(parts), rel)
+            if name != "enable":
+                return (1, 0, len(parts), rel)
+            # Disable before enable: an interleaved channel and the normal
+            # ones cannot be enabled at the same time
+            enable = 0 if self.values[rel] == "0" else 1
+            if "trigger" in parts:
+                return (3, enable, len(parts), rel)
+            return (2, enable, len(parts), rel)
+        return sorted(self.values, key = rank)
+
+
+def isolate(suite, device):
+    """
+    It makes each test of the suite restore the state of the device at its
+    end
+    """
+    for test in tests(suite):
+        _isolate(test, device)
+    return suite
+
+
+def tests(suite):
+    """
+    It yields the test cases of a suite
+    """
+    if isinstance(suite, unittest.TestSuite):
+        for test in suite:
+            for t in tests(test):
+                yield t
+    else:
+        yield suite
+
+
+def _isolate(test, device):
+    setup = getattr(test, "setUp", None)
+    if setup is None:
+        return
+    def isolated_setup():
+        if os.path.isdir(os.path.join(ZioConfig.devices_path, device)):
+            snap = Snapshot(device, catalog.footprint(test.id()).csets)
+            test.addCleanup(snap.restore)
+        setup()
+    test.setUp = isolated_setup
+
+
+def _read(path):
+    try:
+        with open(path, "r") as f:
+            return f.read().strip()
+    except (IOError, OSError):
+        return None
@@ -4,16 +4,12 @@
 @license: GPLv2
 """
 
-from PyZio.ZioConfig import devices_path
-from PyZio.ZioDev import ZioDev
-from test import config
+from test import config, manifest, devcache
 import unittest
 import sys
 import os
 
-path = os.path.join(devices_path, "zzero-0000")
-
-@unittest.skipIf(not (os.path.exists(path) and os.path.isdir(path)),
+@unittest.skipIf(not manifest.has_device(config.device),
                  "zio zero is not loaded")
 class CurrentControl(unittest.TestCase):
     """
@@ -21,7 +17,7 @@ class CurrentControl(unittest.TestCase):
     """
 
     def setUp(self):
-        self.device = ZioDev(devices_path, "zzero-0000")
+        self.device = devcache.get_device(config.device)
         if self.device == None:
             self.skipTest("Missing device, cannot run tests")
 
@@ -4,18 +4,14 @@
 @license: GPLv2
 """
 
-from PyZio.ZioConfig import devices_path, triggers
-from PyZio.ZioDev import ZioDev
-from test import utils, config
+from test import utils, config, manifest, devcache
 import unittest
 import sys
 import os
 
-path = os.path.join(devices_path, "zzero-0000")
-
-@unittest.skipIf(not (os.path.exists(path) and os.path.isdir(path)),
+@unittest.skipIf(not manifest.has_device(config.device),
                  "zio zero is not loaded")
-@unittest.skipIf(not ("hrt" in triggers),
+@unittest.skipIf(not manifest.has_trigger("hrt"),
                  "Trigger 'hrt' is required for this test")
 class CurrentControl(unittest.TestCase):
     """
@@ -23,7 +19,7 @@ class CurrentControl(unittest.TestCase):
     """
 
     def setUp(self):
-        self.device = ZioDev(devices_path, "zzero-0000")
+        self.device = devcache.get_device(config.device)
         if self.device == None:
             self.skipTest("Missing device, cannot run tests")
 
@@ -65,7 +61,7 @@ class CurrentControl(unittest.TestCase):
             sys.stdout.write(".")
             sys.stdout.flush()
 
-            utils.trigger_hrt_fill_buffer(self.trigger, 1)
+            utils.trigger_hrt_fill_buffer(self.trigger, 1, chan = self.chan)
 
             ready = self.interface.is_device_ready(config.select_wait)
             self.assertTrue(ready, "Trigger {0} does not fire, or black was lost".format(i))
@@ -4,14 +4,10 @@
 @license: GPLv2
 """
 
-from PyZio.ZioConfig import devices_path
-from PyZio.ZioDev import ZioDev
+from test import config, manifest, devcache
 import unittest
-import os
 
-path = os.path.join(devices_path, "zzero-0000")
-
-@unittest.skipIf(not (os.path.exists(path) and os.path.isdir(path)), "zio zero is not loaded")
+@unittest.skipIf(not manifest.has_device(config.device), "zio zero is not loaded")
 class Enable(unittest.TestCase):
     """
     The test is performed on the zio-zero device to test that the core is
@@ -21,7 +17,7 @@ class Enable(unittest.TestCase):
         """
         All channels must be enabled before start any test
         """
-        self.device = ZioDev(devices_path, "zzero-0000")
+        self.device = devcache.get_device(config.device)
         if self.device == None:
             self.skipTest( "Missing device, cannot run tests")
         for cset in self.device.cset:
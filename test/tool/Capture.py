@@ -0,0 +1,148 @@
+"""
+@author: Federico Vaga <federico.vaga@gmail.com>
+@copyright: CERN 2014
+@license: GPLv2
+"""
+
+from test.sim.zzero import pack_ctrl
+import subprocess
+import unittest
+import tempfile
+import shutil
+import sys
+import os
+
+try:
+    from test import capture
+except ImportError:
+    capture = None
+
+ZIO_UT = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(
+                      os.path.abspath(__file__)))), "zio-ut.py")
+
+
+@unittest.skipIf(capture is None, "PyZio is required for this test")
+class Capture(unittest.TestCase):
+    """
+    It writes capture files with each compression and it reads them back,
+    directly and through a ReplayInterface (see test.capture)
+    """
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp(prefix = "zio-ut-capture-")
+        # Blocks of two channels of the cset 0, as (cset, chan, control, data)
+        self.blocks = []
+        for seq in range(1, 4):
+            for chan in (0, 2):
+                data = bytes([(seq * 16 + chan + i) & 0xFF
+                              for i in range(16 * seq)])
+                ctrl = pack_ctrl(seq, len(data), 1, 8, 0, 0, chan,
+                                 "zzero", seq * 1000000, "hrt", [], [])
+                self.blocks.append((0, chan, ctrl, data))
+
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+
+    def _write(self, compression):
+        path = os.path.join(self.dir, "test{0}.zcap".format(compression))
+        writer = capture.CaptureWriter(path, {"test": "round-trip"},
+                                       compression)
+        for cset, chan, ctrl, data in self.blocks:
+            writer.add(ctrl, data)
+        writer.close()
+        return path
+
+
+    def _round_trip(self, compression):
+        if compression == "lzma" and capture.lzma is None:
+            self.skipTest("Compression 'lzma' is not available")
+        cap = capture.Capture(self._write(compression))
+        try:
+            self.assertEqual("round-trip", cap.header["test"])
+            self.assertEqual(compression, cap.compression)
+            self.assertEqual(len(self.blocks), len(cap))
+            for i, (cset, chan, ctrl, data) in enumerate(self.blocks):
+                self.assertEqual(ctrl, cap.ctrl(i),
+                                 "{0}: control {1} changed".format(compression, i))
+                self.assertEqual(data, cap.data(i),
+                                 "{0}: data {1} changed".format(compression, i))
+            self.assertEqual([1, 3, 5], cap.blocks(0, 2))
+            self.assertEqual([1, 2, 3],
+                             [int(seq) for seq in cap.columns(0, 2).seq_num])
+
+            replay = capture.ReplayInterface(cap, 0, 2)
+            for seq in range(1, 4):
+                self.assertTrue(replay.is_device_ready(0)[0],
+                                "{0}: block {1} must be ready".format(compression, seq))
+                ctrl, data = replay.read_block()
+                self.assertEqual(seq, ctrl.seq_num)
+                self.assertEqual(self.blocks[seq * 2 - 1][3], data)
+            self.assertFalse(replay.is_device_ready(0)[0],
+                             "{0}: the capture is over".format(compression))
+            self.assertRaises(EOFError, replay.read_ctrl)
+        finally:
+            cap.close()
+
+
+    def test_round_trip(self):
+        """
+        It reads back the blocks written without compression
+        """
+        self._round_trip("")
+
+
+    def test_round_trip_zlib(self):
+        """
+        It reads back the blocks written with zlib
+        """
+        self._round_trip("zlib")
+
+
+    def test_round_trip_lzma(self):
+        """
+        It reads back the blocks written with lzma
+        """
+        self._round_trip("lzma")
+
+
+    def test_not_closed(self):
+        """
+        A capture file without the index, i.e. not closed, is refused
+        """
+        path = os.path.join(self.dir, "open.zcap")
+        writer = capture.CaptureWriter(path, {})
+        writer.add(self.blocks[0][2], self.blocks[0][3])
+        writer.f.flush()
+        self.assertRaises(ValueError, capture.Capture, path)
+        writer.close()
+
+
+    def _zio_ut(self, test, **options):
+        env = dict(os.environ, backend = "sim", jobs = "1", durations_db = "",
+                   results_json = "", results_junit = "", record_dir = "",
+                   replay_dir = "")
+        env.update(options)
+        proc = subprocess.Popen([sys.executable, ZIO_UT, test],
+                                stdout = subprocess.PIPE,
+                                stderr = subprocess.STDOUT,
+                                cwd = os.path.dirname(ZIO_UT), env = env)
+        output = proc.communicate()[0].decode()
+        return proc.returncode, output
+
+
+    def test_replay(self):
+        """
+        It records a test on the simulated device, then it runs it again on
+        its capture with 'replay_dir'
+        """
+        test = "test.interface.ReadPolicy.ReadPolicy.test_double_read_control"
+        code, output = self._zio_ut(test, record_dir = self.dir)
+        self.assertEqual(0, code, "The record failed:\n" + output)
+        path = os.path.join(self.dir, test + ".zcap")
+        self.assertTrue(os.path.exists(path), "No capture:\n" + output)
+
+        code, output = self._zio_ut(test, replay_dir = self.dir)
+        self.assertEqual(0, code, "The replay failed:\n" + output)
+        self.assertNotIn("skipped", output, "The test must replay:\n" + output)
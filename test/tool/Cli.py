@@ -0,0 +1,78 @@
+"""
+@author: Federico Vaga <federico.vaga@gmail.com>
+@copyright: CERN 2014
+@license: GPLv2
+"""
+
+import subprocess
+import unittest
+import sys
+import os
+
+ZIO_UT = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(
+                      os.path.abspath(__file__)))), "zio-ut.py")
+
+# It runs zio-ut.py in a Python where PyZio cannot be imported
+WITHOUT_PYZIO = """
+import runpy, sys
+
+class Blocker(object):
+    def find_spec(self, name, path, target = None):
+        if name == "PyZio" or name.startswith("PyZio."):
+            raise ImportError("No module named '{0}'".format(name))
+        return None
+
+sys.meta_path.insert(0, Blocker())
+sys.argv = sys.argv[1:]
+runpy.run_path(sys.argv[0], run_name = "__main__")
+"""
+
+
+class Cli(unittest.TestCase):
+    """
+    It tests the command line of zio-ut.py on a host without PyZio: the
+    help and the list of the tests do not need ZIO.
+    """
+
+    def _run(self, *args):
+        proc = subprocess.Popen([sys.executable, "-c", WITHOUT_PYZIO,
+                                 ZIO_UT] + list(args),
+                                stdout = subprocess.PIPE,
+                                stderr = subprocess.STDOUT,
+                                cwd = os.path.dirname(ZIO_UT))
+        output = proc.communicate()[0].decode()
+        return proc.returncode, output
+
+
+    def test_list(self):
+        """
+        It lists the tests without PyZio
+        """
+        code, output = self._run("--list")
+        self.assertEqual(0, code, "--list failed:\n" + output)
+        self.assertIn("test.interface.ReadPolicy", output,
+                      "--list must print the tests:\n" + output)
+
+
+    def test_help(self):
+        """
+        It prints the help without PyZio
+        """
+        code, output = self._run()
+        self.assertEqual(0, code, "The help failed:\n" + output)
+        self.assertIn("--list", output, "The help must describe --list")
+
+
+    def test_codes(self):
+        """
+        The test codes keep their meaning: the new tests come after the
+        first ones
+        """
+        code, output = self._run("--list")
+        self.assertEqual(0, code, "--list failed:\n" + output)
+        codes = dict([line.split()[:2] for line in output.splitlines()
+                      if line.split() and line.split()[0].isdigit()])
+        self.assertEqual("test.module.CoreModule.ZioModule", codes.get("0"),
+                         "Code 0 must be the core module test:\n" + output)
+        self.assertEqual("test.interface.ConcurrentRead", codes.get("21"),
+                         "Code 21 must be the concurrent read test:\n" + output)
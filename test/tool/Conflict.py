@@ -0,0 +1,46 @@
+"""
+@author: Federico Vaga <federico.vaga@gmail.com>
+@copyright: CERN 2014
+@license: GPLv2
+"""
+
+from test.footprint import Footprint, EXCLUSIVE, DEVICE
+import unittest
+
+
+class Conflict(unittest.TestCase):
+    """
+    It tests which footprints can run together on a device (see
+    test.footprint)
+    """
+
+    def _check(self, expected, a, b):
+        self.assertEqual(expected, a.conflicts(b),
+                         "{0} against {1}".format(a, b))
+        self.assertEqual(expected, b.conflicts(a),
+                         "{0} against {1}".format(b, a))
+
+
+    def test_csets(self):
+        """
+        The tests on the same channel sets, or on all of them, conflict
+        """
+        self._check(True, Footprint(csets = [0, 1]), Footprint(csets = [1]))
+        self._check(False, Footprint(csets = [0]), Footprint(csets = [1]))
+        self._check(True, DEVICE, Footprint(csets = [2]))
+        self._check(True, EXCLUSIVE, Footprint(csets = []))
+
+
+    def test_types(self):
+        """
+        The tests that need different triggers or buffers conflict, also on
+        different channel sets
+        """
+        self._check(True, Footprint(csets = [0], trigger = "hrt"),
+                    Footprint(csets = [3], trigger = "timer"))
+        self._check(True, Footprint(csets = [0], buffer = "vmalloc"),
+                    Footprint(csets = [1], buffer = "kmalloc"))
+        self._check(False, Footprint(csets = [0], trigger = "hrt"),
+                    Footprint(csets = [3], trigger = "hrt"))
+        self._check(False, Footprint(csets = [0], trigger = "hrt"),
+                    Footprint(csets = [1], buffer = "vmalloc"))
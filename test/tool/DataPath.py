@@ -0,0 +1,101 @@
+"""
+@author: Federico Vaga <federico.vaga@gmail.com>
+@copyright: CERN 2014
+@license: GPLv2
+"""
+
+from test.sim.zzero import pack_ctrl
+from test import ctrlblock
+import unittest
+import tempfile
+import struct
+import os
+
+try:
+    from PyZio.ZioCtrl import ZioCtrl
+    from test import blockio
+except ImportError:
+    ZioCtrl = None
+
+
+class _FileInterface(object):
+    """
+    A data char device made of a regular file, which can be mapped, and its
+    controls
+    """
+
+    def __init__(self, path, ctrls):
+        self.fd = os.open(path, os.O_RDONLY)
+        self.ctrls = list(ctrls)
+
+
+    def fileno_data(self):
+        return self.fd
+
+
+    def read_ctrl(self):
+        ctrl = ZioCtrl()
+        ctrl.unpack_to_ctrl(self.ctrls.pop(0))
+        return ctrl
+
+
+    def close(self):
+        os.close(self.fd)
+
+
+@unittest.skipIf(ZioCtrl is None, "PyZio is required for this test")
+class DataPath(unittest.TestCase):
+    """
+    It tests the data paths of test.blockio without a device: the map of a
+    vmalloc buffer is a regular file here
+    """
+
+    def setUp(self):
+        self.ssize = 2
+        self.size = 4096
+        # (offset, nsamples): out of order, as in a ring that wrapped around
+        self.layout = [(1024, 16), (2048, 100), (0, 7), (4096 - 64, 32)]
+        self.map = bytearray(os.urandom(self.size))
+        fd, self.path = tempfile.mkstemp(prefix = "zio-ut-map-")
+        os.write(fd, bytes(self.map))
+        os.close(fd)
+
+
+    def tearDown(self):
+        os.unlink(self.path)
+
+
+    def _ctrl(self, seq, offset, nsamples):
+        ctrl = bytearray(pack_ctrl(seq, nsamples, self.ssize, 16, 0, 0, 0,
+                                   "zzero", 0, "hrt", [], []))
+        struct.pack_into("<I", ctrl, ctrlblock.MEM_OFFSET_OFFSET, offset)
+        return bytes(ctrl)
+
+
+    def test_mmap_blocks(self):
+        """
+        Each block is the slice of the map at the offset of its control, as
+        long as its samples
+        """
+        ctrls = [self._ctrl(seq, offset, nsamples) for seq, (offset, nsamples)
+                 in enumerate(self.layout)]
+        interface = _FileInterface(self.path, ctrls)
+        path = blockio.MmapDataPath(interface, self.size)
+        try:
+            self.assertEqual("mmap", path.method)
+            for seq, (offset, nsamples) in enumerate(self.layout):
+                ctrl, view = path.read_block()
+                data = view.tobytes()
+                view.release()  # the map closes only without views on it
+                self.assertEqual(seq, ctrl.seq_num)
+                self.assertEqual(offset, ctrl.mem_offset)
+                self.assertEqual(nsamples * self.ssize, len(data),
+                    "Block {0}: {1} bytes instead of {2}".format(seq,
+                    len(data), nsamples * self.ssize))
+                end = offset + nsamples * self.ssize
+                self.assertEqual(bytes(self.map[offset:end]), data,
+                    "Block {0}: not the samples at offset {1}".format(seq,
+                    offset))
+        finally:
+            path.close()
+            interface.close()
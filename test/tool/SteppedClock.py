@@ -0,0 +1,65 @@
+"""
+@author: Federico Vaga <federico.vaga@gmail.com>
+@copyright: CERN 2014
+@license: GPLv2
+"""
+
+import subprocess
+import unittest
+import sys
+import os
+
+try:
+    import PyZio
+except ImportError:
+    PyZio = None
+
+ZIO_UT = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(
+                      os.path.abspath(__file__)))), "zio-ut.py")
+
+# Real seconds that the timing tests can take on the stepped clock
+TIMEOUT = 120
+
+
+@unittest.skipIf(PyZio is None, "PyZio is required for this test")
+class SteppedClock(unittest.TestCase):
+    """
+    It runs timing tests on the simulated backend with the stepped clock
+    (sim_clock_rate=0). They read only the first channel of a channel set
+    with three channels: the blocks nobody reads must not stop the clock.
+    """
+
+    def _run(self, *tests):
+        env = dict(os.environ, backend = "sim", sim_clock_rate = "0",
+                   jobs = "1", durations_db = "", results_json = "",
+                   results_junit = "", record_dir = "")
+        proc = subprocess.Popen([sys.executable, ZIO_UT] + list(tests),
+                                stdout = subprocess.PIPE,
+                                stderr = subprocess.STDOUT,
+                                cwd = os.path.dirname(ZIO_UT), env = env)
+        try:
+            output = proc.communicate(timeout = TIMEOUT)[0].decode()
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            output = proc.communicate()[0].decode()
+            self.fail("The clock stopped: {0} still running after {1}s\n{2}".format(
+                      " ".join(tests), TIMEOUT, output))
+        return proc.returncode, output
+
+
+    def test_period(self):
+        """
+        The 'timer' trigger fires at each period while the test reads chan0
+        """
+        code, output = self._run("test.trigger.timer.Period")
+        self.assertEqual(0, code, output)
+
+
+    def test_fire_second(self):
+        """
+        The 'hrt' trigger fires at the programmed second while the test
+        reads chan0
+        """
+        code, output = self._run(
+                "test.trigger.hrt.FireSecond.FireSecond.test_fire_absolute")
+        self.assertEqual(0, code, output)
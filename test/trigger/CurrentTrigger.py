@@ -4,24 +4,19 @@
 @license: GPLv2
 """
 
-from PyZio.ZioConfig import devices_path, triggers
-from PyZio.ZioDev import ZioDev
-from test import config
+from test import config, manifest, devcache
 import unittest
-import os
 
-path = os.path.join(devices_path, "zzero-0000")
-
-@unittest.skipIf(not (os.path.exists(path) and os.path.isdir(path)),
+@unittest.skipIf(not manifest.has_device(config.device),
                  "zio zero is not loaded")
-@unittest.skipIf(not ("timer" in triggers),
+@unittest.skipIf(not manifest.has_trigger("timer"),
                  "Trigger 'timer' is required for this test")
-@unittest.skipIf(not ("hrt" in triggers),
+@unittest.skipIf(not manifest.has_trigger("hrt"),
                  "Trigger 'hrt' is required for this test")
 class CurrentTrigger(unittest.TestCase):
 
     def setUp(self):
-        self.device = ZioDev(devices_path, "zzero-0000")
+        self.device = devcache.get_device(config.device)
         if self.device == None:
             self.skipTest("Missing device, cannot run tests")
 
@@ -3,19 +3,14 @@
 @copyright: CERN 2013
 @license: GPLv2
 """
-from PyZio.ZioConfig import devices_path, triggers
-from PyZio.ZioDev import ZioDev
-from test import config
-from test import utils
+from test import config, manifest, devcache
+from test import utils, ctrlblock
 import unittest
-import time
 import os, sys
 
-path = os.path.join(devices_path, "zzero-0000")
-
-@unittest.skipIf(not (os.path.exists(path) and os.path.isdir(path)),
+@unittest.skipIf(not manifest.has_device(config.device),
                  "zio zero is not loaded")
-@unittest.skipIf(not (config.trig in triggers),
+@unittest.skipIf(not manifest.has_trigger(config.trig),
                  "Trigger '" + config.trig + "'" + \
                  "is required for this test")
 class PrePostSample(unittest.TestCase):
@@ -23,13 +18,10 @@ class PrePostSample(unittest.TestCase):
     It performs tests on the trigger attributes 'post-samples' and 'pre-samples'
     """
     def setUp(self):
-        self.device = ZioDev(devices_path, "zzero-0000")
+        self.device = devcache.get_device(config.device)
         if self.device == None:
             self.skipTest("Missing device, cannot run tests")
 
-        for cset in self.device.cset:  # Disable all trigger
-            cset.trigger.disable()
-
         # Set channel set and channel to use
         self.cset = self.device.cset[0]  # Use cset input8
         self.chan = self.cset.chan[0]
@@ -120,9 +112,9 @@ class PrePostSample(unittest.TestCase):
 
     def program_fires(self):
         if config.trig == "hrt":
-            utils.trigger_hrt_fill_buffer(self.trigger, 1)
+            utils.trigger_hrt_fill_buffer(self.trigger, 1, chan = self.chan)
         elif config.trig == "timer":
-            time.sleep(config.timer_ms_period_fast / 500.0)
+            utils.sleep(config.timer_ms_period_fast / 500.0)
 
 
     def __test_n_samples(self, trigger, interface, pre, post):
@@ -134,21 +126,25 @@ class PrePostSample(unittest.TestCase):
         self.chan.buffer.flush()
         trigger.enable()
 
-        for _i in range(10):
+        # Collect the controls, then check them all at once
+        n_block = 10
+        buf = bytearray()
+        for _i in range(n_block):
             sys.stdout.write(".")
             sys.stdout.flush()
             self.program_fires()
             ready = interface.is_device_ready(1)
             self.assertTrue(ready[0], "Trigger '{0}' does not fire, or black was lost".format(config.trig))
-
-            ctrl = interface.read_ctrl()
-
-            # ZIO allow to change ctrl.nsamples to return less samples then required
-            expected_samples = pre + post
-            self.assertLessEqual(ctrl.nsamples, expected_samples, "The number of samples should less or equal to {0} but it is {1}".format(expected_samples, ctrl.nsamples))
-
-            # but attributes must be the same
-            if ctrl.attr_trigger.std_mask & (1 << 1):
-                self.assertEqual(post, ctrl.attr_trigger.std_val[1], "The number of expected post samples should be {0} but it is {1}".format(post, ctrl.attr_trigger.std_val[1]))
-            if ctrl.attr_trigger.std_mask & (1 << 2):
-                self.assertEqual(pre, ctrl.attr_trigger.std_val[2], "The number of expecte pre samples should be {0} but it is {1}".format(pre, ctrl.attr_trigger.std_val[2]))
+            buf += os.read(interface.fileno_ctrl(), ctrlblock.CTRL_SIZE)
+        cols = ctrlblock.decode(bytes(buf))
+
+        # ZIO allow to change ctrl.nsamples to return less samples then required
+        expected_samples = pre + post
+        nsamples = [int(n) for n in cols.nsamples]
+        self.assertLessEqual(max(nsamples), expected_samples, "The number of samples should less or equal to {0} but it is {1}".format(expected_samples, nsamples))
+
+        # but attributes must be the same
+        posts = [v for v in ctrlblock.std_attr(cols, "trigger", 1) if v is not None]
+        self.assertEqual([post] * len(posts), posts, "The number of expected post samples should be {0} but it is {1}".format(post, posts))
+        pres = [v for v in ctrlblock.std_attr(cols, "trigger", 2) if v is not None]
+        self.assertEqual([pre] * len(pres), pres, "The number of expecte pre samples should be {0} but it is {1}".format(pre, pres))
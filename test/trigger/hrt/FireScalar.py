@@ -4,25 +4,20 @@
 @license: GPLv2
 """
 
-from PyZio.ZioConfig import devices_path, triggers
-from PyZio.ZioDev import ZioDev
-from test import utils, config
+from test import utils, config, manifest, devcache
 import unittest
-import time
 import sys
 import os
 
-path = os.path.join(devices_path, "zzero-0000")
-
-@unittest.skipIf(not (os.path.exists(path) and os.path.isdir(path)), "this test require zio zero")
-@unittest.skipIf(not ("hrt" in triggers), "Trigger 'hrt' is required for this test")
+@unittest.skipIf(not manifest.has_device(config.device), "this test require zio zero")
+@unittest.skipIf(not manifest.has_trigger("hrt"), "Trigger 'hrt' is required for this test")
 class FireScalar(unittest.TestCase):
     """
     It tests 'hrt' programming with attributes 'exp-scalar-l' and 'exp-scalar-h'
     """
 
     def setUp(self):
-        self.device = ZioDev(devices_path, "zzero-0000")
+        self.device = devcache.get_device(config.device)
         if self.device == None:
             self.skipTest("Missing device, cannot run tests")
 
@@ -75,7 +70,7 @@ class FireScalar(unittest.TestCase):
     def _test_fire_absolute(self, ztstamp):
         # Program the trigger
         nsec = utils.convert_ZioTimeStamp_to_ns(ztstamp)
-        nsec += int((time.time() + 2) * 1000000000)
+        nsec += int((utils.now() + 2) * 1000000000)
         self.trigger.attribute["exp-scalar-l"].set_value(int(nsec) & 0xFFFFFFFF)
         hi = (int(nsec) & 0xFFFFFFFF00000000) >> 32
         self.trigger.attribute["exp-scalar-h"].set_value(hi)
@@ -115,7 +110,7 @@ class FireScalar(unittest.TestCase):
         self.trigger.attribute["exp-scalar-l"].set_value(int(nsec) & 0xFFFFFFFF)
         self.trigger.attribute["exp-scalar-h"].set_value(0)
 
-        nsec = int(time.time() * 1000000000)
+        nsec = int(utils.now() * 1000000000)
 
         # A new block must appear in the buffer
         ready = self.interface.is_device_ready(ztstamp.seconds * 1000 + 5)
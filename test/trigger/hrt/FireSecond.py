@@ -4,25 +4,20 @@
 @license: GPLv2
 """
 
-from PyZio.ZioConfig import devices_path, triggers
-from PyZio.ZioDev import ZioDev
-from test import utils, config
+from test import utils, config, manifest, devcache
 import unittest
-import time
 import sys
 import os
 
-path = os.path.join(devices_path, "zzero-0000")
-
-@unittest.skipIf(not (os.path.exists(path) and os.path.isdir(path)), "this test require zio zero")
-@unittest.skipIf(not ("hrt" in triggers), "Trigger 'hrt' is required for this test")
+@unittest.skipIf(not manifest.has_device(config.device), "this test require zio zero")
+@unittest.skipIf(not manifest.has_trigger("hrt"), "Trigger 'hrt' is required for this test")
 class FireSecond(unittest.TestCase):
     """
     It tests 'hrt' programming with attributes 'exp-nsec' and 'exp-sec'
     """
 
     def setUp(self):
-        self.device = ZioDev(devices_path, "zzero-0000")
+        self.device = devcache.get_device(config.device)
         if self.device == None:
             self.skipTest("Missing device, cannot run tests")
 
@@ -73,7 +68,7 @@ class FireSecond(unittest.TestCase):
 
 
     def _test_fire_absolute(self, ztstamp):
-        sec = int(time.time()) + ztstamp.seconds + 1
+        sec = int(utils.now()) + ztstamp.seconds + 1
         self.trigger.attribute["exp-nsec"].set_value(ztstamp.ticks)
         self.trigger.attribute["exp-sec"].set_value(sec)
 
@@ -107,7 +102,7 @@ class FireSecond(unittest.TestCase):
 
 
     def _test_fire_relative(self, ztstamp):
-        sec = int(time.time()) + ztstamp.seconds
+        sec = int(utils.now()) + ztstamp.seconds
         self.trigger.attribute["exp-nsec"].set_value(ztstamp.ticks)
         self.trigger.attribute["exp-sec"].set_value(ztstamp.seconds)
         nsec = utils.convert_ZioTimeStamp_to_ns(ztstamp)
@@ -4,20 +4,14 @@
 @license: GPLv2
 """
 
-from PyZio.ZioConfig import devices_path, triggers
-from PyZio.ZioDev import ZioDev
-from test import config
+from test import config, utils, manifest, devcache
 import unittest
-import time
 import sys
 import os
-from os.path import join, isdir, exists
 
-path = join(devices_path, "zzero-0000")
-
-@unittest.skipIf(not (exists(path) and isdir(path)), \
+@unittest.skipIf(not manifest.has_device(config.device), \
                  "this test require zio zero")
-@unittest.skipIf(not ("hrt" in triggers), \
+@unittest.skipIf(not manifest.has_trigger("hrt"), \
                  "Trigger 'hrt' is required for this test")
 class FireScalar(unittest.TestCase):
     """
@@ -25,7 +19,7 @@ class FireScalar(unittest.TestCase):
     """
 
     def setUp(self):
-        self.device = ZioDev(devices_path, "zzero-0000")
+        self.device = devcache.get_device(config.device)
         if self.device == None:
             self.skipTest("Missing device, cannot run tests")
 
@@ -150,7 +144,7 @@ class FireScalar(unittest.TestCase):
         self.trigger.disable()
         ready = self.interface.is_device_ready(time_to_wait * 1000 * 2)
         self.assertFalse(ready[0], "Trigger fired but trigger is disable")
-        time.sleep(time_to_wait)
+        utils.sleep(time_to_wait)
 
         self.trigger.enable()
         ready = self.interface.is_device_ready(1)  # wait only 1ms
@@ -4,20 +4,15 @@
 @license: GPLv2
 """
 
-from PyZio.ZioConfig import devices_path, triggers
 from PyZio.ZioCtrl import ZioTimeStamp
-from PyZio.ZioDev import ZioDev
-from test import utils, config
+from test import utils, config, manifest, devcache, analysis
 import unittest
-import time
 import sys
 import os
 
-path = os.path.join(devices_path, "zzero-0000")
-
-@unittest.skipIf(not (os.path.exists(path) and os.path.isdir(path)),
+@unittest.skipIf(not manifest.has_device(config.device),
                  "this test require zio zero")
-@unittest.skipIf(not ("hrt" in triggers),
+@unittest.skipIf(not manifest.has_trigger("hrt"),
                  "Trigger 'hrt' is required for this test")
 class PeriodAndSlack(unittest.TestCase):
     """
@@ -26,7 +21,7 @@ class PeriodAndSlack(unittest.TestCase):
     """
 
     def setUp(self):
-        self.device = ZioDev(devices_path, "zzero-0000")
+        self.device = devcache.get_device(config.device)
         if self.device == None:
             self.skipTest("Missing device, cannot run tests")
 
@@ -118,8 +113,8 @@ class PeriodAndSlack(unittest.TestCase):
         The test sets the period to verify, then it fires immediatly to start
         the periodical fire. The test sleep the necessary time to fill the
         buffer with 10 blocks. Then, it reads all blocks and verify that
-        the difference of the timestamp of two coperiod_nsutive blocks is almost
-        equal to the configured period
+        the periods between the timestamps of consecutive blocks are almost
+        equal to the configured period (see test.analysis)
         """
         # Buffer must be empty
         self.trigger.disable()
@@ -135,25 +130,21 @@ class PeriodAndSlack(unittest.TestCase):
         self.trigger.attribute["exp-scalar-h"].set_value(0)
 
         # wait some seconds to fill the buffer
-        time.sleep((period.seconds + 1) * 10)
+        utils.sleep((period.seconds + 1) * 10)
         self.trigger.attribute["period-ns"].set_value(0)
         self.trigger.disable()
 
         ready = self.interface.is_device_ready(0.01)
-        self.assertTrue(ready, "At least one block must be in the buffer")
-
-        tstamp = self.interface.read_ctrl().tstamp;
-        fire_old = utils.convert_ZioTimeStamp_to_ns(tstamp)
+        self.assertTrue(ready[0], "At least one block must be in the buffer")
 
         # Read all blocks from the buffer
-        i = 0
-        while self.interface.is_device_ready(0.01):
-            i += 1
+        tstamps = []
+        while self.interface.is_device_ready(0.01)[0]:
             tstamp = self.interface.read_ctrl().tstamp;
-            fire_new = utils.convert_ZioTimeStamp_to_ns(tstamp)
+            tstamps.append(analysis.tstamp_ns(tstamp))
 
-            measured_period = fire_new - fire_old;
-            delta = abs(measured_period - period_ns)
-            self.assertLess(delta, slack,
-                            "{4}) period {0}, measured period {1}, delta {2}, tollerance {3}".format(period_ns, measured_period, delta, slack, i))
-            fire_old = fire_new
+        self.assertGreaterEqual(len(tstamps), 2,
+            "At least two blocks are needed to measure the period, got {0}".format(
+            len(tstamps)))
+        analysis.check_period(self, tstamps, period_ns, slack,
+                              config.timing_max_outliers)
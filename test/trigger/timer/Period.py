@@ -4,17 +4,13 @@
 @license: GPLv2
 """
 
-from PyZio.ZioConfig import devices_path, triggers
-from PyZio.ZioDev import ZioDev
-from test import config
+from test import config, manifest, devcache, analysis
 import unittest
 import random
 import os, sys
 
-path = os.path.join(devices_path, "zzero-0000")
-
-@unittest.skipIf(not (os.path.exists(path) and os.path.isdir(path)), "this test require zio zero")
-@unittest.skipIf(not ("timer" in triggers), "Trigger 'timer' is required for this test")
+@unittest.skipIf(not manifest.has_device(config.device), "this test require zio zero")
+@unittest.skipIf(not manifest.has_trigger("timer"), "Trigger 'timer' is required for this test")
 class Period(unittest.TestCase):
     """
     This TestCase tests the 'ms-period' attribute of the trigger 'timer'. The
@@ -22,15 +18,16 @@ class Period(unittest.TestCase):
     each period it:
     - set 'ms-period'
     - read the timestamp from the control
-    - calculate the timestamp difference from the previous block
-    if the difference (t2 - t1) > 15ms then the test fails
+    - analyse the periods between the timestamps (see test.analysis)
+    if the mean error or too many periods are off by more than 15ms then the
+    test fails
     """
 
     def setUp(self):
         self.n_block_test = 6
         self.period_tollerance = 15
 
-        self.device = ZioDev(devices_path, "zzero-0000")
+        self.device = devcache.get_device(config.device)
         if self.device == None:
             self.skipTest("Missing device, cannot run tests")
 
@@ -73,8 +70,7 @@ class Period(unittest.TestCase):
         """
         Test that trigger fires with a given period
         """
-        time_old = None
-        time_new = None
+        tstamps = []
 
         self.trigger.disable()  # Disable the trigger
         self.trigger.attribute["ms-period"].set_value(period)
@@ -91,21 +87,9 @@ class Period(unittest.TestCase):
             ctrl = self.interface.read_ctrl()  # Read Control
             if ctrl == None:
                 self.skipTest("Invalid Control")
-
-            time_old = time_new
-            time_new = (ctrl.tstamp.seconds, ctrl.tstamp.ticks)
-            if time_old == None or time_new == None:
-                continue  # First time
-
-            t1 = self._convert_ns_to_ms(time_old)
-            t2 = self._convert_ns_to_ms(time_new)
-            ms = t2 - t1  # t2 - t1 = period
-            self.assertAlmostEqual(period, ms, delta = self.period_tollerance)
+            tstamps.append(analysis.tstamp_ns(ctrl.tstamp))
         self.trigger.disable()
 
-    def _convert_ns_to_ms(self, time):
-        """
-        Convert time to ms
-        """
-
-        return time[0] * 1000 + time[1] / 1000000
+        analysis.check_period(self, tstamps, period * 1000000,
+                              self.period_tollerance * 1000000,
+                              config.timing_max_outliers)
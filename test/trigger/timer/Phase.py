@@ -4,25 +4,21 @@
 @license: GPLv2
 """
 
-from PyZio.ZioConfig import devices_path, triggers
-from PyZio.ZioDev import ZioDev
-from test import config
+from test import config, manifest, devcache
 
 import unittest
 import sys
 import os
 
-path = os.path.join(devices_path, "zzero-0000")
-
-@unittest.skipIf(not (os.path.exists(path) and os.path.isdir(path)), "this test require zio zero")
-@unittest.skipIf(not ("timer" in triggers), "Trigger 'timer' is required for this test")
+@unittest.skipIf(not manifest.has_device(config.device), "this test require zio zero")
+@unittest.skipIf(not manifest.has_trigger("timer"), "Trigger 'timer' is required for this test")
 class Phase(unittest.TestCase):
     """
     This TestCase tests the 'ms-phase' attribute of the trigger 'timer'
     """
 
     def setUp(self):
-        self.device = ZioDev(devices_path, "zzero-0000")
+        self.device = devcache.get_device(config.device)
         if self.device == None:
             self.skipTest("Missing device, cannot run tests")
 
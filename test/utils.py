@@ -4,8 +4,15 @@
 @license: GPLv2
 """
 from PyZio.ZioCtrl import ZioTimeStamp
+from test import clock, config
 import random
-import time
+import select
+import math
+
+# ZIO alarm bits: a block lost on input, a fire of the trigger without a
+# block to output (underrun)
+ZIO_ALARM_LOST_BLOCK = 0x1
+ZIO_ALARM_LOST_TRIGGER = 0x2
 
 def random_list(minValue, maxValue, n):
     """
@@ -18,14 +25,97 @@ def random_list(minValue, maxValue, n):
 
     return lst
 
-def trigger_hrt_fill_buffer(trigger, n_block = 1, wait = 0.01, disable = False):
+def trigger_hrt_fill_buffer(trigger, n_block = 1, wait = 0.01, disable = False,
+                            chan = None):
+    """
+    It fires the 'hrt' trigger 'n_block' times. If the channel is given, after
+    each fire it waits until the block lands (see wait_block()), otherwise it
+    sleeps 'wait' seconds. It returns the fire to ready latency (seconds) of
+    each block, None when the block did not land in time.
+    """
+    latency = []
     trigger.enable()
     for _i in range(n_block):
+        seq_num = chan.get_current_ctrl().seq_num if chan else None
         trigger.attribute["exp-scalar-l"].set_value(0)
+        t_fire = now()
         trigger.attribute["exp-scalar-h"].set_value(1)
-        time.sleep(wait)
+        if chan is None:
+            sleep(wait)
+            continue
+        if wait_block(chan, seq_num, t_fire + config.select_wait):
+            latency.append(now() - t_fire)
+        else:
+            latency.append(None)
     if disable:
         trigger.disable()
+    return latency
+
+def wait_block(chan, seq_num, deadline):
+    """
+    It waits until the channel acquires, or outputs, a block after the one
+    with the given sequence number, or until the deadline (now() seconds)
+    expires. It sleeps in poll() on the control char device, when open: it
+    is readable when a block lands on input, writable when a block leaves
+    on output. The 'current-control' sequence number tells whether the
+    awaited block is there: it also counts the blocks lost on overflow.
+    When the char device is closed, or already ready because of an older
+    block, poll() cannot help and it sleeps on the test clock.
+    """
+    poller, fd = _ctrl_poller(chan.interface)
+    step = 0.0001
+    while chan.get_current_ctrl().seq_num == seq_num:
+        remaining = deadline - now()
+        if remaining <= 0:
+            return False
+        if poller is None or poller.poll(0):
+            sleep(min(step, remaining))
+            step = min(step * 2, 0.005)
+            continue
+        # A stepped clock moves only while the tests wait: the deadline
+        # may never come, the wait is as long as the remaining time
+        timeout = clock.get_clock().real_timeout(remaining)
+        if timeout is None:
+            timeout = remaining
+        with clock.get_clock().waiting([fd]):
+            ready = poller.poll(max(int(math.ceil(timeout * 1000)), 1))
+        if not ready:
+            return chan.get_current_ctrl().seq_num != seq_num
+    return True
+
+def zio_alarms(chan):
+    """
+    It returns the ZIO alarms of a channel
+    """
+    return int(chan.attribute["alarms"].get_value().split()[0])
+
+def _ctrl_poller(interface):
+    """
+    It returns a poller of the control char device of the interface and
+    its descriptor; (None, None) when the char device is closed
+    """
+    try:
+        fd = interface.fileno_ctrl()
+        writable = interface.is_ctrl_writable()
+    except (AttributeError, OSError):
+        return None, None
+    if fd is None:
+        return None, None
+    poller = select.poll()
+    poller.register(fd, select.POLLOUT if writable else select.POLLIN)
+    return poller, fd
+
+def sleep(seconds):
+    """
+    It sleeps on the test clock, which can be a virtual clock
+    """
+    clock.get_clock().sleep(seconds)
+
+def now():
+    """
+    It returns the current time (seconds) of the test clock
+    """
+    return clock.get_clock().time()
 
 def convert_ns_to_ms(time):
     """
@@ -0,0 +1,78 @@
+#!/usr/bin/python
+"""
+@author: Federico Vaga <federico.vaga@gmail.com>
+@copyright: CERN 2014
+@license: GPLv2
+"""
+from test import setup, config
+import importlib
+import sys
+
+# List of all benchmarks
+bench_list = [
+    ("throughput", "bench.throughput"),
+    ("latency", "bench.latency"),
+    ("maxrate", "bench.maxrate"),
+    ("mmap", "bench.datapath"),
+    ("multichannel", "bench.multichannel"),
+    ("interleave", "bench.interleave"),
+    ("write", "bench.output"),
+             ]
+
+def zio_bench_help():
+    """
+    Print usage information about the benchmarks
+    """
+    print("zio-bench [BENCHMARKS]")
+    print("")
+    print("[BENCHMARKS]: list of benchmarks to run, by name or by code:")
+    print("Code          benchmark")
+    print("- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - ")
+    i = 0
+    for name, module in bench_list:
+        print(str(i) + "  " + name)
+        i = i + 1
+    print("")
+    print("The benchmarks use the device 'devices' (the first one) and the")
+    print("environment variables of zio-ut, plus: bench_duration, bench_csets,")
+    print("bench_triggers, bench_buffers, bench_post_samples,")
+    print("bench_hrt_period_ns, bench_timer_ms_period, bench_fires,")
+    print("bench_hist_bin_us, bench_histogram, bench_readers,")
+    print("bench_maxrate_precision, bench_mmap_post_samples,")
+    print("bench_mmap_buffer_kb, bench_write_batch and bench_json (see")
+    print("test/config.py)")
+
+if __name__ == '__main__':
+    # The program accept at least one argument
+    if len(sys.argv[1:]) == 0:
+        zio_bench_help()
+        exit()
+
+    names = dict(bench_list)
+    module_list = []
+    for arg in sys.argv[1:]:
+        if arg.isdigit() and int(arg) < len(bench_list):
+            module_list.append(bench_list[int(arg)][1])
+        elif arg in names:
+            module_list.append(names[arg])
+        else:
+            print("Invalid benchmark: {0}".format(arg))
+            sys.exit(1)
+
+    setup.parse_environment()
+    sim = setup.start_backend()
+
+    from test import manifest
+    manifest.apply()
+    if not manifest.has_device(config.device):
+        print("Device '{0}' is not loaded".format(config.device))
+        sys.exit(1)
+
+    try:
+        for module in module_list:
+            print("")
+            print("= = = {0} = = =".format(module))
+            importlib.import_module(module).run()
+    finally:
+        if sim:
+            sim.stop()
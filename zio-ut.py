@@ -4,80 +4,147 @@
 @copyright: CERN 2013
 @license: GPLv2
 """
-from PyZio.ZioConfig import devices_path, triggers
-from test import setup
+from test import setup, config, results, durations
+from test import catalog
 import unittest
+import time
 import sys
-from PyZio import ZioUtil
-
-# List of all tests
-test_list = [
-    "test.module.CoreModule.ZioModule",
-    "test.module.BufferModule.BufVmallocModule",
-    "test.module.TriggerModule.TrigTimerModule",
-    "test.module.TriggerModule.TrigHrtModule",
-    "test.sysfs.Attribute",
-    "test.sysfs.Enable",
-    "test.sysfs.CurrentControl",
-    "test.buffer.CurrentBuffer",
-    "test.buffer.Flush",
-    "test.buffer.Size",
-    "test.buffer.Overflow",
-    "test.trigger.CurrentTrigger",
-    "test.trigger.PrePostSample",
-    "test.trigger.timer.Period",
-    "test.trigger.timer.Phase",
-    "test.trigger.hrt.FireScalar",
-    "test.trigger.hrt.FireSecond",
-    "test.trigger.hrt.PeriodAndSlack",
-    "test.trigger.hrt.FireTime",
-    "test.interface.ReadPolicy",
-    "test.interface.WritePolicy",
-    "test.interface.ConcurrentRead",
-             ]
 
 def zio_test_help():
     """
     Print usage information about this unit-test
     """
-    print("zio-ut [TESTS]")
+    print("zio-ut [--list] [TESTS]")
     print("")
-    print("[TESTS]: list of tests to perform. It can be the name of a specific test, or the name of a module of tests")
-    print("         In alternative, you che use the test code:")
+    print("[TESTS]: list of tests to perform. Each one can be:")
+    print("         - the name of a module of tests, of a package of modules or of")
+    print("           a specific test (e.g. test.sysfs, test.buffer.Size.Size.test_increase_buffer_empty)")
+    print("         - a glob on the module names (e.g. 'test.trigger.hrt.*')")
+    print("         - a tag, 'tag:NAME' (tags: " + ", ".join(catalog.all_tags()) + ")")
+    print("         - the test code:")
     print("Code          test case")
     print("- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - ")
     i = 0
-    for t in test_list:
+    for t in catalog.test_list:
         print(str(i) + "  " + t)
         i = i + 1
+    print("")
+    print("--list: print the selected tests (all of them without TESTS) and exit")
+    print("")
+    print("Set the environment variable 'backend=sim' to run the tests on a")
+    print("simulated zio-zero device instead of the loaded ZIO modules. On the")
+    print("simulated device 'sim_clock_rate=N' runs the time N times faster,")
+    print("'sim_clock_rate=0' advances the time only when needed")
+    print("")
+    print("Set 'jobs=N' to run up to N test modules at the same time, when")
+    print("they do not use the same channel sets. 'devices' is the list of")
+    print("zio-zero devices to use, e.g. devices=\"zzero-0000 zzero-0001\"")
+    print("A worker silent for 'worker_timeout' seconds more than the usual")
+    print("duration of its test fails the test; without a history the long")
+    print("tests (timing, stress, module-load) have no timeout")
+    print("")
+    print("'results_json=FILE' and 'results_junit=FILE' save the results of")
+    print("the run. 'durations_db=FILE' keeps the test durations in FILE to")
+    print("estimate the run time and to report the tests slower than usual")
+    print("")
+    print("'record_dir=DIR' saves the blocks read by each test in a capture")
+    print("file (see test/capture.py), 'record_compression' can be zlib or")
+    print("lzma. 'replay_dir=DIR' runs the tests on the blocks of the capture")
+    print("files in DIR instead of those of the device")
+    print("")
+    print("'handle_pool=1' keeps the char devices open across the tests instead")
+    print("of opening and closing them at each request (see test/handles.py)")
+
+def zio_test_list(module_list):
+    """
+    Print the tests with their tags and their footprint
+    """
+    for name in module_list:
+        print("{0:>3}  {1:45s} {2:20s} {3}".format(
+              catalog.test_list.index(name) if name in catalog.test_list else "-",
+              name, ",".join(catalog.tags(name)), catalog.footprint(name)))
+
+def finish(records, start, db):
+    """
+    It saves the results and the durations of the run, then it exits with
+    an error if any test failed
+    """
+    if db:
+        durations.report_regressions(db.update(records))
+        db.save()
+    results.save(records, time.time() - start)
+    sys.exit(0 if results.success(records) else 1)
 
 if __name__ == '__main__':
+    args = sys.argv[1:]
+    list_only = "--list" in args
+    if list_only:
+        args.remove("--list")
+
     # The program accept at least one argument
-    if len(sys.argv[1:]) == 0:
+    if len(args) == 0 and not list_only:
         zio_test_help()
         exit()
 
-    # Prepare the list of all tests to perform
-    module_list = []
-    for arg in sys.argv[1:]:
-        index = int(arg);
-        module_list.append(test_list[index])
-
-    # If the ZIO framework is loaded, then load device, trigger and buffer
-    # information
-    if ZioUtil.is_loaded():
-        ZioUtil.update_all_zio_objects()
-
-    # Load a set of tests by using the module name
+    # Prepare the list of all tests to perform, without importing them
     try:
-        suite = unittest.TestLoader().loadTestsFromNames(module_list)
-    except:
-        print("Invalid module name in: ")
-        print(module_list)
+        module_list = catalog.select(args) if args else catalog.test_list
+    except (ValueError, IndexError) as e:
+        print(e)
+        sys.exit(1)
+
+    if list_only:
+        zio_test_list(module_list)
         exit()
 
     setup.parse_environment()
 
-    # Perform tests of retrieved modules
-    for s in suite:
-        unittest.TextTestRunner(verbosity = 2).run(s)
+    db = durations.DurationDB() if config.durations_db else None
+
+    # Each worker of the parallel runner prepares its own backend
+    start = time.time()
+    if config.jobs > 1:
+        from test.runner import ParallelRunner
+        runner = ParallelRunner(config.jobs, config.devices, db = db)
+        finish(runner.run(module_list), start, db)
+
+    # The simulated backend must be ready before loading PyZio objects and
+    # test modules
+    sim = setup.start_backend()
+
+    # Whatever happens, do not leave the simulated tree behind
+    try:
+        # Load trigger and buffer information from the capability manifest
+        from test import manifest
+        manifest.apply()
+
+        # Load a set of tests by using the module name
+        try:
+            suite = unittest.TestLoader().loadTestsFromNames(module_list)
+        except:
+            print("Invalid module name in: ")
+            print(module_list)
+            sys.exit(1)
+
+        if config.isolate:
+            from test import snapshot
+            snapshot.isolate(suite, config.device)
+        if config.record_dir:
+            from test import capture
+            capture.record(suite, config.device)
+        if config.replay_dir:
+            from test import capture
+            capture.replay(suite, config.device)
+
+        if db:
+            eta = sum([db.estimate_module(name) or 0 for name in module_list])
+            print("Estimated duration: {0}".format(durations.format_eta(eta)))
+
+        # Perform all the tests in a single run
+        result = unittest.TextTestRunner(verbosity = 2,
+                        resultclass = results.ResultCollector).run(suite)
+
+        finish(result.records, start, db)
+    finally:
+        if sim:
+            sim.stop()